@@ -0,0 +1,218 @@
+import argparse
+import time
+from datetime import datetime
+
+from pymongo import MongoClient
+
+from esquema_bd import CAMPO_DETALLE, MODOS_ESQUEMA
+from metricas import METRICAS
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+
+# Colecciones de resúmenes materializados
+OCUPACION = 'ResumenOcupacionNoche'
+ADR_MENSUAL = 'ResumenADRMensual'
+CANCELACIONES = 'ResumenCancelaciones'
+COLECCIONES_RESUMEN = [OCUPACION, ADR_MENSUAL, CANCELACIONES]
+
+MS_POR_DIA = 24 * 60 * 60 * 1000
+# Números finitos: NaN e infinito quedan fuera (NaN ordena antes que -inf y,
+# por el type bracketing, $gt/$lt numéricos no aceptan textos ni nulos). Un solo
+# NaN en $sum arruinaría el resumen para siempre, porque $merge lo sigue sumando
+FINITO = {"$gt": float('-inf'), "$lt": float('inf')}
+
+
+# --- Definición de los resúmenes ---
+def _etapas_detalle(modo):
+    """Deja el detalle de cada reserva en CAMPO_DETALLE, esté embebido o en DetallesReserva."""
+    if modo == 'embebido':
+        return []
+    return [
+        {"$lookup": {"from": "DetallesReserva", "localField": "detalle_reserva_id",
+                     "foreignField": "_id", "as": CAMPO_DETALLE}},
+        {"$unwind": {"path": f"${CAMPO_DETALLE}", "preserveNullAndEmptyArrays": True}},
+    ]
+
+
+def _ocupacion(modo):
+    # Una fila por noche ocupada: fecha_llegada + i días, i = 0 .. noches_estadia - 1
+    return [
+        {"$match": {"fue_cancelada": False, "fecha_llegada": {"$type": "date"}}},
+        {"$project": {"noche": {"$map": {
+            "input": {"$range": [0, "$noches_estadia"]},
+            "as": "i",
+            "in": {"$add": ["$fecha_llegada", {"$multiply": ["$$i", MS_POR_DIA]}]},
+        }}}},
+        {"$unwind": "$noche"},
+        {"$group": {"_id": "$noche", "habitaciones": {"$sum": 1}}},
+    ]
+
+
+def _adr_mensual(modo):
+    # ADR = ingresos por habitación / noches vendidas, por mes de llegada y hotel
+    return [
+        {"$match": {"fue_cancelada": False, "fecha_llegada": {"$type": "date"},
+                    "adr": FINITO, "noches_estadia": FINITO}},
+        {"$group": {
+            "_id": {"anio": {"$year": "$fecha_llegada"}, "mes": {"$month": "$fecha_llegada"},
+                    "hotel": {"$ifNull": ["$hotel", None]}},
+            "reservas": {"$sum": 1},
+            "noches": {"$sum": "$noches_estadia"},
+            "ingresos": {"$sum": {"$multiply": ["$adr", "$noches_estadia"]}},
+        }},
+    ]
+
+
+def _cancelaciones(modo):
+    return _etapas_detalle(modo) + [
+        {"$group": {
+            "_id": {"canal_reserva": {"$ifNull": ["$canal_reserva", None]},
+                    "tipo_cliente_en_reserva": {"$ifNull": [f"${CAMPO_DETALLE}.tipo_cliente_en_reserva", None]}},
+            "reservas": {"$sum": 1},
+            "canceladas": {"$sum": {"$cond": ["$fue_cancelada", 1, 0]}},
+        }},
+    ]
+
+
+def _cociente(numerador, denominador):
+    return {"$cond": [{"$gt": [f"${denominador}", 0]}, {"$divide": [f"${numerador}", f"${denominador}"]}, None]}
+
+
+# colección: (etapas de agregación según el modo de esquema, campos sumables, campos derivados)
+RESUMENES = {
+    OCUPACION: (_ocupacion, ["habitaciones"], {}),
+    ADR_MENSUAL: (_adr_mensual, ["reservas", "noches", "ingresos"], {"adr": _cociente("ingresos", "noches")}),
+    CANCELACIONES: (_cancelaciones, ["reservas", "canceladas"], {"tasa_cancelacion": _cociente("canceladas", "reservas")}),
+}
+
+
+def _pipeline(coleccion, modo, filtro, acumular):
+    """
+    Agregación sobre Reservas que escribe el resumen `coleccion` con $merge.
+    Con `acumular`, las claves que ya existen suman los nuevos valores a los
+    guardados; sin él, los reemplazan.
+    """
+    etapas, sumables, derivados = RESUMENES[coleccion]
+    pipeline = ([{"$match": filtro}] if filtro else []) + etapas(modo)
+    if derivados:
+        pipeline.append({"$set": derivados})
+    if acumular:
+        al_coincidir = [{"$set": {c: {"$add": [f"${c}", f"$$new.{c}"]} for c in sumables}}]
+        if derivados:
+            al_coincidir.append({"$set": derivados})
+    else:
+        al_coincidir = "replace"
+    pipeline.append({"$merge": {"into": coleccion, "on": "_id",
+                                "whenMatched": al_coincidir, "whenNotMatched": "insert"}})
+    return pipeline
+
+
+# --- Construcción y mantenimiento ---
+def reconstruir(db, modo='separado', colecciones=None):
+    """Recalcula desde cero los resúmenes: una agregación completa sobre Reservas por resumen."""
+    for coleccion in colecciones or COLECCIONES_RESUMEN:
+        with METRICAS.etapa('analitica'):
+            db.drop_collection(coleccion)
+            db['Reservas'].aggregate(_pipeline(coleccion, modo, None, acumular=False))
+
+
+def actualizar(db, ids_reservas, modo='separado'):
+    """
+    Suma a los resúmenes las reservas nuevas `ids_reservas`: cada agregación
+    lee solo esas reservas (por _id) y toca solo las noches, meses y
+    canal/tipo de cliente que les corresponden. Las reservas deben ser
+    nuevas: una reserva sumada dos veces se cuenta dos veces.
+    """
+    if not ids_reservas:
+        return
+    filtro = {"_id": {"$in": list(ids_reservas)}}
+    with METRICAS.etapa('analitica'):
+        for coleccion in COLECCIONES_RESUMEN:
+            db['Reservas'].aggregate(_pipeline(coleccion, modo, filtro, acumular=True))
+    METRICAS.contar('reservas_resumidas', len(ids_reservas))
+
+
+def actualizador(db, modo='separado'):
+    """Función para `LoteReservas(al_escribir=...)`: actualiza los resúmenes tras cada lote."""
+    return lambda ids_reservas: actualizar(db, ids_reservas, modo)
+
+
+# --- Consultas para los dashboards (solo leen los resúmenes) ---
+def ocupacion_por_noche(db, desde=None, hasta=None):
+    """[(noche, habitaciones ocupadas)] entre `desde` y `hasta` (inclusive)."""
+    rango = {}
+    if desde is not None:
+        rango["$gte"] = desde
+    if hasta is not None:
+        rango["$lte"] = hasta
+    cursor = db[OCUPACION].find({"_id": rango} if rango else {}).sort("_id", 1)
+    return [(d["_id"], d["habitaciones"]) for d in cursor]
+
+
+def adr_mensual(db, anio=None, hotel=None):
+    """[{anio, mes, hotel, reservas, noches, ingresos, adr}] ordenados por año, mes y hotel."""
+    filtro = {}
+    if anio is not None:
+        filtro["_id.anio"] = anio
+    if hotel is not None:
+        filtro["_id.hotel"] = hotel
+    filas = [{**d.pop("_id"), **d} for d in db[ADR_MENSUAL].find(filtro)]
+    return sorted(filas, key=lambda f: (f["anio"], f["mes"], str(f["hotel"])))
+
+
+def tasa_cancelacion(db, canal_reserva=None, tipo_cliente_en_reserva=None):
+    """[{canal_reserva, tipo_cliente_en_reserva, reservas, canceladas, tasa_cancelacion}]."""
+    filtro = {}
+    if canal_reserva is not None:
+        filtro["_id.canal_reserva"] = canal_reserva
+    if tipo_cliente_en_reserva is not None:
+        filtro["_id.tipo_cliente_en_reserva"] = tipo_cliente_en_reserva
+    filas = [{**d.pop("_id"), **d} for d in db[CANCELACIONES].find(filtro)]
+    return sorted(filas, key=lambda f: (str(f["canal_reserva"]), str(f["tipo_cliente_en_reserva"])))
+
+
+def _fecha(texto):
+    return datetime.strptime(texto, '%Y-%m-%d')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resúmenes materializados de CostaDelInkaDB para los dashboards')
+    parser.add_argument('accion', choices=['reconstruir', 'ocupacion', 'adr', 'cancelaciones'],
+                        help='reconstruir: recalcular los resúmenes desde Reservas; el resto: consultarlos')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='Modo de esquema de Reservas/DetallesReserva')
+    parser.add_argument('--desde', type=_fecha, help='Primera noche (AAAA-MM-DD) para ocupacion')
+    parser.add_argument('--hasta', type=_fecha, help='Última noche (AAAA-MM-DD) para ocupacion')
+    parser.add_argument('--anio', type=int, help='Año para adr')
+    parser.add_argument('--hotel', help='Hotel para adr')
+    parser.add_argument('--canal', help='canal_reserva para cancelaciones')
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    db = client[DB_NAME]
+    try:
+        if args.accion == 'reconstruir':
+            inicio = time.perf_counter()
+            reconstruir(db, args.esquema)
+            print(f"Resúmenes reconstruidos en {time.perf_counter() - inicio:.2f} s.")
+        elif args.accion == 'ocupacion':
+            for noche, habitaciones in ocupacion_por_noche(db, args.desde, args.hasta):
+                print(f"{noche:%Y-%m-%d}: {habitaciones} habitaciones")
+        elif args.accion == 'adr':
+            for f in adr_mensual(db, args.anio, args.hotel):
+                adr = f"{f['adr']:.2f}" if f['adr'] is not None else '-'
+                print(f"{f['anio']}-{f['mes']:02d} {f['hotel'] or '(sin hotel)'}: ADR {adr} "
+                      f"({f['noches']} noches, {f['reservas']} reservas)")
+        else:
+            for f in tasa_cancelacion(db, args.canal):
+                tasa = f"{f['tasa_cancelacion']:.1%}" if f['tasa_cancelacion'] is not None else '-'
+                print(f"{f['canal_reserva']} / {f['tipo_cliente_en_reserva']}: {tasa} "
+                      f"({f['canceladas']} de {f['reservas']})")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,39 +1,244 @@
+import argparse
+import json
 import os
-from datetime import datetime
+import shutil
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-# Crear directorio de backups si no existe
-backup_dir = "mongodb_backups"
-if not os.path.exists(backup_dir):
-    os.makedirs(backup_dir)
+from pymongo import MongoClient
 
-# Generar nombre del backup con fecha y hora
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-backup_name = f"costadelinka_backup_{timestamp}"
+from esquema_bd import CAMPO_INSERCION
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
 
-# Ruta completa del backup
-backup_path = os.path.join(backup_dir, backup_name)
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
 
-# Comando mongodump
-command = [
-    "mongodump",
-    "--db", "CostaDelInkaDB",
-    "--out", backup_path
-]
+# Directorio de backups y manifiesto con la historia de los backups de este script
+BACKUP_DIR = "mongodb_backups"
+MANIFIESTO = "manifiesto.json"
 
-try:
-    print(f"Iniciando backup de la base de datos...")
+# Colecciones que solo crecen por inserción: un backup incremental copia
+# únicamente los documentos escritos (CAMPO_INSERCION) desde el inicio del
+# backup anterior. Sus _id son hashes y no sirven como marca de tiempo. Las
+# demás (catálogos, Pagos) son pequeñas y se copian completas siempre.
+COLECCIONES_INCREMENTALES = ['Reservas', 'DetallesReserva', 'Clientes']
+
+# Los loaders marcan cada documento justo antes de escribirlo, pero un lote en
+# vuelo puede hacerse visible después de que empiece el backup: cada
+# incremental retrocede este margen. Lo que se copie dos veces, restaurar_db.py
+# lo omite como duplicado.
+MARGEN_SEGUNDOS = 600
+
+# Procesos mongodump simultáneos (uno por colección)
+HILOS = 4
+# Cadenas (backup completo + sus incrementales) que conserva la retención
+CONSERVAR_COMPLETOS = 7
+
+
+# --- Manifiesto ---
+def leer_manifiesto(directorio):
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {'backups': []}
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(directorio, manifiesto):
+    # Se escribe a un archivo temporal y se renombra: un corte a mitad de
+    # escritura no deja un manifiesto corrupto
+    ruta = os.path.join(directorio, MANIFIESTO)
+    with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(ruta + '.tmp', ruta)
+
+
+def ultimo_completo(manifiesto):
+    completos = [b for b in manifiesto['backups'] if b['tipo'] == 'completo']
+    return completos[-1] if completos else None
+
+
+# --- Marca de agua por instante de inserción ---
+def consulta_desde(instante):
+    """Filtro en JSON extendido para --query: documentos escritos desde `instante` (UTC)."""
+    fecha = instante.astimezone(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    return json.dumps({CAMPO_INSERCION: {'$gte': {'$date': fecha}}})
+
+
+def inicio_incremental(anterior, margen=MARGEN_SEGUNDOS):
+    """
+    Instante desde el que copia un incremental: el inicio del backup
+    `anterior` menos `margen` segundos. None si `anterior` es de una versión
+    que marcaba por _id; entonces hay que hacer un backup completo.
+    """
+    if not anterior or 'marca' not in anterior:
+        return None
+    return datetime.fromisoformat(anterior['marca']) - timedelta(seconds=margen)
+
+
+# --- mongodump ---
+def volcar_coleccion(args, coleccion, ruta, consulta=None):
+    """Ejecuta mongodump para una colección y retorna (colección, segundos, error o None)."""
+    command = [
+        "mongodump",
+        "--uri", args.mongo_uri,
+        "--db", DB_NAME,
+        "--collection", coleccion,
+        "--out", ruta,
+    ]
+    if args.gzip:
+        command.append("--gzip")
+    if consulta:
+        command += ["--query", consulta]
+
+    inicio = time.perf_counter()
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except Exception as e:
+        return coleccion, time.perf_counter() - inicio, str(e)
+    error = result.stderr.strip() if result.returncode != 0 else None
+    return coleccion, time.perf_counter() - inicio, error
+
+
+def realizar_backup(db, args, tipo):
+    """
+    Vuelca cada colección en su propio proceso mongodump, `args.hilos` a la
+    vez. La marca del backup es el instante en que empieza: un backup
+    completo copia todo y uno incremental solo los documentos de las
+    colecciones incrementales escritos desde la marca del anterior (menos
+    `args.margen` segundos). Retorna la entrada del manifiesto o None si
+    alguna colección falló.
+    """
+    marca = datetime.now(timezone.utc)
+    manifiesto = leer_manifiesto(args.directorio)
+    anterior = manifiesto['backups'][-1] if manifiesto['backups'] else None
+    desde = inicio_incremental(anterior, args.margen) if tipo == 'incremental' else None
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    backup_name = f"costadelinka_backup_{timestamp}" + ("_inc" if tipo == 'incremental' else "")
+    backup_path = os.path.join(args.directorio, backup_name)
+
+    colecciones = sorted(db.list_collection_names())
+    trabajos = []
+    for coleccion in colecciones:
+        if coleccion in COLECCIONES_INCREMENTALES and tipo == 'incremental':
+            trabajos.append((coleccion, consulta_desde(desde)))
+        else:
+            trabajos.append((coleccion, None))
+
+    print(f"Iniciando backup {tipo} de la base de datos ({len(trabajos)} colecciones, {args.hilos} a la vez)...")
     print(f"El backup se guardará en: {backup_path}")
-    
-    # Ejecutar el comando
-    result = subprocess.run(command, capture_output=True, text=True)
-    
-    if result.returncode == 0:
-        print("Backup completado exitosamente!")
-        print(f"Ubicación del backup: {backup_path}")
-    else:
-        print("Error al realizar el backup:")
-        print(result.stderr)
-        
-except Exception as e:
-    print(f"Error al ejecutar el backup: {e}") 
\ No newline at end of file
+
+    inicio = time.perf_counter()
+    with METRICAS.etapa('mongodump'), ThreadPoolExecutor(max_workers=max(1, args.hilos)) as pool:
+        resultados = list(pool.map(lambda t: volcar_coleccion(args, t[0], backup_path, t[1]), trabajos))
+
+    fallidas = 0
+    for coleccion, segundos, error in resultados:
+        METRICAS.registrar_latencia('mongodump', segundos)
+        if error:
+            METRICAS.contar('colecciones_fallidas')
+            fallidas += 1
+            print(f"Error al respaldar la colección {coleccion}:")
+            print(error)
+        else:
+            METRICAS.contar('colecciones_respaldadas')
+            print(f"Colección {coleccion}: {segundos:.2f} s")
+    if fallidas:
+        # Un backup incompleto no se registra: el siguiente incremental parte del anterior
+        shutil.rmtree(backup_path, ignore_errors=True)
+        return None
+
+    entrada = {
+        'nombre': backup_name,
+        'tipo': tipo,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'base': backup_name if tipo == 'completo' else anterior['base'],
+        'gzip': args.gzip,
+        'colecciones': [c for c, _ in trabajos],
+        'marca': marca.isoformat(),
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
+    manifiesto['backups'].append(entrada)
+    guardar_manifiesto(args.directorio, manifiesto)
+    print("Backup completado exitosamente!")
+    print(f"Ubicación del backup: {backup_path}")
+    return entrada
+
+
+# --- Retención ---
+def aplicar_retencion(directorio, conservar=CONSERVAR_COMPLETOS):
+    """
+    Conserva los `conservar` backups completos más recientes con sus
+    incrementales y elimina el resto de los backups del manifiesto. Los
+    directorios que no figuran en el manifiesto (backups manuales) no se tocan.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    completos = [b['nombre'] for b in manifiesto['backups'] if b['tipo'] == 'completo']
+    vigentes = set(completos[-conservar:]) if conservar > 0 else set()
+
+    conservados = []
+    for backup in manifiesto['backups']:
+        if backup['base'] in vigentes:
+            conservados.append(backup)
+            continue
+        shutil.rmtree(os.path.join(directorio, backup['nombre']), ignore_errors=True)
+        print(f"Backup eliminado por retención: {backup['nombre']}")
+
+    if len(conservados) != len(manifiesto['backups']):
+        manifiesto['backups'] = conservados
+        guardar_manifiesto(directorio, manifiesto)
+    return conservados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backup de CostaDelInkaDB con mongodump')
+    parser.add_argument('--tipo', choices=['completo', 'incremental'], default='completo',
+                        help='incremental: solo los documentos nuevos de Reservas, DetallesReserva '
+                             'y Clientes desde el backup anterior (si no hay un completo previo, se hace uno)')
+    parser.add_argument('--margen', type=int, default=MARGEN_SEGUNDOS,
+                        help='Segundos que cada incremental retrocede respecto del inicio del backup anterior')
+    parser.add_argument('--gzip', action='store_true', help='Comprimir cada colección con gzip')
+    parser.add_argument('--hilos', type=int, default=HILOS, help='Colecciones respaldadas a la vez')
+    parser.add_argument('--conservar', type=int, default=None,
+                        help=f'Conservar solo los N backups completos más recientes con sus incrementales '
+                             f'(por ejemplo {CONSERVAR_COMPLETOS}); sin esta opción no se elimina nada')
+    parser.add_argument('--directorio', default=BACKUP_DIR)
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    # Crear directorio de backups si no existe
+    os.makedirs(args.directorio, exist_ok=True)
+
+    client = MongoClient(args.mongo_uri)
+    db = client[DB_NAME]
+    try:
+        tipo = args.tipo
+        manifiesto = leer_manifiesto(args.directorio)
+        if tipo == 'incremental' and ultimo_completo(manifiesto) is None:
+            print("No hay un backup completo previo en el manifiesto: se realizará uno completo.")
+            tipo = 'completo'
+        elif tipo == 'incremental' and inicio_incremental(manifiesto['backups'][-1]) is None:
+            print("El backup anterior no tiene marca de inserción: se realizará uno completo.")
+            tipo = 'completo'
+        entrada = realizar_backup(db, args, tipo)
+    except Exception as e:
+        print(f"Error al ejecutar el backup: {e}")
+        entrada = None
+    finally:
+        client.close()
+
+    if entrada is None:
+        print("El backup no se completó.")
+    elif args.conservar is not None:
+        with METRICAS.etapa('retencion'):
+            aplicar_retencion(args.directorio, args.conservar)
+    finalizar(args)
+
+
+if __name__ == '__main__':
+    main()
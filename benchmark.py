@@ -0,0 +1,340 @@
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime
+from multiprocessing import get_context
+
+import numpy as np
+from bson import encode
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from clientes_ficticios import FECHA_REFERENCIA, PROPORCION_SIN_EMAIL, generar_documentos, generar_fechas_nacimiento
+from esquema_bd import COLUMNS_TYPES
+from etl_carga_mongodb import cargar_por_lotes, generar_documentos as generar_documentos_etl
+from formato_intermedio import escribir_tabla, leer_tabla
+from metricas import METRICAS
+from preprocesamiento_basico import parsear_tipos, separar_rechazadas, validar
+from preprocesar_y_traducir_csv import COLUMN_MAP
+from reduce_hotel_bookings import MODES, TARGET_RECORDS, reduce_hotel_bookings
+
+PERFIL = 'hotel_bookings_es_validado.csv'
+ESCALAS = [10_000, 100_000, 1_000_000]
+ETAPAS = ['reducir', 'validar', 'transformar', 'cargar']
+DIRECTORIO_DATOS = 'benchmark_datos'
+SALIDA = 'benchmark_resultados.json'
+DB_BENCHMARK = 'CostaDelInkaDB_benchmark'
+TAMANO_LOTE = 1000
+# Colecciones de catálogo que el sustituto en memoria guarda para poder consultarlas
+CATALOGOS = ['TiposHabitacion', 'TiposCliente', 'ModalidadesPago', 'TiposDocumentoPago']
+
+
+# --- Datos sintéticos con la forma de hotel_bookings_es_validado ---
+def generar_dataset(n, semilla=None, perfil=PERFIL):
+    """
+    Genera `n` filas remuestreando (con reemplazo) las filas de `perfil`, de modo
+    que las columnas de la reserva conservan sus valores y su coherencia
+    (fechas, noches, tipos de habitación). La identidad de los clientes se
+    genera de nuevo para que no se repita: documentos únicos como en
+    clientes_ficticios, emails únicos (PROPORCION_SIN_EMAIL vacíos) y fechas
+    de nacimiento aleatorias. Con la misma semilla el dataset es idéntico.
+    """
+    base = leer_tabla(perfil, dtype_csv=str)
+    rng = np.random.default_rng(semilla)
+    df = base.iloc[rng.integers(0, len(base), size=n)].reset_index(drop=True)
+
+    tipos, numeros = generar_documentos(rng, n)
+    emails = np.char.add(np.char.add('cliente', np.arange(n).astype(str)), '@example.com').astype(object)
+    emails[rng.random(n) < PROPORCION_SIN_EMAIL] = ''
+    df['email'] = emails
+    df['tipo_documento_identidad'] = tipos
+    df['numero_documento_identidad'] = numeros
+    df['fecha_nacimiento'] = generar_fechas_nacimiento(rng, n, FECHA_REFERENCIA)
+    return df
+
+
+def preparar_datos(n, directorio, semilla=None, perfil=PERFIL):
+    """
+    Escribe (si no existen) los archivos de una escala: la fuente en inglés y
+    en CSV, como hotel_bookings.csv, para la reducción, y el dataset en
+    español en Parquet para las demás etapas.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    rutas = {
+        'fuente': os.path.join(directorio, f'hotel_bookings_{n}.csv'),
+        'datos': os.path.join(directorio, f'hotel_bookings_es_{n}.parquet'),
+        'reducido': os.path.join(directorio, f'hotel_bookings_reduced_{n}.parquet'),
+    }
+    if not (os.path.exists(rutas['fuente']) and os.path.exists(rutas['datos'])):
+        print(f"Generando {n:,} filas en {directorio}...")
+        df = generar_dataset(n, semilla, perfil)
+        escribir_tabla(df, rutas['datos'], COLUMNS_TYPES)
+        ingles = {es: en for en, es in COLUMN_MAP.items()}
+        df.rename(columns=ingles).to_csv(rutas['fuente'], index=False)
+    return rutas
+
+
+# --- Sustituto en memoria de la base de datos ---
+class _ResultadoBulk:
+    def __init__(self, upserted_ids):
+        self.upserted_ids = upserted_ids
+
+
+class ColeccionSimulada:
+    """
+    Sustituto en memoria de una colección para medir la carga sin mongod.
+    Registra en METRICAS una petición por llamada (como el driver con lotes
+    de menos de 100.000 operaciones) y serializa cada documento a BSON para
+    incluir ese costo, pero solo guarda los documentos de las colecciones de
+    catálogo: la base empieza vacía, así que todo upsert crea su documento.
+    """
+
+    def __init__(self, nombre, guardar=False):
+        self.name = nombre
+        self.documentos = {} if guardar else None
+
+    def create_index(self, claves, **opciones):
+        METRICAS.viaje_bd('createIndexes')
+        return claves if isinstance(claves, str) else '_'.join(c for c, _ in claves)
+
+    def find(self, filtro=None, proyeccion=None):
+        METRICAS.viaje_bd('find')
+        if not self.documentos:
+            return []
+        filtro = filtro or {}
+        resultado = []
+        for doc in self.documentos.values():
+            if all(doc.get(campo) in condicion['$in'] if isinstance(condicion, dict) else doc.get(campo) == condicion
+                   for campo, condicion in filtro.items()):
+                resultado.append(doc)
+        return resultado
+
+    def _guardar(self, doc):
+        if self.documentos is not None:
+            self.documentos[doc['_id']] = doc
+
+    def insert_many(self, documentos, ordered=True):
+        inicio = time.perf_counter()
+        for doc in documentos:
+            doc.setdefault('_id', ObjectId())
+            encode(doc)
+            self._guardar(doc)
+        METRICAS.viaje_bd('insert', time.perf_counter() - inicio)
+
+    def bulk_write(self, operaciones, ordered=True):
+        inicio = time.perf_counter()
+        upserted_ids = {}
+        for i, op in enumerate(operaciones):
+            encode(op._filter)
+            encode(op._doc)
+            if op._upsert:
+                doc = {**op._filter, **op._doc.get('$setOnInsert', {})}
+                doc.setdefault('_id', ObjectId())
+                upserted_ids[i] = doc['_id']
+                self._guardar(doc)
+        METRICAS.viaje_bd('update', time.perf_counter() - inicio)
+        return _ResultadoBulk(upserted_ids)
+
+
+class BaseSimulada:
+    def __init__(self):
+        self.colecciones = {}
+
+    def __getitem__(self, nombre):
+        if nombre not in self.colecciones:
+            self.colecciones[nombre] = ColeccionSimulada(nombre, nombre in CATALOGOS)
+        return self.colecciones[nombre]
+
+
+# --- Etapas: cada una prepara su entrada y retorna la función que se cronometra ---
+def _reducir(rutas, opciones):
+    def ejecutar():
+        if not reduce_hotel_bookings(rutas['fuente'], rutas['reducido'], opciones['registros'],
+                                     opciones['muestreo'], opciones['semilla']):
+            raise RuntimeError(f"Falló la reducción de {rutas['fuente']}")
+        return rutas['filas']
+    return ejecutar
+
+
+def _validar(rutas, opciones):
+    df = leer_tabla(rutas['datos'], dtype_csv=str)
+
+    def ejecutar():
+        datos = parsear_tipos(df)
+        separar_rechazadas(datos, validar(datos))
+        return len(df)
+    return ejecutar
+
+
+def _transformar(rutas, opciones):
+    df = leer_tabla(rutas['datos'], dtype_csv=str)
+
+    def ejecutar():
+        for _ in generar_documentos_etl(df):
+            pass
+        return len(df)
+    return ejecutar
+
+
+def _cargar(rutas, opciones):
+    df = leer_tabla(rutas['datos'], dtype_csv=str)
+    if opciones['max_filas_carga']:
+        df = df.iloc[:opciones['max_filas_carga']]
+    if opciones['mongo_uri']:
+        METRICAS.monitorear_mongo()
+        client = MongoClient(opciones['mongo_uri'])
+        client.drop_database(DB_BENCHMARK)
+        db = client[DB_BENCHMARK]
+    else:
+        client, db = None, BaseSimulada()
+
+    def ejecutar():
+        try:
+            cargar_por_lotes(df, db, opciones['tamano_lote'])
+        finally:
+            if client is not None:
+                client.drop_database(DB_BENCHMARK)
+                client.close()
+        return len(df)
+    return ejecutar
+
+
+PREPARAR_ETAPA = {
+    'reducir': _reducir,
+    'validar': _validar,
+    'transformar': _transformar,
+    'cargar': _cargar,
+}
+
+
+def _rss_pico_mb():
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def medir_etapa(etapa, rutas, opciones):
+    """
+    Ejecuta una etapa y retorna sus métricas. Se llama en un proceso nuevo por
+    etapa, así el pico de memoria (RSS) es el de esa etapa y no el de las
+    anteriores. La lectura de la entrada no entra en el tiempo medido, salvo
+    en la reducción, que lee la fuente por bloques como parte de su trabajo.
+    """
+    with redirect_stdout(io.StringIO()):
+        ejecutar = PREPARAR_ETAPA[etapa](rutas, opciones)
+        rss_entrada_mb = _rss_pico_mb()
+        METRICAS.reiniciar()
+        inicio = time.perf_counter()
+        filas = ejecutar()
+        segundos = time.perf_counter() - inicio
+    metricas = METRICAS.resumen()
+    viajes = {c.split('.', 1)[1]: n for c, n in metricas['contadores'].items() if c.startswith('viajes_bd.')}
+    return {
+        'etapa': etapa,
+        'filas': filas,
+        'segundos': round(segundos, 4),
+        'filas_por_segundo': round(filas / max(segundos, 1e-9), 1),
+        'rss_entrada_mb': rss_entrada_mb,
+        'rss_pico_mb': _rss_pico_mb(),
+        'viajes_bd': sum(viajes.values()),
+        'viajes_bd_por_comando': viajes,
+        'metricas': metricas,
+    }
+
+
+# --- Reporte ---
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def imprimir_resultados(resultados, anteriores=None):
+    """Tabla de resultados; con `anteriores` agrega la variación de filas/s por escala y etapa."""
+    previos = {(r['escala'], r['etapa']): r for r in (anteriores or {}).get('resultados', [])}
+    print(f"\n{'escala':>10} {'etapa':<12} {'filas/s':>12} {'segundos':>9} {'RSS pico MB':>12} {'viajes BD':>10}"
+          + ('  vs. anterior' if previos else ''))
+    for r in resultados:
+        linea = (f"{r['escala']:>10,} {r['etapa']:<12} {r['filas_por_segundo']:>12,.0f} {r['segundos']:>9.2f} "
+                 f"{r['rss_pico_mb'] or 0:>12.1f} {r['viajes_bd']:>10,}")
+        previo = previos.get((r['escala'], r['etapa']))
+        if previo:
+            linea += f"  {r['filas_por_segundo'] / max(previo['filas_por_segundo'], 1e-9) - 1:+.1%}"
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Mide reducción, validación, transformación y carga con datos sintéticos a varias escalas'
+    )
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS)
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=ETAPAS)
+    parser.add_argument('--perfil', default=PERFIL, help='Archivo validado del que se remuestrean las reservas')
+    parser.add_argument('--datos', default=DIRECTORIO_DATOS, help='Directorio de los datasets generados')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--registros', type=int, default=TARGET_RECORDS, help='Filas que conserva la reducción')
+    parser.add_argument('--muestreo', choices=MODES, default='head')
+    parser.add_argument('--mongo-uri', default=None,
+                        help=f'mongod para la carga (usa la base {DB_BENCHMARK}); sin él se usa un sustituto en memoria')
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE)
+    parser.add_argument('--max-filas-carga', type=int, default=None, help='Limitar las filas de la etapa de carga')
+    parser.add_argument('--salida', default=SALIDA, help='Archivo JSON de resultados')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para comparar filas/s')
+    args = parser.parse_args()
+
+    opciones = {
+        'registros': args.registros,
+        'muestreo': args.muestreo,
+        'semilla': args.semilla,
+        'mongo_uri': args.mongo_uri,
+        'tamano_lote': args.tamano_lote,
+        'max_filas_carga': args.max_filas_carga,
+    }
+    resultados = []
+    for escala in args.escalas:
+        rutas = preparar_datos(escala, args.datos, args.semilla, args.perfil)
+        rutas['filas'] = escala
+        for etapa in args.etapas:
+            print(f"Midiendo {etapa} con {escala:,} filas...")
+            # Un proceso nuevo (spawn) por etapa para medir su memoria por separado
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+                resultado = pool.submit(medir_etapa, etapa, rutas, opciones).result()
+            resultados.append({'escala': escala, **resultado})
+
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'base_de_datos': 'mongod' if args.mongo_uri else 'sustituto en memoria',
+        'opciones': opciones,
+        'resultados': resultados,
+    }
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+
+    anteriores = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anteriores = json.load(f)
+    imprimir_resultados(resultados, anteriores)
+    print(f"\nResultados guardados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
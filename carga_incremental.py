@@ -0,0 +1,82 @@
+import hashlib
+from collections import Counter
+
+from bson.objectid import ObjectId
+
+SEPARADOR = '\x1f'
+
+# Colección de la base de destino donde se guardan los checkpoints de carga
+COLECCION_CHECKPOINTS = 'CheckpointsCarga'
+
+
+# --- Hash del archivo de entrada ---
+def hash_archivo(ruta, tamano_bloque=1 << 20):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+# --- Claves naturales deterministas ---
+def _object_id(*partes):
+    texto = SEPARADOR.join('' if p is None else str(p) for p in partes)
+    return ObjectId(hashlib.sha1(texto.encode('utf-8')).digest()[:12])
+
+
+def id_cliente(email, tipo_doc, num_doc):
+    return _object_id('cliente', email, tipo_doc, num_doc)
+
+
+class ClavesReserva:
+    """
+    Deriva el `_id` de la reserva y de su detalle a partir del contenido de la
+    fila. Filas idénticas se distinguen por su número de aparición dentro del
+    archivo, de modo que la misma entrada produce siempre los mismos ids sin
+    depender de la posición absoluta de cada fila.
+    """
+
+    def __init__(self):
+        self.apariciones = Counter()
+
+    def siguiente(self, valores):
+        contenido = SEPARADOR.join('' if v is None or v != v else str(v) for v in valores)
+        huella = hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+        self.apariciones[huella] += 1
+        n = self.apariciones[huella]
+        return _object_id('reserva', huella, n), _object_id('detalle', huella, n)
+
+
+# --- Checkpoint de la carga ---
+class Checkpoint:
+    """
+    Registra, para el hash del archivo de entrada, el número de la última
+    fila cuyo lote quedó escrito. Un archivo nuevo o modificado tiene otro
+    hash y su carga empieza desde cero; las escrituras con upsert hacen que
+    reprocesar filas ya cargadas no genere duplicados.
+
+    El checkpoint se guarda en la misma base de destino (COLECCION_CHECKPOINTS),
+    no junto al archivo: si la base se vacía (clean_db.py) o la carga apunta a
+    otra base, no hay checkpoint y el archivo se vuelve a cargar completo.
+    """
+
+    def __init__(self, db, ruta_archivo):
+        self.coleccion = db[COLECCION_CHECKPOINTS]
+        self.archivo = ruta_archivo
+        self.hash = hash_archivo(ruta_archivo)
+        self.ultima_fila = 0
+        self.completado = False
+        datos = self.coleccion.find_one({"_id": self.hash})
+        if datos is not None:
+            self.ultima_fila = datos.get('ultima_fila', 0)
+            self.completado = datos.get('completado', False)
+
+    def guardar(self, ultima_fila, completado=False):
+        self.ultima_fila = ultima_fila
+        self.completado = completado
+        # Un solo documento reemplazado de una vez: un corte no deja un checkpoint a medias
+        self.coleccion.replace_one({"_id": self.hash}, {
+            "archivo": self.archivo,
+            "ultima_fila": ultima_fila,
+            "completado": completado
+        }, upsert=True)
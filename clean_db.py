@@ -1,13 +1,19 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from pymongo import MongoClient
 
-# --- Conexión a MongoDB ---
-try:
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['CostaDelInkaDB']
-    print("Conexión a MongoDB exitosa.")
-except Exception as e:
-    print(f"Error al conectar a MongoDB: {e}")
-    exit()
+from analitica import COLECCIONES_RESUMEN
+from carga_incremental import COLECCION_CHECKPOINTS
+from esquema_bd import MODOS_ESQUEMA, validadores_de
+from indices import recrear_coleccion
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+from ocupacion import RUTA_INDICE
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
 
 # Lista de colecciones a limpiar
 colecciones = [
@@ -18,16 +24,100 @@ colecciones = [
     'TiposCliente',
     'ModalidadesPago',
     'TiposDocumentoPago'
+] + COLECCIONES_RESUMEN + [  # los resúmenes de analitica.py se vacían con los datos
+    COLECCION_CHECKPOINTS  # y los checkpoints: la siguiente carga empieza desde cero
 ]
 
-# Limpiar cada colección
-for coleccion in colecciones:
+
+# --- Modo seguro: borra los documentos y conserva colecciones, validadores e índices ---
+def vaciar(db, coleccion):
+    resultado = db[coleccion].delete_many({})
+    return resultado.deleted_count
+
+
+# --- Modo rápido: elimina la colección y la recrea con su esquema ---
+def recrear(db, coleccion, esquema='separado'):
+    """
+    drop + create no borra documento por documento ni llena el oplog: el
+    tiempo no depende de la cantidad de documentos. La colección vuelve con
+    el validador y los índices de CreacionBD_CostaInka.js (ver esquema_bd.py);
+    las que no existen en el modo de esquema `esquema` solo se eliminan.
+    """
+    cantidad = db[coleccion].estimated_document_count()
+    if coleccion in validadores_de(esquema):
+        recrear_coleccion(db, coleccion, modo=esquema)
+    else:
+        db.drop_collection(coleccion)
+    return cantidad
+
+
+def limpiar(db, nombres, modo='seguro', hilos=None, esquema='separado'):
+    """
+    Limpia las colecciones `nombres` y retorna {colección: documentos
+    eliminados o excepción}. En modo 'rapido' las colecciones se procesan en
+    paralelo; en modo 'seguro' una tras otra, como siempre.
+    """
+    funcion = (lambda db, c: recrear(db, c, esquema)) if modo == 'rapido' else vaciar
+    hilos = hilos or (len(nombres) if modo == 'rapido' else 1)
+
+    def procesar(coleccion):
+        try:
+            return coleccion, funcion(db, coleccion)
+        except Exception as e:
+            return coleccion, e
+
+    with ThreadPoolExecutor(max_workers=max(1, hilos)) as pool:
+        return dict(pool.map(procesar, nombres))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Limpia las colecciones de CostaDelInkaDB')
+    parser.add_argument('--modo', choices=['seguro', 'rapido'], default='seguro',
+                        help='seguro: delete_many en cada colección; '
+                             'rapido: eliminar y recrear cada colección con su validador e índices')
+    parser.add_argument('--hilos', type=int, default=None,
+                        help='Colecciones procesadas a la vez (por defecto, todas en modo rápido)')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='Modo de esquema con el que se recrean las colecciones en modo rápido')
+    parser.add_argument('--indice-ocupacion', metavar='RUTA', default=RUTA_INDICE,
+                        help='Índice de ocupación de ocupacion.py (.npz) que se elimina junto con los datos')
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    # --- Conexión a MongoDB ---
     try:
-        resultado = db[coleccion].delete_many({})
-        print(f"Colección {coleccion}: {resultado.deleted_count} documentos eliminados.")
+        client = MongoClient(args.mongo_uri)
+        db = client[DB_NAME]
+        print("Conexión a MongoDB exitosa.")
     except Exception as e:
-        print(f"Error al limpiar la colección {coleccion}: {e}")
+        print(f"Error al conectar a MongoDB: {e}")
+        exit()
+
+    inicio = time.perf_counter()
+    with METRICAS.etapa('limpieza'):
+        resultados = limpiar(db, colecciones, args.modo, args.hilos, args.esquema)
+    for coleccion, resultado in resultados.items():
+        if isinstance(resultado, Exception):
+            METRICAS.contar('colecciones_fallidas')
+            print(f"Error al limpiar la colección {coleccion}: {resultado}")
+            continue
+        METRICAS.contar('documentos_eliminados', resultado)
+        if args.modo == 'rapido':
+            print(f"Colección {coleccion}: recreada ({resultado} documentos eliminados).")
+        else:
+            print(f"Colección {coleccion}: {resultado} documentos eliminados.")
+    # El índice de ocupación vive en un archivo: se elimina como los resúmenes de analitica.py
+    if os.path.exists(args.indice_ocupacion):
+        os.remove(args.indice_ocupacion)
+        print(f"Índice de ocupación {args.indice_ocupacion} eliminado.")
+
+    print(f"\nLimpieza de la base de datos completada en {time.perf_counter() - inicio:.2f} s.")
+    client.close()
+    print("Conexión a MongoDB cerrada.")
+    finalizar(args)
+
 
-print("\nLimpieza de la base de datos completada.")
-client.close()
-print("Conexión a MongoDB cerrada.") 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+TIPOS_DOC = ['DNI', 'CE', 'Pasaporte']
+
+# Rango de números por tipo de documento: (mínimo, máximo inclusive, prefijo)
+RANGOS_DOCUMENTO = {
+    'DNI': (10000000, 99999999, ''),
+    'CE': (100000000, 999999999, ''),
+    'Pasaporte': (1000000, 9999999, 'P'),
+}
+
+PROPORCION_SIN_EMAIL = 0.2
+EDAD_MINIMA = 18
+EDAD_MAXIMA = 80
+TAMANO_BLOQUE_FAKER = 2000
+# Fecha respecto de la que se calculan las edades cuando hay semilla: sin
+# ella, la misma semilla daría otras fechas de nacimiento cada día
+FECHA_REFERENCIA = date(2025, 1, 1)
+
+
+# --- Columnas vectorizadas con NumPy ---
+def _muestrear_sin_repetir(rng, minimo, disponibles, cantidad, usados):
+    # Muestreo sin reemplazo que además evita los números ya entregados en `usados`
+    valores = np.empty(0, dtype=np.int64)
+    while len(valores) < cantidad:
+        faltan = cantidad - len(valores)
+        if faltan > disponibles - len(usados):
+            raise ValueError(f"No quedan {faltan} números de documento únicos en el rango")
+        nuevos = rng.choice(disponibles, size=faltan, replace=False) + minimo
+        if usados:
+            # Consulta directa al set: convertirlo a arreglo en cada bloque costaba O(números ya entregados)
+            libres = np.fromiter((v not in usados for v in nuevos.tolist()), dtype=bool, count=len(nuevos))
+            nuevos = nuevos[libres]
+        valores = np.concatenate([valores, nuevos])
+        usados.update(nuevos.tolist())
+    return valores
+
+
+def generar_documentos(rng, n, usados=None):
+    """
+    Retorna (tipos, números) para `n` clientes. Dentro de cada tipo los números
+    se muestrean sin reemplazo, así ningún par (tipo, número) se repite y
+    preprocesamiento_basico.py no descarta filas por documento duplicado.
+    `usados` ({tipo: set(números)}) extiende la garantía a varias llamadas.
+    """
+    usados = usados if usados is not None else {tipo: set() for tipo in RANGOS_DOCUMENTO}
+    tipos = rng.choice(np.array(TIPOS_DOC, dtype=object), size=n)
+    numeros = np.empty(n, dtype=object)
+    for tipo, (minimo, maximo, prefijo) in RANGOS_DOCUMENTO.items():
+        posiciones = np.flatnonzero(tipos == tipo)
+        valores = _muestrear_sin_repetir(rng, minimo, maximo - minimo + 1, len(posiciones), usados[tipo])
+        numeros[posiciones] = np.char.add(prefijo, valores.astype(str)).astype(object)
+    return tipos, numeros
+
+
+def generar_fechas_nacimiento(rng, n, hoy=None):
+    """Fechas 'YYYY-MM-DD' con edades entre EDAD_MINIMA y EDAD_MAXIMA respecto de `hoy`."""
+    hoy = pd.Timestamp(hoy or date.today())
+    # DateOffset evita el error de date.replace con el 29 de febrero
+    mas_reciente = np.datetime64(hoy - pd.DateOffset(years=EDAD_MINIMA), 'D')
+    mas_antigua = np.datetime64(hoy - pd.DateOffset(years=EDAD_MAXIMA + 1), 'D') + 1
+    dias = rng.integers(0, (mas_reciente - mas_antigua).astype(int) + 1, size=n)
+    return np.datetime_as_string(mas_antigua + dias, unit='D').astype(object)
+
+
+# --- Columnas de Faker, por bloques en un pool de procesos ---
+def _bloque_faker(tarea):
+    # Cada bloque usa su propia semilla: el resultado no depende del número de procesos
+    semilla, cantidad = tarea
+    fake = Faker('es_ES')
+    fake.seed_instance(semilla)
+    return (
+        [fake.name() for _ in range(cantidad)],
+        [fake.email() for _ in range(cantidad)],
+        [fake.phone_number() for _ in range(cantidad)],
+    )
+
+
+def generar_datos_faker(rng, n, procesos=None, tamano_bloque=TAMANO_BLOQUE_FAKER):
+    """Retorna (nombres, emails, teléfonos) generados con Faker en `procesos` workers."""
+    tareas = []
+    for inicio in range(0, n, tamano_bloque):
+        tareas.append((int(rng.integers(0, 2**32)), min(tamano_bloque, n - inicio)))
+    procesos = procesos or os.cpu_count()
+    nombres, emails, telefonos = [], [], []
+    if procesos > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tareas))) as pool:
+            bloques = list(pool.map(_bloque_faker, tareas))
+    else:
+        bloques = [_bloque_faker(tarea) for tarea in tareas]
+    for bloque_nombres, bloque_emails, bloque_telefonos in bloques:
+        nombres.extend(bloque_nombres)
+        emails.extend(bloque_emails)
+        telefonos.extend(bloque_telefonos)
+    return nombres, emails, telefonos
+
+
+class GeneradorClientes:
+    """
+    Genera columnas de datos personales ficticios en una o varias llamadas
+    (por ejemplo, un bloque del pipeline a la vez). El estado aleatorio y los
+    números de documento ya entregados se conservan entre llamadas, de modo
+    que los documentos no se repiten en todo el archivo. Con la misma
+    `semilla` el resultado es idéntico en cada ejecución: si no se indica la
+    fecha `hoy`, las edades se calculan respecto de FECHA_REFERENCIA.
+    """
+
+    def __init__(self, semilla=None, procesos=None, hoy=None):
+        self.rng = np.random.default_rng(semilla)
+        self.procesos = procesos
+        self.hoy = hoy if hoy is not None or semilla is None else FECHA_REFERENCIA
+        self.usados = {tipo: set() for tipo in RANGOS_DOCUMENTO}
+
+    def generar(self, n):
+        tipos, numeros = generar_documentos(self.rng, n, self.usados)
+        sin_email = self.rng.random(n) < PROPORCION_SIN_EMAIL
+        fechas = generar_fechas_nacimiento(self.rng, n, self.hoy)
+        nombres, emails, telefonos = generar_datos_faker(self.rng, n, self.procesos)
+
+        emails = np.array(emails, dtype=object)
+        emails[sin_email] = ''
+        return pd.DataFrame({
+            'nombre_completo': nombres,
+            'email': emails,
+            'telefono': telefonos,
+            'tipo_documento_identidad': tipos,
+            'numero_documento_identidad': numeros,
+            'fecha_nacimiento': fechas,
+        })
+
+
+def generar_clientes_ficticios(n, semilla=None, procesos=None, hoy=None):
+    """Genera de una vez las columnas de datos ficticios para `n` filas."""
+    return GeneradorClientes(semilla, procesos, hoy).generar(n)
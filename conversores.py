@@ -0,0 +1,173 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from esquema_bd import COLUMNS_TYPES, tipos_bson
+
+# Formatos de fecha aceptados por columna, en el orden en que se probaban
+FORMATOS_FECHA = {
+    'fecha_estado_reserva': ['%d/%m/%y', '%Y-%m-%d'],
+    'fecha_nacimiento': ['%Y-%m-%d'],
+}
+FORMATOS_FECHA_POR_DEFECTO = ['%Y-%m-%d', '%d/%m/%y', '%Y-%m-%d %H:%M:%S']
+TAMANO_MUESTRA_FORMATO = 100
+# Valores memorizados por conversor numérico: acotado, porque columnas como
+# adr tienen casi un valor distinto por fila y la carga debe usar memoria constante
+TAMANO_CACHE_NUMEROS = 4096
+# Ídem para los textos de fecha memorizados por cada columna
+TAMANO_CACHE_FECHAS = 4096
+
+_TIPO_BSON_DE_PYTHON = {int: 'int', float: 'double', str: 'string'}
+TIPOS_BSON = tipos_bson()
+
+
+@lru_cache(maxsize=None)
+def tipo_columna(columna):
+    """
+    Tipo BSON de destino de una columna del CSV: el del $jsonSchema de la base
+    si el campo existe allí (p. ej. las fechas, que en el CSV son texto) o el
+    de COLUMNS_TYPES en caso contrario.
+    """
+    tipo = TIPOS_BSON.get(columna)
+    if tipo is None and columna in COLUMNS_TYPES:
+        tipo = _TIPO_BSON_DE_PYTHON[COLUMNS_TYPES[columna]]
+    return tipo
+
+
+# --- Números: int(float(x)) y float(x) memorizados por valor ---
+@lru_cache(maxsize=TAMANO_CACHE_NUMEROS)
+def entero(valor):
+    return int(float(valor))
+
+
+@lru_cache(maxsize=TAMANO_CACHE_NUMEROS)
+def decimal(valor):
+    return float(valor)
+
+
+# --- Fechas ---
+class ConversorFechas:
+    """
+    Convierte textos a fechas probando `formatos` en orden. El orden se
+    ajusta una sola vez con una muestra real de valores distintos (el formato
+    que más valores reconoce va primero).
+
+    `convertir`, llamado fila por fila (ver loader.py), usa datetime.strptime
+    con una caché LRU acotada. `serie` convierte de forma vectorizada los
+    textos nuevos de cada bloque y los agrega una sola vez por bloque a una
+    tabla de búsqueda, que se vacía si supera `tamano_cache`.
+    """
+
+    def __init__(self, formatos, tamano_cache=TAMANO_CACHE_FECHAS):
+        self.formatos = list(formatos)
+        self.tamano_cache = tamano_cache
+        self.detectado = False
+        # Textos distintos vistos por convertir() mientras no se detecta el formato
+        self._muestra = []
+        self._parsear_con_cache = lru_cache(maxsize=tamano_cache)(self._parsear)
+        # Tabla de serie(): texto -> fecha, como índice + arreglo en la misma posición
+        self._textos = pd.Index([], dtype=object)
+        self._fechas = np.array([], dtype='datetime64[us]')
+
+    def _detectar_formato(self, valores):
+        muestra = [v for v in valores if isinstance(v, str)][:TAMANO_MUESTRA_FORMATO]
+        if not muestra:
+            return
+        aciertos = {}
+        for formato in self.formatos:
+            aciertos[formato] = 0
+            for valor in muestra:
+                try:
+                    datetime.strptime(valor, formato)
+                    aciertos[formato] += 1
+                except ValueError:
+                    pass
+        # sort es estable: ante un empate se conserva el orden original
+        self.formatos.sort(key=lambda f: -aciertos[f])
+        self.detectado = True
+
+    def _parsear(self, valor):
+        # Solo llegan aquí los fallos de caché, así la muestra tiene valores distintos
+        if not self.detectado:
+            self._muestra.append(valor)
+            if len(self._muestra) >= TAMANO_MUESTRA_FORMATO:
+                self._detectar_formato(self._muestra)
+                self._muestra = []
+        for formato in self.formatos:
+            try:
+                return datetime.strptime(valor, formato)
+            except ValueError:
+                pass
+        return None
+
+    def convertir(self, valor):
+        """Retorna el datetime de `valor` o None si ningún formato lo reconoce."""
+        if not isinstance(valor, str) or valor == '':
+            return None
+        return self._parsear_con_cache(valor)
+
+    def _agregar(self, nuevos):
+        # Convierte de forma vectorizada, formato por formato, los textos que no están en la tabla
+        nuevos = pd.Series(nuevos, dtype=object)
+        if not self.detectado:
+            self._detectar_formato(nuevos.tolist())
+        convertidas = pd.Series(pd.NaT, index=nuevos.index, dtype='datetime64[us]')
+        for formato in self.formatos:
+            faltan = convertidas.isna()
+            if not faltan.any():
+                break
+            convertidas[faltan] = pd.to_datetime(nuevos[faltan], format=formato, errors='coerce')
+        convertidas = convertidas.to_numpy(dtype='datetime64[us]')
+        if len(self._textos) + len(nuevos) > self.tamano_cache:
+            self._textos = pd.Index([], dtype=object)
+            self._fechas = np.array([], dtype='datetime64[us]')
+        self._textos = self._textos.append(pd.Index(nuevos, dtype=object))
+        self._fechas = np.concatenate([self._fechas, convertidas])
+
+    def serie(self, serie):
+        """Convierte una Serie de textos en una Serie datetime64 (NaT si no se reconoce)."""
+        codigos, unicos = pd.factorize(serie.astype(object))
+        posiciones = self._textos.get_indexer(unicos)
+        if (posiciones == -1).any():
+            self._agregar(unicos[posiciones == -1])
+            posiciones = self._textos.get_indexer(unicos)
+        # El código -1 (nulo) toma el NaT agregado al final
+        valores = np.append(self._fechas[posiciones], np.datetime64('NaT'))
+        return pd.Series(valores[codigos], index=serie.index)
+
+
+_conversores_fechas = {}
+
+
+def conversor_fechas(columna):
+    """Conversor compartido (con su caché) de la columna de fechas `columna`."""
+    if columna not in _conversores_fechas:
+        _conversores_fechas[columna] = ConversorFechas(FORMATOS_FECHA.get(columna, FORMATOS_FECHA_POR_DEFECTO))
+    return _conversores_fechas[columna]
+
+
+def fechas(serie, columna):
+    return conversor_fechas(columna).serie(serie)
+
+
+# --- Conversión de un valor según el tipo de su columna ---
+_CONVERSORES = {
+    'int': entero,
+    'double': decimal,
+    'bool': lambda valor: bool(entero(valor)),
+}
+
+
+def convertir(columna, valor):
+    """
+    Convierte `valor` al tipo de `columna` (ver `tipo_columna`). Los enteros y
+    booleanos siguen la regla int(float(x)) de los loaders; los textos se
+    retornan sin cambios. Un valor numérico inválido lanza ValueError.
+    """
+    tipo = tipo_columna(columna)
+    if tipo == 'date':
+        return conversor_fechas(columna).convertir(valor)
+    conversor = _CONVERSORES.get(tipo)
+    return conversor(valor) if conversor else valor
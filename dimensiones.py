@@ -0,0 +1,76 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# Valores por defecto de los tipos creados durante la carga
+DEFAULTS_TIPO_HABITACION = {
+    "capacidad_maxima_adultos": 2,
+    "precio_base_noche": 100.0,
+    "activo": True
+}
+DEFAULTS_TIPO_CLIENTE = {
+    "activo": True
+}
+
+# Código de error de MongoDB para clave duplicada
+DUPLICATE_KEY = 11000
+
+
+def _es_valor_valido(valor):
+    return isinstance(valor, str) and valor != '' and valor.lower() != 'nan'
+
+
+# --- Caché de una tabla de dimensión ---
+class CacheDimension:
+    """
+    Mantiene en memoria el mapeo nombre -> _id de una colección de catálogo
+    (TiposHabitacion, TiposCliente). `precargar` crea de una vez todos los
+    nombres que falten mediante upserts con $setOnInsert; junto con el índice
+    único sobre el campo de nombre esto evita los duplicados que producía el
+    patrón find_one + insert_one cuando dos loaders corrían a la vez.
+    """
+
+    def __init__(self, coleccion, campo_nombre, defaults):
+        self.coleccion = coleccion
+        self.campo_nombre = campo_nombre
+        self.defaults = defaults
+        self.ids = {}
+        try:
+            coleccion.create_index(campo_nombre, unique=True)
+        except OperationFailure as e:
+            print(f"Advertencia: no se pudo asegurar el índice único {coleccion.name}.{campo_nombre}: {e}")
+
+    def precargar(self, nombres):
+        faltantes = sorted({n for n in nombres if _es_valor_valido(n)} - self.ids.keys())
+        if not faltantes:
+            return
+        operaciones = [
+            UpdateOne(
+                {self.campo_nombre: nombre},
+                {"$setOnInsert": {self.campo_nombre: nombre, **self.defaults}},
+                upsert=True
+            )
+            for nombre in faltantes
+        ]
+        try:
+            self.coleccion.bulk_write(operaciones, ordered=False)
+        except BulkWriteError as e:
+            # Otro loader insertó el mismo nombre entre medio: el documento ya existe
+            otros = [err for err in e.details.get('writeErrors', []) if err.get('code') != DUPLICATE_KEY]
+            if otros:
+                raise
+        cursor = self.coleccion.find({self.campo_nombre: {"$in": faltantes}}, {self.campo_nombre: 1})
+        for doc in cursor:
+            self.ids[doc[self.campo_nombre]] = doc['_id']
+
+    def obtener_id(self, nombre):
+        if nombre not in self.ids:
+            self.precargar([nombre])
+        return self.ids.get(nombre)
+
+
+def cache_tipos_habitacion(db):
+    return CacheDimension(db['TiposHabitacion'], "nombre_tipo_habitacion", DEFAULTS_TIPO_HABITACION)
+
+
+def cache_tipos_cliente(db):
+    return CacheDimension(db['TiposCliente'], "nombre_tipo_cliente", DEFAULTS_TIPO_CLIENTE)
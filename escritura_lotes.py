@@ -0,0 +1,332 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from esquema_bd import CAMPO_DETALLE, CAMPO_INSERCION
+from metricas import METRICAS
+
+# Tamaño de lote por defecto para las escrituras masivas
+TAMANO_LOTE_POR_DEFECTO = 1000
+
+# Puntos de sincronización que entrega LoteReservas._escrituras entre peticiones
+CLIENTES_ESCRITOS = 'clientes_escritos'
+ANTES_DEL_HISTORIAL = 'antes_del_historial'
+
+
+# --- Escritura desordenada con reporte de errores por fila ---
+def _resultado_con_errores(coleccion, e, documentos, filas):
+    fallidas = set()
+    for error in e.details.get('writeErrors', []):
+        posicion = error['index']
+        fallidas.add(posicion)
+        fila = filas[posicion] if filas else posicion
+        METRICAS.error(f"Error en fila {fila} ({coleccion.name}): {error.get('errmsg')}")
+    if documentos is not None:
+        return fallidas, set(range(len(documentos))) - fallidas
+    return fallidas, {u['index'] for u in e.details.get('upserted', [])}
+
+
+def escribir_lote(coleccion, documentos=None, operaciones=None, filas=None):
+    """
+    Inserta `documentos` con insert_many o ejecuta `operaciones` con bulk_write,
+    ambos en modo desordenado. `filas` indica, para cada posición del lote, el
+    número de fila del CSV de origen y se usa para reportar los errores que
+    devuelve BulkWriteError. Retorna el conjunto de posiciones que fallaron y
+    el de posiciones que crearon un documento (por insert o por upsert).
+    """
+    lote = documentos if documentos is not None else operaciones
+    if not lote:
+        return set(), set()
+    try:
+        if documentos is not None:
+            coleccion.insert_many(documentos, ordered=False)
+            return set(), set(range(len(documentos)))
+        resultado = coleccion.bulk_write(operaciones, ordered=False)
+        return set(), set(resultado.upserted_ids)
+    except BulkWriteError as e:
+        return _resultado_con_errores(coleccion, e, documentos, filas)
+
+
+async def escribir_lote_async(coleccion, documentos=None, operaciones=None, filas=None):
+    """Versión de `escribir_lote` para colecciones de un driver asíncrono."""
+    lote = documentos if documentos is not None else operaciones
+    if not lote:
+        return set(), set()
+    try:
+        if documentos is not None:
+            await coleccion.insert_many(documentos, ordered=False)
+            return set(), set(range(len(documentos)))
+        resultado = await coleccion.bulk_write(operaciones, ordered=False)
+        return set(), set(resultado.upserted_ids)
+    except BulkWriteError as e:
+        return _resultado_con_errores(coleccion, e, documentos, filas)
+
+
+def _crear_si_no_existe(documento):
+    # Upsert idempotente: solo escribe el documento si su _id aún no existe
+    campos = {k: v for k, v in documento.items() if k != '_id'}
+    return UpdateOne({"_id": documento['_id']}, {"$setOnInsert": campos}, upsert=True)
+
+
+def marcar_insercion(*documentos):
+    """Fija en `documentos` CAMPO_INSERCION con el instante actual, justo antes de escribirlos."""
+    ahora = datetime.now(timezone.utc)
+    for documento in documentos:
+        documento[CAMPO_INSERCION] = ahora
+
+
+def embeber_detalle(detalle, reserva):
+    """
+    Documento de Reservas del modo de esquema embebido: `reserva` sin
+    detalle_reserva_id y con `detalle` (sin reserva_id) en CAMPO_DETALLE.
+    """
+    documento = {k: v for k, v in reserva.items() if k != 'detalle_reserva_id'}
+    documento[CAMPO_DETALLE] = {k: v for k, v in detalle.items() if k != 'reserva_id'}
+    return documento
+
+
+def encadenar(*funciones):
+    """Combina varias funciones `al_escribir` en una (los None se ignoran); None si no queda ninguna."""
+    funciones = [f for f in funciones if f is not None]
+    if len(funciones) <= 1:
+        return funciones[0] if funciones else None
+
+    def al_escribir(ids_reservas):
+        for funcion in funciones:
+            funcion(ids_reservas)
+    return al_escribir
+
+
+# --- Acumulador de lotes Clientes/DetallesReserva/Reservas ---
+class LoteReservas:
+    """
+    Acumula los documentos generados por cada fila del CSV y los escribe por
+    colección en lotes. El vaciado respeta las dependencias entre documentos:
+    si falla un cliente nuevo no se escriben sus reservas, y si falla un
+    detalle no se escribe la reserva de esa fila.
+
+    Con `upsert=True` los documentos se escriben con $setOnInsert sobre su
+    `_id` y el historial con $addToSet, de modo que repetir un lote ya escrito
+    (por ejemplo al reanudar una carga) no crea duplicados.
+
+    El historial_ids_reservas se agrupa por cliente: los clientes nuevos lo
+    reciben completo al insertarse y los ya existentes con una sola
+    actualización $each por cliente y lote, en lugar de un $push por reserva.
+
+    Con `embebido=True` (modo de esquema embebido) el detalle se escribe
+    dentro de su reserva: un solo lote por fila en lugar de dos.
+
+    Si se indica `al_escribir`, se llama tras cada vaciado con los _id de las
+    reservas que ese lote creó (p. ej. `analitica.actualizador`). Solo se
+    pasan las creadas: repetir un lote ya escrito no las vuelve a contar.
+
+    La secuencia de escrituras está en `_escrituras`, que no hace I/O: entrega
+    cada petición y recibe su resultado. `vaciar` la ejecuta con PyMongo y
+    `vaciar_async` con un driver asíncrono.
+
+    `clientes_fallidos` acumula los _id de clientes que no se insertaron; si
+    varios lotes comparten el conjunto, las reservas de un lote que apuntan a
+    un cliente fallido en otro lote tampoco se escriben.
+    """
+
+    def __init__(self, db, tamano_lote=TAMANO_LOTE_POR_DEFECTO, upsert=False, embebido=False, al_escribir=None,
+                 clientes_fallidos=None):
+        self.clientes_col = db['Clientes']
+        self.reservas_col = db['Reservas']
+        self.detalles_reserva_col = db['DetallesReserva']
+        self.tamano_lote = tamano_lote
+        self.upsert = upsert
+        self.embebido = embebido
+        self.al_escribir = al_escribir
+        self.clientes_fallidos = clientes_fallidos if clientes_fallidos is not None else set()
+        self.reservas_creadas = []  # _id de las reservas creadas por el último vaciado
+        self.clientes = []  # (fila, documento cliente)
+        self.filas = []  # (fila, detalle, reserva)
+        self.clientes_insertados = 0
+        self.detalles_insertados = 0
+        self.reservas_insertadas = 0
+        self.filas_fallidas = 0
+        self.lotes_escritos = 0
+
+    def agregar_cliente(self, fila, cliente_data):
+        self.clientes.append((fila, cliente_data))
+
+    def agregar_reserva(self, fila, detalle_reserva_data, reserva_data):
+        self.filas.append((fila, detalle_reserva_data, reserva_data))
+
+    def _peticion_documentos(self, coleccion, documentos, filas):
+        # Con upsert la marca va en el $setOnInsert: solo la recibe el documento que se crea
+        marcar_insercion(*documentos)
+        if self.upsert:
+            return coleccion, None, [_crear_si_no_existe(d) for d in documentos], filas
+        return coleccion, documentos, None, filas
+
+    def fallida(self, fila, error=None):
+        """Cuenta una fila que no se pudo cargar y reporta `error` si se indica."""
+        self.filas_fallidas += 1
+        METRICAS.contar('filas_fallidas')
+        if error:
+            METRICAS.error(f"Error en fila {fila}: {error}")
+
+    def lleno(self):
+        return len(self.filas) >= self.tamano_lote
+
+    def vaciar(self):
+        """Escribe el lote y retorna los documentos de clientes que no se insertaron."""
+        with METRICAS.etapa('escritura'):
+            escrituras = self._escrituras()
+            try:
+                peticion = next(escrituras)
+                while True:
+                    resultado = escribir_lote(*peticion) if isinstance(peticion, tuple) else None
+                    peticion = escrituras.send(resultado)
+            except StopIteration as fin:
+                no_insertados = fin.value
+            if self.al_escribir is not None and self.reservas_creadas:
+                self.al_escribir(self.reservas_creadas)
+            return no_insertados
+
+    async def vaciar_async(self, antes_del_historial=None, clientes_anteriores=None, clientes_escritos=None):
+        """
+        Igual que `vaciar`, con colecciones asíncronas. Si se indica, se espera
+        `antes_del_historial` (p. ej. el lote anterior) antes de actualizar el
+        historial de clientes que pudieron crearse en lotes aún en vuelo.
+
+        Con lotes en vuelo que comparten `clientes_fallidos`, cada lote espera
+        el evento `clientes_anteriores` (los clientes de los lotes anteriores
+        ya se escribieron) antes de filtrar sus reservas, y marca
+        `clientes_escritos` cuando también terminó los suyos.
+        """
+        escrituras = self._escrituras()
+        try:
+            peticion = next(escrituras)
+            while True:
+                if peticion == CLIENTES_ESCRITOS:
+                    if clientes_anteriores is not None:
+                        await clientes_anteriores.wait()
+                    if clientes_escritos is not None:
+                        clientes_escritos.set()
+                    resultado = None
+                elif peticion == ANTES_DEL_HISTORIAL:
+                    if antes_del_historial is not None:
+                        await antes_del_historial
+                    resultado = None
+                else:
+                    resultado = await escribir_lote_async(*peticion)
+                peticion = escrituras.send(resultado)
+        except StopIteration as fin:
+            no_insertados = fin.value
+        finally:
+            # Un lote vacío o fallido no debe dejar esperando a los siguientes
+            if clientes_escritos is not None and not clientes_escritos.is_set():
+                if clientes_anteriores is not None and not clientes_anteriores.is_set():
+                    await clientes_anteriores.wait()
+                clientes_escritos.set()
+        if self.al_escribir is not None and self.reservas_creadas:
+            # al_escribir usa PyMongo: corre en un hilo para no bloquear el event loop
+            await asyncio.to_thread(self.al_escribir, self.reservas_creadas)
+        return no_insertados
+
+    def _escrituras(self):
+        """
+        Genera las peticiones (coleccion, documentos, operaciones, filas) del
+        lote y recibe el resultado de cada una. Entrega None como punto de
+        sincronización CLIENTES_ESCRITOS tras escribir los clientes nuevos y
+        ANTES_DEL_HISTORIAL justo antes de actualizar el historial de clientes.
+        """
+        self.reservas_creadas = []
+        if not self.clientes and not self.filas:
+            return []
+
+        # Reservas del lote agrupadas por cliente
+        reservas_por_cliente = defaultdict(list)
+        for _, _, reserva in self.filas:
+            reservas_por_cliente[reserva['cliente_id']].append(reserva['_id'])
+
+        # 1. Clientes nuevos del lote, con su historial ya incluido
+        for _, cliente in self.clientes:
+            cliente['historial_ids_reservas'] = list(reservas_por_cliente.get(cliente['_id'], []))
+        fallidas, creadas = yield self._peticion_documentos(
+            self.clientes_col,
+            [c for _, c in self.clientes],
+            [f for f, _ in self.clientes]
+        )
+        clientes_no_insertados = [self.clientes[i][1] for i in fallidas]
+        # Con upsert, un cliente que ya existía no recibió el historial del $setOnInsert
+        clientes_con_historial = {self.clientes[i][1]['_id'] for i in creadas}
+        self.clientes_insertados += len(creadas)
+        METRICAS.contar('clientes_insertados', len(creadas))
+
+        # Con lotes en vuelo, aquí ya terminaron los clientes de los lotes anteriores
+        yield CLIENTES_ESCRITOS
+        for i, (_, cliente) in enumerate(self.clientes):
+            # Un cliente que falló antes puede haberse creado ahora con el mismo _id
+            if i in fallidas:
+                self.clientes_fallidos.add(cliente['_id'])
+            else:
+                self.clientes_fallidos.discard(cliente['_id'])
+        pendientes = []
+        for fila, detalle, reserva in self.filas:
+            if reserva['cliente_id'] in self.clientes_fallidos:
+                self.fallida(fila, "no se insertó el cliente de la reserva")
+            else:
+                pendientes.append((fila, detalle, reserva))
+        escritas = len(pendientes)
+
+        # 2. Detalles de reserva (en el modo embebido van dentro de la reserva)
+        if not self.embebido:
+            fallidas, creadas = yield self._peticion_documentos(
+                self.detalles_reserva_col,
+                [d for _, d, _ in pendientes],
+                [f for f, _, _ in pendientes]
+            )
+            self.detalles_insertados += len(creadas)
+            self.filas_fallidas += len(fallidas)
+            METRICAS.contar('detalles_insertados', len(creadas))
+            METRICAS.contar('filas_fallidas', len(fallidas))
+            pendientes = [p for i, p in enumerate(pendientes) if i not in fallidas]
+
+        # 3. Reservas
+        fallidas, creadas = yield self._peticion_documentos(
+            self.reservas_col,
+            [embeber_detalle(d, r) if self.embebido else r for _, d, r in pendientes],
+            [f for f, _, _ in pendientes]
+        )
+        if self.embebido:
+            self.detalles_insertados += len(creadas)
+            METRICAS.contar('detalles_insertados', len(creadas))
+        self.reservas_insertadas += len(creadas)
+        self.reservas_creadas = [pendientes[i][2]['_id'] for i in sorted(creadas)]
+        self.filas_fallidas += len(fallidas)
+        METRICAS.contar('reservas_insertadas', len(creadas))
+        METRICAS.contar('filas_fallidas', len(fallidas))
+        pendientes = [p for i, p in enumerate(pendientes) if i not in fallidas]
+
+        # 4. Historial de los clientes existentes: una operación por cliente
+        operador = "$addToSet" if self.upsert else "$push"
+        escritas_por_cliente = defaultdict(list)
+        for _, _, reserva in pendientes:
+            escritas_por_cliente[reserva['cliente_id']].append(reserva['_id'])
+        operaciones = [
+            UpdateOne({"_id": cliente_id}, {operador: {"historial_ids_reservas": {"$each": ids}}})
+            for cliente_id, ids in escritas_por_cliente.items()
+            if cliente_id not in clientes_con_historial
+        ]
+        # Si fallaron reservas de clientes nuevos, se retiran de su historial
+        if len(pendientes) < escritas:
+            ids_escritos = {r['_id'] for _, _, r in pendientes}
+            for cliente_id in clientes_con_historial:
+                no_escritas = [i for i in reservas_por_cliente[cliente_id] if i not in ids_escritos]
+                if no_escritas:
+                    operaciones.append(UpdateOne({"_id": cliente_id}, {"$pullAll": {"historial_ids_reservas": no_escritas}}))
+        yield ANTES_DEL_HISTORIAL
+        yield self.clientes_col, None, operaciones, None
+
+        self.lotes_escritos += 1
+        METRICAS.contar('lotes_escritos')
+        self.clientes = []
+        self.filas = []
+        return clientes_no_insertados
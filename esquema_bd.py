@@ -0,0 +1,248 @@
+# Esquema de CostaDelInkaDB en Python: columnas del CSV, validadores $jsonSchema
+# e índices. Los validadores y los índices reflejan los de CreacionBD_CostaInka.js;
+# si se cambia uno, hay que cambiar el otro.
+
+# Columnas esperadas del CSV y sus tipos
+COLUMNS_TYPES = {
+    'hotel': str,
+    'fue_cancelada': int,
+    'tiempo_anticipacion_reserva_dias': int,
+    'anio_llegada': int,
+    'mes_llegada': str,
+    'semana_llegada': int,
+    'dia_llegada': int,
+    'noches_fin_semana': int,
+    'noches_semana': int,
+    'adultos': int,
+    'ninos': float,
+    'bebes': float,
+    'regimen_alimenticio': str,
+    'pais_origen_cliente': str,
+    'segmento_mercado': str,
+    'canal_reserva': str,
+    'es_huesped_recurrente_historico': int,
+    'total_cancelaciones_previas_cliente': int,
+    'total_reservas_previas_no_canceladas_cliente': int,
+    'tipo_habitacion_reservada': str,
+    'tipo_habitacion_asignada': str,
+    'cambios_en_reserva': int,
+    'agente': str,
+    'compania': str,
+    'dias_en_lista_espera': int,
+    'tipo_cliente_en_reserva': str,
+    'adr': float,
+    'espacios_estacionamiento_requeridos': int,
+    'total_solicitudes_especiales': int,
+    'estado_reserva': str,
+    'fecha_estado_reserva': str,
+    'nombre_completo': str,
+    'email': str,
+    'telefono': str,
+    'tipo_documento_identidad': str,
+    'numero_documento_identidad': str,
+    'fecha_nacimiento': str
+}
+
+
+def _validador(coleccion, requeridos, propiedades):
+    return {
+        "$jsonSchema": {
+            "bsonType": "object",
+            "title": f"Validador de la Colección {coleccion}",
+            "required": requeridos,
+            "properties": {"_id": {"bsonType": "objectId"}, **propiedades}
+        }
+    }
+
+
+# --- Validadores por colección ---
+VALIDADORES = {
+    "Clientes": _validador("Clientes", ["nombre_completo", "email"], {
+        "nombre_completo": {"bsonType": "string", "description": "Debe ser un string y es requerido"},
+        "email": {"bsonType": "string", "description": "Debe ser un string, es requerido y debe ser único"},
+        "telefono": {"bsonType": "string"},
+        "tipo_documento_identidad": {"bsonType": "string"},
+        "numero_documento_identidad": {"bsonType": "string", "description": "Debe ser único en combinación con tipo_documento_identidad"},
+        "fecha_nacimiento": {"bsonType": "date"},
+        "pais_origen_cliente": {"bsonType": "string"},
+        "es_huesped_recurrente_historico": {"bsonType": "bool"},
+        "total_cancelaciones_previas_cliente": {"bsonType": "int", "minimum": 0},
+        "total_reservas_previas_no_canceladas_cliente": {"bsonType": "int", "minimum": 0},
+        "historial_ids_reservas": {"bsonType": "array", "items": {"bsonType": "objectId"}}
+    }),
+    "Reservas": _validador("Reservas", [
+        "cliente_id", "detalle_reserva_id", "fecha_creacion_reserva", "fue_cancelada",
+        "fecha_llegada", "fecha_salida", "noches_estadia", "estado_reserva",
+        "fecha_estado_reserva", "adr"
+    ], {
+        "cliente_id": {"bsonType": "objectId", "description": "FK a Clientes, requerido"},
+        "detalle_reserva_id": {"bsonType": "objectId", "description": "FK a DetallesReserva, requerido"},
+        "fecha_creacion_reserva": {"bsonType": "date", "description": "Requerido"},
+        "fue_cancelada": {"bsonType": "bool", "description": "Requerido"},
+        "tiempo_anticipacion_reserva_dias": {"bsonType": "int", "minimum": 0},
+        "fecha_llegada": {"bsonType": "date", "description": "Requerido"},
+        "fecha_salida": {"bsonType": "date", "description": "Requerido"},
+        "noches_estadia": {"bsonType": "int", "minimum": 1, "description": "Requerido"},
+        "estado_reserva": {"bsonType": "string", "description": "Requerido"},
+        "fecha_estado_reserva": {"bsonType": "date", "description": "Requerido"},
+        "adr": {"bsonType": "double", "minimum": 0, "description": "Requerido"},
+        "canal_reserva": {"bsonType": "string"}
+    }),
+    "DetallesReserva": _validador("DetallesReserva", ["reserva_id", "tipo_habitacion_reservada"], {
+        "reserva_id": {"bsonType": "objectId", "description": "FK a Reservas, requerido y único"},
+        "pais_origen_reserva": {"bsonType": "string"},
+        "es_huesped_recurrente_al_reservar": {"bsonType": "bool"},
+        "cancelaciones_previas_cliente_al_reservar": {"bsonType": "int", "minimum": 0},
+        "reservas_previas_no_canceladas_cliente_al_reservar": {"bsonType": "int", "minimum": 0},
+        "tipo_habitacion_reservada": {"bsonType": "string", "description": "Requerido"},
+        "tipo_habitacion_asignada": {"bsonType": "string"},
+        "cambios_en_reserva": {"bsonType": "int", "minimum": 0},
+        "tipo_cliente_en_reserva": {"bsonType": "string"}
+    }),
+    "Pagos": _validador("Pagos", ["reserva_id", "monto_total", "moneda", "fecha_pago", "modalidad_pago_id", "estado_pago"], {
+        "reserva_id": {"bsonType": "objectId", "description": "FK a Reservas, requerido"},
+        "cliente_id": {"bsonType": "objectId", "description": "FK a Clientes"},
+        "monto_total": {"bsonType": "double", "minimum": 0, "description": "Requerido"},
+        "moneda": {"bsonType": "string", "description": "Requerido"},
+        "fecha_pago": {"bsonType": "date", "description": "Requerido"},
+        "modalidad_pago_id": {"bsonType": "objectId", "description": "FK a ModalidadesPago, requerido"},
+        "estado_pago": {"bsonType": "string", "description": "Requerido"},
+        "tipo_documento_pago_id": {"bsonType": "objectId", "description": "FK a TiposDocumentoPago"},
+        "numero_documento_pago_emitido": {"bsonType": "string"}
+    }),
+    "TiposHabitacion": _validador("TiposHabitacion", ["nombre_tipo_habitacion", "capacidad_maxima_adultos", "precio_base_noche", "activo"], {
+        "nombre_tipo_habitacion": {"bsonType": "string", "description": "Requerido y único"},
+        "codigo_interno_tipo": {"bsonType": "string", "description": "Único si se provee"},
+        "descripcion": {"bsonType": "string"},
+        "capacidad_maxima_adultos": {"bsonType": "int", "minimum": 1, "description": "Requerido"},
+        "capacidad_maxima_ninos": {"bsonType": "int", "minimum": 0},
+        "precio_base_noche": {"bsonType": "double", "minimum": 0, "description": "Requerido"},
+        "activo": {"bsonType": "bool", "description": "Requerido"},
+        "fotos_urls": {"bsonType": "array", "items": {"bsonType": "string"}}
+    }),
+    "TiposCliente": _validador("TiposCliente", ["nombre_tipo_cliente"], {
+        "nombre_tipo_cliente": {"bsonType": "string", "description": "Requerido y único"},
+        "codigo_interno_tipo_cliente": {"bsonType": "string", "description": "Único si se provee"},
+        "descripcion": {"bsonType": "string"},
+        "condiciones_especiales": {"bsonType": "string"}
+    }),
+    "ModalidadesPago": _validador("ModalidadesPago", ["nombre_modalidad", "activo"], {
+        "nombre_modalidad": {"bsonType": "string", "description": "Requerido y único"},
+        "descripcion": {"bsonType": "string"},
+        "proveedor_pasarela": {"bsonType": "string"},
+        "activo": {"bsonType": "bool", "description": "Requerido"}
+    }),
+    "TiposDocumentoPago": _validador("TiposDocumentoPago", ["nombre_documento", "activo"], {
+        "nombre_documento": {"bsonType": "string", "description": "Requerido y único"},
+        "requiere_datos_empresa_cliente": {"bsonType": "bool"},
+        "activo": {"bsonType": "bool", "description": "Requerido"}
+    }),
+}
+
+COLECCIONES = list(VALIDADORES)
+
+# Opciones de validación de todas las colecciones (collMod del script JS)
+OPCIONES_VALIDACION = {"validationLevel": "strict", "validationAction": "error"}
+
+# Instante (UTC) en que los loaders escriben cada documento de Clientes, Reservas
+# y DetallesReserva. Los _id son hashes deterministas (carga_incremental.py), no
+# crecen con el tiempo: los backups incrementales de backup_db.py usan este campo.
+CAMPO_INSERCION = "insertado_en"
+
+
+def tipos_bson(coleccion=None):
+    """Retorna {campo: bsonType} de una colección, o de todas si no se indica."""
+    colecciones = [coleccion] if coleccion else COLECCIONES
+    tipos = {}
+    for nombre in colecciones:
+        for campo, propiedad in VALIDADORES[nombre]["$jsonSchema"]["properties"].items():
+            tipos.setdefault(campo, propiedad["bsonType"])
+    return tipos
+
+
+# --- Índices por colección: (claves, opciones), como en CreacionBD_CostaInka.js ---
+INDICES = {
+    "Clientes": [
+        ([("email", 1)], {"unique": True}),
+        ([("tipo_documento_identidad", 1), ("numero_documento_identidad", 1)], {"unique": True, "sparse": True}),
+    ],
+    "Reservas": [
+        ([("cliente_id", 1)], {}),
+        ([("detalle_reserva_id", 1)], {"unique": True}),
+        ([("fecha_llegada", 1)], {}),
+        ([("estado_reserva", 1)], {}),
+    ],
+    "DetallesReserva": [
+        ([("reserva_id", 1)], {"unique": True}),
+        ([("tipo_habitacion_reservada", 1)], {}),
+    ],
+    "Pagos": [
+        ([("reserva_id", 1)], {}),
+        ([("cliente_id", 1)], {}),
+        ([("modalidad_pago_id", 1)], {}),
+        ([("fecha_pago", -1)], {}),
+    ],
+    "TiposHabitacion": [
+        ([("nombre_tipo_habitacion", 1)], {"unique": True}),
+        ([("codigo_interno_tipo", 1)], {"unique": True, "sparse": True}),
+    ],
+    "TiposCliente": [
+        ([("nombre_tipo_cliente", 1)], {"unique": True}),
+        ([("codigo_interno_tipo_cliente", 1)], {"unique": True, "sparse": True}),
+    ],
+    "ModalidadesPago": [
+        ([("nombre_modalidad", 1)], {"unique": True}),
+    ],
+    "TiposDocumentoPago": [
+        ([("nombre_documento", 1)], {"unique": True}),
+    ],
+}
+
+
+# --- Modo embebido: el detalle de cada reserva como subdocumento de Reservas ---
+# Reservas y DetallesReserva son 1 a 1. En el modo 'embebido' (solo Python, no
+# está en CreacionBD_CostaInka.js) cada reserva guarda su detalle, con el _id
+# del detalle y sin reserva_id, en el campo CAMPO_DETALLE: una escritura y
+# ninguna búsqueda extra por reserva, y sin los índices únicos 1 a 1.
+MODOS_ESQUEMA = ['separado', 'embebido']
+CAMPO_DETALLE = "detalle"
+
+
+def _validador_reservas_embebido():
+    esquema = VALIDADORES["Reservas"]["$jsonSchema"]
+    detalle = VALIDADORES["DetallesReserva"]["$jsonSchema"]
+    propiedades = {k: v for k, v in esquema["properties"].items() if k not in ("_id", "detalle_reserva_id")}
+    propiedades[CAMPO_DETALLE] = {
+        "bsonType": "object",
+        "description": "Detalle de la reserva embebido, requerido",
+        "required": [c for c in detalle["required"] if c != "reserva_id"],
+        "properties": {k: v for k, v in detalle["properties"].items() if k != "reserva_id"},
+    }
+    requeridos = [c for c in esquema["required"] if c != "detalle_reserva_id"] + [CAMPO_DETALLE]
+    return _validador("Reservas", requeridos, propiedades)
+
+
+VALIDADORES_EMBEBIDO = {
+    **{c: v for c, v in VALIDADORES.items() if c != "DetallesReserva"},
+    "Reservas": _validador_reservas_embebido(),
+}
+
+INDICES_EMBEBIDO = {
+    **{c: i for c, i in INDICES.items() if c != "DetallesReserva"},
+    "Reservas": [
+        ([("cliente_id", 1)], {}),
+        ([("fecha_llegada", 1)], {}),
+        ([("estado_reserva", 1)], {}),
+        ([(f"{CAMPO_DETALLE}.tipo_habitacion_reservada", 1)], {}),
+    ],
+}
+
+
+def validadores_de(modo='separado'):
+    """Validadores por colección del modo de esquema `modo`."""
+    return VALIDADORES_EMBEBIDO if modo == 'embebido' else VALIDADORES
+
+
+def indices_de(modo='separado'):
+    """Índices por colección del modo de esquema `modo`."""
+    return INDICES_EMBEBIDO if modo == 'embebido' else INDICES
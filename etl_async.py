@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+
+from pymongo import MongoClient
+
+try:
+    # PyMongo >= 4.10 incluye un cliente asyncio nativo
+    from pymongo import AsyncMongoClient
+except ImportError:
+    from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+from carga_incremental import Checkpoint, ClavesReserva
+from dimensiones import cache_tipos_habitacion
+from escritura_lotes import LoteReservas, TAMANO_LOTE_POR_DEFECTO
+from esquema_bd import MODOS_ESQUEMA
+from etl_carga_mongodb import INPUT_FILE, al_escribir_carga, resolver_documentos
+from formato_intermedio import leer_por_bloques, ruta_por_defecto, valores_distintos
+from identidad_clientes import IndiceClientes
+from indices import preparar_carga
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+TAMANO_BLOQUE_POR_DEFECTO = 5000
+LOTES_EN_VUELO_POR_DEFECTO = 4
+
+
+def _en_etapa(nombre, funcion, *args):
+    # Para las funciones que corren en un hilo con asyncio.to_thread
+    with METRICAS.etapa(nombre):
+        return funcion(*args)
+
+
+async def _escribir(lote, anterior, semaforo, checkpoint, ultima_posicion, indice_clientes,
+                    clientes_anteriores, clientes_escritos):
+    """
+    Escribe un lote y libera su cupo del semáforo. Antes de actualizar el
+    historial espera al lote anterior, así los lotes se confirman en orden y
+    ningún $each llega antes que el insert del cliente que creó un lote previo.
+
+    Antes de escribir sus reservas espera a que los lotes anteriores hayan
+    escrito sus clientes (eventos `clientes_anteriores`/`clientes_escritos`):
+    las reservas de un cliente que falló en otro lote se cuentan como fallidas
+    en lugar de quedar apuntando a un cliente inexistente. Los clientes
+    rechazados se descartan del índice apenas termina el lote, para que las
+    filas que se resuelvan después los vuelvan a crear.
+    """
+    try:
+        no_insertados = await lote.vaciar_async(anterior, clientes_anteriores, clientes_escritos)
+        for cliente_doc in no_insertados:
+            indice_clientes.descartar(cliente_doc)
+        if anterior is not None:
+            await anterior
+        if checkpoint is not None:
+            # PyMongo síncrono: en un hilo, para no bloquear los lotes en vuelo
+            await asyncio.to_thread(checkpoint.guardar, ultima_posicion)
+        METRICAS.progreso(f"  - Lote escrito hasta la fila {ultima_posicion}")
+        return no_insertados
+    finally:
+        semaforo.release()
+
+
+async def cargar_async(ruta, mongo_uri=MONGO_URI, db_name=DB_NAME, tamano_bloque=TAMANO_BLOQUE_POR_DEFECTO,
+                       tamano_lote=TAMANO_LOTE_POR_DEFECTO, lotes_en_vuelo=LOTES_EN_VUELO_POR_DEFECTO,
+                       checkpoint=None, embebido=False, analitica=False, indice_ocupacion=None):
+    """
+    Lee `ruta` por bloques y escribe los lotes con un driver asíncrono. La
+    lectura y la transformación de cada bloque corren en un hilo mientras los
+    lotes anteriores siguen escribiéndose; el semáforo limita los lotes en
+    vuelo, de modo que si MongoDB se atrasa la lectura se detiene.
+    """
+    if checkpoint is not None and checkpoint.completado:
+        print("Este archivo ya se cargó completo en esta base: no hay nada que cargar.")
+        return []
+    desde = checkpoint.ultima_fila if checkpoint is not None else 0
+
+    # Preparación (una sola vez): índice de clientes y tipos de habitación
+    client = MongoClient(mongo_uri)
+    try:
+        db = client[db_name]
+        indice_clientes = IndiceClientes(db['Clientes'])
+        tipos_habitacion = cache_tipos_habitacion(db)
+        tipos_habitacion.precargar(valores_distintos(ruta, ['tipo_habitacion_reservada'])['tipo_habitacion_reservada'])
+    finally:
+        client.close()
+
+    async_client = AsyncMongoClient(mongo_uri)
+    db = async_client[db_name]
+    # Resúmenes e índice de ocupación se actualizan con PyMongo síncrono, en un hilo
+    # (ver LoteReservas.vaciar_async)
+    client_analitica = MongoClient(mongo_uri) if analitica or indice_ocupacion else None
+    al_escribir = al_escribir_carga(client_analitica[db_name], embebido, analitica, indice_ocupacion) \
+        if client_analitica is not None else None
+    semaforo = asyncio.Semaphore(lotes_en_vuelo)
+    claves_reserva = ClavesReserva()
+    lotes, tareas = [], []
+    anterior = clientes_anteriores = None
+    # Clientes que no se insertaron, compartidos por todos los lotes en vuelo
+    clientes_fallidos = set()
+
+    def nuevo_lote():
+        return LoteReservas(db, tamano_lote, upsert=True, embebido=embebido, al_escribir=al_escribir,
+                            clientes_fallidos=clientes_fallidos)
+
+    lote = nuevo_lote()
+    posicion = desde
+
+    async def despachar(lote, posicion):
+        nonlocal anterior, clientes_anteriores
+        await semaforo.acquire()
+        clientes_escritos = asyncio.Event()
+        anterior = asyncio.create_task(_escribir(lote, anterior, semaforo, checkpoint, posicion, indice_clientes,
+                                                 clientes_anteriores, clientes_escritos))
+        clientes_anteriores = clientes_escritos
+        tareas.append(anterior)
+        lotes.append(lote)
+
+    try:
+        lector = leer_por_bloques(ruta, tamano_bloque, dtype_csv=str)
+        inicio = 0
+        while True:
+            bloque = await asyncio.to_thread(_en_etapa, 'lectura', next, lector, None)
+            if bloque is None:
+                break
+            # La parte vectorizada de la transformación se calcula fuera del event loop
+            documentos = await asyncio.to_thread(
+                _en_etapa, 'transformacion',
+                lambda b=bloque, i=inicio: list(resolver_documentos(b, indice_clientes, claves_reserva, desde, i))
+            )
+            inicio += len(bloque)
+            for posicion, fila, error, cliente_nuevo, detalle_reserva_data, reserva_data in documentos:
+                if error:
+                    lote.fallida(fila, error)
+                    continue
+                if cliente_nuevo is not None:
+                    lote.agregar_cliente(fila, cliente_nuevo)
+                lote.agregar_reserva(fila, detalle_reserva_data, reserva_data)
+                if lote.lleno():
+                    await despachar(lote, posicion)
+                    lote = nuevo_lote()
+        if lote.clientes or lote.filas:
+            await despachar(lote, posicion)
+
+        await asyncio.gather(*tareas)
+        if checkpoint is not None:
+            await asyncio.to_thread(checkpoint.guardar, posicion, True)
+    finally:
+        # Si un lote falló, los demás terminan antes de cerrar los clientes
+        await asyncio.gather(*tareas, return_exceptions=True)
+        # AsyncMongoClient.close() es una corrutina; la de Motor es síncrona
+        cierre = async_client.close()
+        if asyncio.iscoroutine(cierre):
+            await cierre
+        if client_analitica is not None:
+            client_analitica.close()
+    return lotes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga asíncrona de hotel_bookings_es_validado.csv en CostaDelInkaDB')
+    parser.add_argument('--archivo', default=ruta_por_defecto(INPUT_FILE))
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--tamano-bloque', type=int, default=TAMANO_BLOQUE_POR_DEFECTO)
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_POR_DEFECTO)
+    parser.add_argument('--lotes-en-vuelo', type=int, default=LOTES_EN_VUELO_POR_DEFECTO,
+                        help='Máximo de lotes escribiéndose a la vez')
+    parser.add_argument('--sin-checkpoint', action='store_true')
+    parser.add_argument('--carga-masiva', action='store_true',
+                        help='Quitar los índices secundarios de Reservas/DetallesReserva y reconstruirlos al final')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='separado: Reservas y DetallesReserva; embebido: el detalle dentro de cada reserva')
+    parser.add_argument('--analitica', action='store_true',
+                        help='Actualizar los resúmenes de analitica.py tras cada lote')
+    parser.add_argument('--indice-ocupacion', metavar='RUTA',
+                        help='Mantener al día tras cada lote el índice de ocupación de ocupacion.py (.npz)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    # Los índices y el checkpoint se administran con un cliente síncrono, fuera del event loop
+    client = MongoClient(args.mongo_uri)
+    try:
+        checkpoint = None if args.sin_checkpoint else Checkpoint(client[DB_NAME], args.archivo)
+        with preparar_carga(client[DB_NAME], args.carga_masiva, args.esquema):
+            lotes = asyncio.run(cargar_async(
+                args.archivo, args.mongo_uri, DB_NAME, args.tamano_bloque,
+                args.tamano_lote, args.lotes_en_vuelo, checkpoint, args.esquema == 'embebido', args.analitica,
+                args.indice_ocupacion
+            ))
+    finally:
+        client.close()
+
+    print(f"\nResumen de carga:")
+    print(f"Lotes escritos: {sum(l.lotes_escritos for l in lotes)}")
+    print(f"Clientes insertados: {sum(l.clientes_insertados for l in lotes)}")
+    print(f"Reservas insertadas: {sum(l.reservas_insertadas for l in lotes)}")
+    print(f"Detalles de reserva insertados: {sum(l.detalles_insertados for l in lotes)}")
+    print(f"Filas con error: {sum(l.filas_fallidas for l in lotes)}")
+    finalizar(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,168 +1,424 @@
+import argparse
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
+from itertools import count
 from pymongo import MongoClient
 from bson.objectid import ObjectId
 
-# --- Conexión a MongoDB ---
-try:
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['CostaDelInkaDB']
-    print("Conexión a MongoDB exitosa.")
-except Exception as e:
-    print(f"Error al conectar a MongoDB: {e}")
-    exit()
-
-clientes_col = db['Clientes']
-reservas_col = db['Reservas']
-detalles_reserva_col = db['DetallesReserva']
-tipos_habitacion_col = db['TiposHabitacion']
-tipos_cliente_col = db['TiposCliente']
-
-# --- Función para crear o obtener tipo de habitación ---
-def get_or_create_tipo_habitacion(tipo_habitacion):
-    tipo_habitacion_doc = tipos_habitacion_col.find_one({"nombre_tipo_habitacion": tipo_habitacion})
-    if not tipo_habitacion_doc:
-        tipo_habitacion_id = ObjectId()
-        tipo_habitacion_data = {
-            "_id": tipo_habitacion_id,
-            "nombre_tipo_habitacion": tipo_habitacion,
-            "capacidad_maxima_adultos": 2,
-            "precio_base_noche": 100.0,
-            "activo": True
-        }
-        tipos_habitacion_col.insert_one(tipo_habitacion_data)
-        return tipo_habitacion_id
-    return tipo_habitacion_doc['_id']
+from escritura_lotes import LoteReservas, TAMANO_LOTE_POR_DEFECTO, embeber_detalle, encadenar, marcar_insercion
+from analitica import actualizador as actualizador_analitica
+from esquema_bd import MODOS_ESQUEMA
+from identidad_clientes import IndiceClientes
+from dimensiones import cache_tipos_habitacion
+from carga_incremental import Checkpoint, ClavesReserva, id_cliente
+from conversores import fechas
+from formato_intermedio import leer_tabla, ruta_por_defecto
+from indices import preparar_carga
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+from ocupacion import actualizador as actualizador_ocupacion
 
-# --- ETL sobre hotel_bookings_es_validado.csv ---
-input_file = 'hotel_bookings_es_validado.csv'
-df = pd.read_csv(input_file, dtype=str)
-print(f"Leídas {len(df)} filas de {input_file}")
+INPUT_FILE = 'hotel_bookings_es_validado.parquet'
+MESES = ['Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre']
 
-clientes_insertados = 0
-reservas_insertadas = 0
-detalles_insertados = 0
+# Columnas que se convierten con int(float(valor)); un valor no numérico invalida la fila
+COLUMNAS_ENTERAS = [
+    'fue_cancelada', 'tiempo_anticipacion_reserva_dias', 'noches_fin_semana', 'noches_semana',
+    'es_huesped_recurrente_historico', 'total_cancelaciones_previas_cliente',
+    'total_reservas_previas_no_canceladas_cliente', 'cambios_en_reserva'
+]
 
-for idx, row in df.iterrows():
-    try:
-        # --- Cliente ---
-        cliente_email = row.get('email')
-        # Asegurar que email sea string y no NaN/None/float
-        if not isinstance(cliente_email, str) or pd.isnull(cliente_email) or str(cliente_email).lower() == 'nan':
-            cliente_email = ''
-        cliente_doc = clientes_col.find_one({"email": cliente_email})
-        if not cliente_doc:
-            tipo_doc = row.get('tipo_documento_identidad', '')
-            num_doc = row.get('numero_documento_identidad', '')
-            if tipo_doc and num_doc:
-                cliente_doc = clientes_col.find_one({
-                    "tipo_documento_identidad": tipo_doc,
-                    "numero_documento_identidad": num_doc
-                })
-        if not cliente_doc:
-            cliente_id = ObjectId()
-            fecha_nac = None
-            if row.get('fecha_nacimiento'):
-                try:
-                    fecha_nac = datetime.strptime(row['fecha_nacimiento'], '%Y-%m-%d')
-                except Exception:
-                    pass
-            def safe_str(val):
-                if not isinstance(val, str) or pd.isnull(val) or str(val).lower() == 'nan':
-                    return ''
-                return str(val)
-            cliente_data = {
-                "_id": cliente_id,
-                "nombre_completo": safe_str(row.get('nombre_completo', f"Cliente Reserva {idx+1}")),
-                "email": cliente_email,
-                "telefono": safe_str(row.get('telefono', '')),
-                "tipo_documento_identidad": safe_str(row.get('tipo_documento_identidad', '')),
-                "numero_documento_identidad": safe_str(row.get('numero_documento_identidad', '')),
-                "fecha_nacimiento": fecha_nac,
-                "pais_origen_cliente": safe_str(row.get('pais_origen_cliente', 'Desconocido')),
-                "es_huesped_recurrente_historico": bool(int(float(row.get('es_huesped_recurrente_historico', 0)))),
-                "total_cancelaciones_previas_cliente": int(float(row.get('total_cancelaciones_previas_cliente', 0))),
-                "total_reservas_previas_no_canceladas_cliente": int(float(row.get('total_reservas_previas_no_canceladas_cliente', 0))),
-                "historial_ids_reservas": []
-            }
-            clientes_col.insert_one(cliente_data)
-            cliente_doc = cliente_data
-            clientes_insertados += 1
-        cliente_id = cliente_doc['_id']
-
-        # --- Crear ObjectId de Reserva antes ---
-        reserva_id = ObjectId()
-
-        # --- Detalles de Reserva ---
-        tipo_habitacion_id = get_or_create_tipo_habitacion(row.get('tipo_habitacion_reservada', 'C'))
+# --- Transformación vectorizada (columna a columna) ---
+def columna_o_default(df, col, default):
+    if col in df.columns:
+        return df[col]
+    return pd.Series(default, index=df.index, dtype=object)
+
+def texto_seguro(serie):
+    # Valores no string o 'nan' pasan a ''
+    es_texto = serie.map(lambda v: isinstance(v, str), na_action='ignore').fillna(False).astype(bool)
+    es_nan = serie.str.lower().eq('nan').fillna(False).astype(bool) if es_texto.any() else es_texto
+    return serie.where(es_texto & ~es_nan, '')
+
+def _entero_estricto(serie):
+    # Equivalente de int(valor): solo acepta enteros escritos como tales
+    if pd.api.types.is_numeric_dtype(serie):
+        # Columna ya tipada (Parquet/Feather): basta con que el valor sea entero
+        return serie.where(serie == np.trunc(serie))
+    es_entero = serie.str.fullmatch(r'\s*[+-]?\d+\s*').fillna(False).astype(bool)
+    return pd.to_numeric(serie.where(es_entero), errors='coerce')
+
+def _fechas(serie):
+    # datetime64 -> datetime/None (NumPy convierte NaT en None), listos para insertar
+    return serie.to_numpy(dtype='datetime64[us]').astype(object).tolist()
+
+def _valores(serie):
+    # NaN de pandas se conserva tal cual, igual que row.get() en el recorrido por filas
+    return serie.astype(object).tolist()
+
+def transformar_columnas(df):
+    """
+    Calcula de forma vectorizada todos los campos tipados de la carga y
+    retorna un DataFrame con una columna por campo más la columna `error`,
+    que contiene el motivo por el que la fila no se puede cargar ('' si es válida).
+    """
+    t = pd.DataFrame(index=df.index)
+    error = pd.Series('', index=df.index, dtype=object)
+
+    # Enteros int(float(x)) y banderas bool(int(float(x)))
+    for col in COLUMNAS_ENTERAS:
+        valores = pd.to_numeric(columna_o_default(df, col, '0'), errors='coerce')
+        invalidos = ~np.isfinite(valores.to_numpy(dtype=float))
+        error = error.mask(invalidos & (error == ''), f"valor no numérico en '{col}'")
+        t[col] = np.trunc(valores.fillna(0).replace([np.inf, -np.inf], 0)).astype('int64')
+    for col in ['fue_cancelada', 'es_huesped_recurrente_historico']:
+        t[col] = t[col] != 0
+
+    # ADR: float(x) acepta 'nan' pero no texto arbitrario
+    adr_texto = columna_o_default(df, 'adr', '0.0')
+    t['adr'] = pd.to_numeric(adr_texto, errors='coerce').astype(float)
+    adr_invalido = t['adr'].isna() & adr_texto.notna() & adr_texto.astype(str).str.strip().str.lower().ne('nan')
+    error = error.mask(adr_invalido & (error == ''), "valor no numérico en 'adr'")
+
+    # Fecha de llegada, noches y fecha de salida
+    mes_num = columna_o_default(df, 'mes_llegada', None).map({m: i + 1 for i, m in enumerate(MESES)}).fillna(1)
+    t['fecha_llegada'] = pd.to_datetime(
+        pd.DataFrame({
+            'year': _entero_estricto(columna_o_default(df, 'anio_llegada', None)),
+            'month': mes_num,
+            'day': _entero_estricto(columna_o_default(df, 'dia_llegada', None)),
+        }),
+        errors='coerce'
+    )
+    t['noches_estadia'] = np.maximum(1, t['noches_fin_semana'] + t['noches_semana'])
+    t['fecha_salida'] = t['fecha_llegada'] + pd.to_timedelta(t['noches_estadia'], unit='D')
+
+    # Fechas: cada texto distinto se convierte una sola vez (ver conversores.FORMATOS_FECHA)
+    for col in ['fecha_estado_reserva', 'fecha_nacimiento']:
+        t[col] = fechas(columna_o_default(df, col, None), col)
+
+    # Textos de cliente normalizados
+    t['email'] = texto_seguro(columna_o_default(df, 'email', None))
+    t['nombre_completo'] = texto_seguro(columna_o_default(df, 'nombre_completo', None))
+    if 'nombre_completo' not in df.columns:
+        t['nombre_completo'] = [f"Cliente Reserva {idx+1}" for idx in df.index]
+    for col, default in [('telefono', ''), ('tipo_documento_identidad', ''),
+                         ('numero_documento_identidad', ''), ('pais_origen_cliente', 'Desconocido')]:
+        t[col] = texto_seguro(columna_o_default(df, col, default))
+
+    t['error'] = error
+    return t
+
+def generar_documentos(df, t=None):
+    """
+    Recorre las columnas precalculadas por `transformar_columnas` y genera, por
+    cada fila, la tupla (idx, error, claves, cliente, detalle, reserva). Los
+    documentos llevan `_id` y referencias en None para que el loader los asigne.
+    """
+    if t is None:
+        t = transformar_columnas(df)
+    ahora = datetime.now()
+    columnas = zip(
+        df.index,
+        t['error'].tolist(),
+        t['email'].tolist(),
+        _valores(columna_o_default(df, 'tipo_documento_identidad', '')),
+        _valores(columna_o_default(df, 'numero_documento_identidad', '')),
+        t['nombre_completo'].tolist(),
+        t['telefono'].tolist(),
+        t['tipo_documento_identidad'].tolist(),
+        t['numero_documento_identidad'].tolist(),
+        _fechas(t['fecha_nacimiento']),
+        t['pais_origen_cliente'].tolist(),
+        _valores(columna_o_default(df, 'pais_origen_cliente', 'Desconocido')),
+        t['es_huesped_recurrente_historico'].tolist(),
+        t['total_cancelaciones_previas_cliente'].tolist(),
+        t['total_reservas_previas_no_canceladas_cliente'].tolist(),
+        _valores(columna_o_default(df, 'tipo_habitacion_reservada', None)),
+        _valores(columna_o_default(df, 'tipo_habitacion_asignada', None)),
+        t['cambios_en_reserva'].tolist(),
+        _valores(columna_o_default(df, 'tipo_cliente_en_reserva', None)),
+        t['fue_cancelada'].tolist(),
+        t['tiempo_anticipacion_reserva_dias'].tolist(),
+        _fechas(t['fecha_llegada']),
+        _fechas(t['fecha_salida']),
+        t['noches_estadia'].tolist(),
+        _valores(columna_o_default(df, 'estado_reserva', None)),
+        _fechas(t['fecha_estado_reserva']),
+        t['adr'].tolist(),
+        _valores(columna_o_default(df, 'canal_reserva', None)),
+        _valores(columna_o_default(df, 'hotel', None)),
+    )
+    for (idx, error, email, tipo_doc_raw, num_doc_raw, nombre, telefono, tipo_doc, num_doc,
+         fecha_nac, pais, pais_raw, recurrente, cancelaciones, previas, hab_reservada,
+         hab_asignada, cambios, tipo_cliente, cancelada, anticipacion, llegada, salida,
+         noches, estado, fecha_estado, adr, canal, hotel) in columnas:
+        if error:
+            yield idx, error, None, None, None, None
+            continue
+        cliente_data = {
+            "_id": None,
+            "nombre_completo": nombre,
+            "email": email,
+            "telefono": telefono,
+            "tipo_documento_identidad": tipo_doc,
+            "numero_documento_identidad": num_doc,
+            "fecha_nacimiento": fecha_nac,
+            "pais_origen_cliente": pais,
+            "es_huesped_recurrente_historico": recurrente,
+            "total_cancelaciones_previas_cliente": cancelaciones,
+            "total_reservas_previas_no_canceladas_cliente": previas,
+            "historial_ids_reservas": []
+        }
         detalle_reserva_data = {
-            "_id": ObjectId(),
-            "reserva_id": reserva_id,  # Ya asignado
-            "pais_origen_reserva": row.get('pais_origen_cliente', 'Desconocido'),
-            "es_huesped_recurrente_al_reservar": bool(int(float(row.get('es_huesped_recurrente_historico', 0)))),
-            "cancelaciones_previas_cliente_al_reservar": int(float(row.get('total_cancelaciones_previas_cliente', 0))),
-            "reservas_previas_no_canceladas_cliente_al_reservar": int(float(row.get('total_reservas_previas_no_canceladas_cliente', 0))),
-            "tipo_habitacion_reservada": row.get('tipo_habitacion_reservada'),
-            "tipo_habitacion_asignada": row.get('tipo_habitacion_asignada'),
-            "cambios_en_reserva": int(float(row.get('cambios_en_reserva', 0))),
-            "tipo_cliente_en_reserva": row.get('tipo_cliente_en_reserva')
+            "_id": None,
+            "reserva_id": None,
+            "pais_origen_reserva": pais_raw,
+            "es_huesped_recurrente_al_reservar": recurrente,
+            "cancelaciones_previas_cliente_al_reservar": cancelaciones,
+            "reservas_previas_no_canceladas_cliente_al_reservar": previas,
+            "tipo_habitacion_reservada": hab_reservada,
+            "tipo_habitacion_asignada": hab_asignada,
+            "cambios_en_reserva": cambios,
+            "tipo_cliente_en_reserva": tipo_cliente
         }
-        detalles_reserva_col.insert_one(detalle_reserva_data)
-        detalles_insertados += 1
-        detalle_reserva_id = detalle_reserva_data["_id"]
-
-        # --- Reserva ---
-        fecha_llegada = None
-        try:
-            anio = int(row.get('anio_llegada'))
-            mes = row.get('mes_llegada')
-            dia = int(row.get('dia_llegada'))
-            meses = ['Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre']
-            mes_num = meses.index(mes) + 1 if mes in meses else 1
-            fecha_llegada = datetime(anio, mes_num, dia)
-        except Exception:
-            pass
-        noches_estadia_weekend = int(float(row.get('noches_fin_semana', 0)))
-        noches_estadia_week = int(float(row.get('noches_semana', 0)))
-        noches_estadia_total = max(1, noches_estadia_weekend + noches_estadia_week)
-        fecha_salida = None
-        if fecha_llegada:
-            fecha_salida = fecha_llegada + timedelta(days=noches_estadia_total)
         reserva_data = {
-            "_id": reserva_id,
-            "cliente_id": cliente_id,
-            "detalle_reserva_id": detalle_reserva_id,
-            "fecha_creacion_reserva": datetime.now(),
-            "fue_cancelada": bool(int(float(row.get('fue_cancelada', 0)))),
-            "tiempo_anticipacion_reserva_dias": int(float(row.get('tiempo_anticipacion_reserva_dias', 0))),
-            "fecha_llegada": fecha_llegada,
-            "fecha_salida": fecha_salida,
-            "noches_estadia": noches_estadia_total,
-            "estado_reserva": row.get('estado_reserva'),
-            "fecha_estado_reserva": None,
-            "adr": float(row.get('adr', 0.0)),
-            "canal_reserva": row.get('canal_reserva')
+            "_id": None,
+            "cliente_id": None,
+            "detalle_reserva_id": None,
+            "fecha_creacion_reserva": ahora,
+            "fue_cancelada": cancelada,
+            "tiempo_anticipacion_reserva_dias": anticipacion,
+            "fecha_llegada": llegada,
+            "fecha_salida": salida,
+            "noches_estadia": noches,
+            "estado_reserva": estado,
+            "fecha_estado_reserva": fecha_estado,
+            "adr": adr,
+            "canal_reserva": canal,
+            "hotel": hotel
         }
-        fecha_estado = row.get('fecha_estado_reserva')
-        if fecha_estado:
-            try:
-                reserva_data["fecha_estado_reserva"] = datetime.strptime(fecha_estado, '%d/%m/%y')
-            except Exception:
-                try:
-                    reserva_data["fecha_estado_reserva"] = datetime.strptime(fecha_estado, '%Y-%m-%d')
-                except Exception:
-                    pass
-        reservas_col.insert_one(reserva_data)
-        reservas_insertadas += 1
-        # Actualizar cliente con el ID de la reserva
-        clientes_col.update_one({"_id": cliente_id}, {"$push": {"historial_ids_reservas": reserva_id}})
+        yield idx, '', (email, tipo_doc_raw, num_doc_raw), cliente_data, detalle_reserva_data, reserva_data
+
+def enlazar_documentos(cliente_id, detalle_reserva_data, reserva_data, ids=None):
+    """
+    Asigna los ObjectId de detalle y reserva y las referencias entre ellos.
+    `ids` es un par (reserva_id, detalle_id) ya calculado; si no se indica se
+    generan ObjectId nuevos.
+    """
+    reserva_id, detalle_id = ids if ids is not None else (ObjectId(), ObjectId())
+    detalle_reserva_data["_id"] = detalle_id
+    detalle_reserva_data["reserva_id"] = reserva_id
+    reserva_data["_id"] = reserva_id
+    reserva_data["cliente_id"] = cliente_id
+    reserva_data["detalle_reserva_id"] = detalle_reserva_data["_id"]
+
+def resolver_documentos(df, indice_clientes, claves_reserva, desde=0, inicio=0):
+    """
+    Genera por fila (posición, fila del CSV, error, cliente nuevo o None,
+    detalle, reserva) con los documentos ya enlazados: resuelve el cliente con
+    el índice en memoria y asigna ids deterministas. `inicio` es la posición
+    de la primera fila de `df` (para procesar el archivo por bloques) y las
+    filas con posición <= `desde` solo avanzan el cálculo de ids.
+    """
+    valores = df.itertuples(index=False, name=None)
+    documentos = generar_documentos(df)
+    for posicion, fila_valores, (idx, error, claves, cliente_doc, detalle_reserva_data, reserva_data) in zip(
+        count(inicio + 1), valores, documentos
+    ):
+        # Ids naturales: se calculan también para las filas ya cargadas
+        ids = claves_reserva.siguiente(fila_valores)
+        if posicion <= desde:
+            continue
+        if error:
+            yield posicion, idx+2, error, None, None, None
+            continue
+        cliente_nuevo = None
+        cliente_id = indice_clientes.buscar(*claves)
+        if cliente_id is not None:
+            METRICAS.contar('clientes_encontrados')
+        else:
+            cliente_doc["_id"] = id_cliente(
+                cliente_doc["email"],
+                cliente_doc["tipo_documento_identidad"],
+                cliente_doc["numero_documento_identidad"]
+            )
+            indice_clientes.registrar(cliente_doc)
+            cliente_id = cliente_doc['_id']
+            cliente_nuevo = cliente_doc
+        enlazar_documentos(cliente_id, detalle_reserva_data, reserva_data, ids)
+        yield posicion, idx+2, '', cliente_nuevo, detalle_reserva_data, reserva_data
+
+def al_escribir_carga(db, embebido=False, analitica=False, indice_ocupacion=None):
+    """
+    Función `al_escribir` de LoteReservas según las opciones de la carga:
+    resúmenes de analitica.py y/o índice de ocupación de ocupacion.py en la
+    ruta `indice_ocupacion`. None si no se pidió ninguno.
+    """
+    modo = 'embebido' if embebido else 'separado'
+    return encadenar(
+        actualizador_analitica(db, modo) if analitica else None,
+        actualizador_ocupacion(db, indice_ocupacion, modo) if indice_ocupacion else None,
+    )
+
+# --- Carga fila a fila (un round trip por documento) ---
+def cargar_fila_a_fila(df, db, embebido=False, analitica=False, indice_ocupacion=None):
+    clientes_col = db['Clientes']
+    reservas_col = db['Reservas']
+    detalles_reserva_col = db['DetallesReserva']
+    cache_tipos_habitacion(db).precargar(df['tipo_habitacion_reservada'].unique())
+    indice_clientes = IndiceClientes(clientes_col)
+    al_escribir = al_escribir_carga(db, embebido, analitica, indice_ocupacion)
+
+    clientes_insertados = 0
+    reservas_insertadas = 0
+    detalles_insertados = 0
+
+    for idx, error, claves, cliente_doc, detalle_reserva_data, reserva_data in generar_documentos(df):
+        if error:
+            METRICAS.contar('filas_fallidas')
+            METRICAS.error(f"Error en fila {idx+2}: {error}")
+            continue
+        try:
+            # --- Cliente ---
+            cliente_id = indice_clientes.buscar(*claves)
+            if cliente_id is None:
+                cliente_doc["_id"] = ObjectId()
+                marcar_insercion(cliente_doc)
+                clientes_col.insert_one(cliente_doc)
+                indice_clientes.registrar(cliente_doc)
+                clientes_insertados += 1
+                METRICAS.contar('clientes_insertados')
+                cliente_id = cliente_doc['_id']
+            else:
+                METRICAS.contar('clientes_encontrados')
+
+            # --- Detalles de Reserva y Reserva ---
+            enlazar_documentos(cliente_id, detalle_reserva_data, reserva_data)
+            marcar_insercion(detalle_reserva_data, reserva_data)
+            if embebido:
+                reserva_data = embeber_detalle(detalle_reserva_data, reserva_data)
+            else:
+                detalles_reserva_col.insert_one(detalle_reserva_data)
+            detalles_insertados += 1
+            METRICAS.contar('detalles_insertados')
+            reservas_col.insert_one(reserva_data)
+            reservas_insertadas += 1
+            METRICAS.contar('reservas_insertadas')
+            if al_escribir is not None:
+                al_escribir([reserva_data["_id"]])
+            # Actualizar cliente con el ID de la reserva
+            clientes_col.update_one({"_id": cliente_id}, {"$push": {"historial_ids_reservas": reserva_data["_id"]}})
+        except Exception as e:
+            METRICAS.contar('filas_fallidas')
+            METRICAS.error(f"Error en fila {idx+2}: {e}")
+
+    return clientes_insertados, reservas_insertadas, detalles_insertados
+
+# --- Carga por lotes (bulk_write desordenados por colección) ---
+def cargar_por_lotes(df, db, tamano_lote=TAMANO_LOTE_POR_DEFECTO, checkpoint=None, embebido=False,
+                     analitica=False, indice_ocupacion=None):
+    """
+    Carga `df` en lotes con ids deterministas y upserts, de modo que repetir la
+    carga del mismo archivo no duplica documentos. Si se indica `checkpoint`,
+    se omiten las filas ya escritas y se registra el avance tras cada lote.
+    Con `embebido` el detalle se guarda dentro de cada reserva; con
+    `analitica` y/o `indice_ocupacion` los resúmenes materializados y el
+    índice de ocupación se actualizan tras cada lote.
+    """
+    if checkpoint is not None and checkpoint.completado:
+        print("Este archivo ya se cargó completo en esta base: no hay nada que cargar.")
+        return 0, 0, 0
+    desde = checkpoint.ultima_fila if checkpoint is not None else 0
+    if desde:
+        print(f"Reanudando la carga desde la fila {desde+1} de {len(df)}")
+
+    indice_clientes = IndiceClientes(db['Clientes'])
+    al_escribir = al_escribir_carga(db, embebido, analitica, indice_ocupacion)
+    lote = LoteReservas(db, tamano_lote, upsert=True, embebido=embebido, al_escribir=al_escribir)
+
+    # Los tipos de habitación son pocos: se crean todos de una vez antes del bucle
+    cache_tipos_habitacion(db).precargar(df['tipo_habitacion_reservada'].unique())
+
+    posicion = desde
+    documentos = METRICAS.cronometrar(resolver_documentos(df, indice_clientes, ClavesReserva(), desde), 'transformacion')
+    for posicion, fila, error, cliente_nuevo, detalle_reserva_data, reserva_data in documentos:
+        if error:
+            lote.fallida(fila, error)
+            continue
+        if cliente_nuevo is not None:
+            lote.agregar_cliente(fila, cliente_nuevo)
+        lote.agregar_reserva(fila, detalle_reserva_data, reserva_data)
+
+        if lote.lleno():
+            for cliente_doc in lote.vaciar():
+                indice_clientes.descartar(cliente_doc)
+            if checkpoint is not None:
+                checkpoint.guardar(posicion)
+            METRICAS.progreso(lambda: f"  - Lote {lote.lotes_escritos} escrito ({posicion}/{len(df)} filas)")
+    for cliente_doc in lote.vaciar():
+        indice_clientes.descartar(cliente_doc)
+    if checkpoint is not None:
+        checkpoint.guardar(posicion, completado=True)
+
+    print(f"Lotes escritos: {lote.lotes_escritos}")
+    print(f"Filas con error: {lote.filas_fallidas}")
+    return lote.clientes_insertados, lote.reservas_insertadas, lote.detalles_insertados
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga hotel_bookings_es_validado.csv en CostaDelInkaDB')
+    parser.add_argument('--archivo', default=ruta_por_defecto(INPUT_FILE))
+    parser.add_argument('--modo', choices=['lotes', 'fila'], default='lotes',
+                        help='lotes: escrituras masivas por colección; fila: un insert por documento')
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_POR_DEFECTO)
+    parser.add_argument('--sin-checkpoint', action='store_true',
+                        help='No leer ni escribir el checkpoint de la carga (modo lotes)')
+    parser.add_argument('--carga-masiva', action='store_true',
+                        help='Quitar los índices secundarios de Reservas/DetallesReserva y reconstruirlos al final')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='separado: Reservas y DetallesReserva; embebido: el detalle dentro de cada reserva')
+    parser.add_argument('--analitica', action='store_true',
+                        help='Actualizar los resúmenes de analitica.py tras cada lote')
+    parser.add_argument('--indice-ocupacion', metavar='RUTA',
+                        help='Mantener al día tras cada lote el índice de ocupación de ocupacion.py (.npz)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    # --- Conexión a MongoDB ---
+    try:
+        client = MongoClient('mongodb://localhost:27017/')
+        db = client['CostaDelInkaDB']
+        print("Conexión a MongoDB exitosa.")
     except Exception as e:
-        print(f"Error en fila {idx+2}: {e}")
+        print(f"Error al conectar a MongoDB: {e}")
+        exit()
+
+    # --- ETL sobre hotel_bookings_es_validado (Parquet, Feather o CSV) ---
+    with METRICAS.etapa('lectura'):
+        df = leer_tabla(args.archivo, dtype_csv=str)
+    print(f"Leídas {len(df)} filas de {args.archivo}")
+
+    embebido = args.esquema == 'embebido'
+    with preparar_carga(db, args.carga_masiva, args.esquema):
+        if args.modo == 'lotes':
+            checkpoint = None if args.sin_checkpoint else Checkpoint(db, args.archivo)
+            clientes_insertados, reservas_insertadas, detalles_insertados = cargar_por_lotes(
+                df, db, args.tamano_lote, checkpoint, embebido, args.analitica, args.indice_ocupacion
+            )
+        else:
+            clientes_insertados, reservas_insertadas, detalles_insertados = cargar_fila_a_fila(
+                df, db, embebido, args.analitica, args.indice_ocupacion
+            )
+
+    print(f"\nResumen de carga:")
+    print(f"Clientes insertados: {clientes_insertados}")
+    print(f"Reservas insertadas: {reservas_insertadas}")
+    print(f"Detalles de reserva insertados: {detalles_insertados}")
 
-print(f"\nResumen de carga:")
-print(f"Clientes insertados: {clientes_insertados}")
-print(f"Reservas insertadas: {reservas_insertadas}")
-print(f"Detalles de reserva insertados: {detalles_insertados}")
+    client.close()
+    print("Conexión a MongoDB cerrada.")
+    finalizar(args)
 
-client.close()
-print("Conexión a MongoDB cerrada.") 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
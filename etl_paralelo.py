@@ -0,0 +1,217 @@
+import argparse
+import multiprocessing
+import os
+import time
+import zlib
+
+import pandas as pd
+from pymongo import MongoClient
+
+from dimensiones import cache_tipos_habitacion
+from escritura_lotes import TAMANO_LOTE_POR_DEFECTO, marcar_insercion
+from esquema_bd import MODOS_ESQUEMA
+from carga_incremental import id_cliente
+from etl_carga_mongodb import INPUT_FILE, cargar_por_lotes, columna_o_default, generar_documentos, texto_seguro
+from formato_intermedio import leer_tabla, ruta_por_defecto
+from indices import preparar_carga
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+from ocupacion import construir as construir_ocupacion
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+
+
+# --- Particionado por identidad de cliente ---
+def _raiz(padres, i):
+    while padres[i] != i:
+        padres[i] = padres[padres[i]]
+        i = padres[i]
+    return i
+
+
+def particionar(df, n_particiones):
+    """
+    Asigna cada fila a una partición de modo que todas las filas que puedan
+    resolver al mismo cliente caigan en la misma. Dos filas quedan unidas si
+    comparten email o tipo y número de documento, y cada grupo se enruta por
+    el hash de la identidad de su primera fila. Así ningún par de workers
+    compite por crear el mismo documento de Clientes y, dentro de cada
+    partición, las filas conservan su orden original.
+
+    Las filas sin email no se unen entre sí: todas resuelven al cliente
+    compartido que `crear_cliente_sin_email` crea antes de repartir, así que
+    se enrutan por su documento (o, sin documento, por su contenido, para que
+    las filas idénticas sigan juntas y conserven sus ids deterministas).
+    """
+    emails = texto_seguro(columna_o_default(df, 'email', None)).tolist()
+    tipos = columna_o_default(df, 'tipo_documento_identidad', '').tolist()
+    numeros = columna_o_default(df, 'numero_documento_identidad', '').tolist()
+
+    def tiene_documento(tipo_doc, num_doc):
+        return isinstance(tipo_doc, str) and isinstance(num_doc, str) and tipo_doc and num_doc
+
+    padres = list(range(len(df)))
+    primera_por_clave = {}
+    for i, (email, tipo_doc, num_doc) in enumerate(zip(emails, tipos, numeros)):
+        if not email:
+            continue
+        claves = [('email', email)]
+        if tiene_documento(tipo_doc, num_doc):
+            claves.append(('documento', tipo_doc, num_doc))
+        for clave in claves:
+            j = primera_por_clave.setdefault(clave, i)
+            ri, rj = _raiz(padres, i), _raiz(padres, j)
+            if ri != rj:
+                padres[max(ri, rj)] = min(ri, rj)
+
+    contenido = None
+    particiones = []
+    for i in range(len(df)):
+        if emails[i]:
+            raiz = _raiz(padres, i)
+            identidad = f"{emails[raiz]}|{tipos[raiz]}|{numeros[raiz]}"
+        elif tiene_documento(tipos[i], numeros[i]):
+            identidad = f"|{tipos[i]}|{numeros[i]}"
+        else:
+            if contenido is None:
+                contenido = pd.util.hash_pandas_object(df, index=False).tolist()
+            identidad = f"fila|{contenido[i]}"
+        particiones.append(zlib.crc32(identidad.encode('utf-8')) % n_particiones)
+    return particiones
+
+
+def crear_cliente_sin_email(db, df):
+    """
+    Las filas sin email resuelven todas al mismo cliente (ver IndiceClientes).
+    Se crea una sola vez, antes de repartir el trabajo, con los datos de la
+    primera fila válida sin email, como lo haría la carga secuencial; así
+    cada worker lo encuentra al leer Clientes. Retorna (_id, creado), o
+    (None, False) si ninguna fila válida carece de email.
+    """
+    existente = db['Clientes'].find_one({"email": ""}, {"_id": 1})
+    if existente is not None:
+        return existente['_id'], False
+    sin_email = df[texto_seguro(columna_o_default(df, 'email', None)) == '']
+    for _, error, _, cliente_doc, _, _ in generar_documentos(sin_email):
+        if error:
+            continue
+        cliente_doc["_id"] = id_cliente(
+            cliente_doc["email"],
+            cliente_doc["tipo_documento_identidad"],
+            cliente_doc["numero_documento_identidad"]
+        )
+        marcar_insercion(cliente_doc)
+        campos = {k: v for k, v in cliente_doc.items() if k != '_id'}
+        resultado = db['Clientes'].update_one({"_id": cliente_doc["_id"]}, {"$setOnInsert": campos}, upsert=True)
+        return cliente_doc["_id"], resultado.upserted_id is not None
+    return None, False
+
+
+# --- Worker: una conexión y una partición por proceso ---
+def cargar_particion(tarea):
+    worker, df, mongo_uri, db_name, tamano_lote, embebido, analitica, intervalo_progreso = tarea
+    # Cada worker (spawn) tiene sus propias métricas; el proceso principal las combina
+    METRICAS.configurar(intervalo_progreso=intervalo_progreso)
+    METRICAS.monitorear_mongo()
+    inicio = time.perf_counter()
+    client = MongoClient(mongo_uri)
+    try:
+        clientes, reservas, detalles = cargar_por_lotes(df, client[db_name], tamano_lote, embebido=embebido,
+                                                        analitica=analitica)
+    finally:
+        client.close()
+    return {
+        "worker": worker,
+        "pid": os.getpid(),
+        "filas": len(df),
+        "clientes_insertados": clientes,
+        "reservas_insertadas": reservas,
+        "detalles_insertados": detalles,
+        "segundos": time.perf_counter() - inicio,
+        "metricas": METRICAS.resumen(),
+    }
+
+
+def cargar_en_paralelo(df, n_procesos, mongo_uri=MONGO_URI, db_name=DB_NAME, tamano_lote=TAMANO_LOTE_POR_DEFECTO,
+                       embebido=False, analitica=False):
+    """Reparte `df` entre `n_procesos` workers y retorna las estadísticas de cada uno."""
+    # Los tipos de habitación y el cliente de las filas sin email se crean una
+    # sola vez antes de repartir el trabajo
+    client = MongoClient(mongo_uri)
+    try:
+        cache_tipos_habitacion(client[db_name]).precargar(df['tipo_habitacion_reservada'].unique())
+        _, creado = crear_cliente_sin_email(client[db_name], df)
+        if creado:
+            METRICAS.contar('clientes_insertados')
+    finally:
+        client.close()
+
+    asignacion = pd.Series(particionar(df, n_procesos), index=df.index)
+    tareas = [
+        (worker, df[asignacion == worker], mongo_uri, db_name, tamano_lote, embebido, analitica,
+         METRICAS.intervalo_progreso)
+        for worker in range(n_procesos)
+    ]
+    # spawn: cada worker abre su propio MongoClient, nunca uno heredado por fork
+    with multiprocessing.get_context('spawn').Pool(n_procesos) as pool:
+        estadisticas = pool.map(cargar_particion, tareas)
+    for e in estadisticas:
+        METRICAS.combinar(e['metricas'])
+    return estadisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga en paralelo hotel_bookings_es_validado.csv en CostaDelInkaDB')
+    parser.add_argument('--archivo', default=ruta_por_defecto(INPUT_FILE))
+    parser.add_argument('--procesos', type=int, default=os.cpu_count())
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_POR_DEFECTO)
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--carga-masiva', action='store_true',
+                        help='Quitar los índices secundarios de Reservas/DetallesReserva y reconstruirlos al final')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='separado: Reservas y DetallesReserva; embebido: el detalle dentro de cada reserva')
+    parser.add_argument('--analitica', action='store_true',
+                        help='Actualizar los resúmenes de analitica.py tras cada lote')
+    parser.add_argument('--indice-ocupacion', metavar='RUTA',
+                        help='Reconstruir al terminar la carga el índice de ocupación de ocupacion.py (.npz)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    with METRICAS.etapa('lectura'):
+        df = leer_tabla(args.archivo, dtype_csv=str)
+    print(f"Leídas {len(df)} filas de {args.archivo}")
+    print(f"Cargando con {args.procesos} procesos...")
+
+    # Los índices se preparan una sola vez, antes y después de todos los workers
+    client = MongoClient(args.mongo_uri)
+    try:
+        with preparar_carga(client[DB_NAME], args.carga_masiva, args.esquema):
+            inicio = time.perf_counter()
+            estadisticas = cargar_en_paralelo(df, args.procesos, args.mongo_uri, DB_NAME, args.tamano_lote,
+                                              args.esquema == 'embebido', args.analitica)
+            segundos = time.perf_counter() - inicio
+        # Los workers son procesos aparte: el índice de ocupación se construye una vez al final
+        if args.indice_ocupacion:
+            construir_ocupacion(client[DB_NAME], args.esquema).guardar(args.indice_ocupacion)
+    finally:
+        client.close()
+
+    print("\nResumen por worker:")
+    for e in estadisticas:
+        filas_por_segundo = e['filas'] / e['segundos'] if e['segundos'] else 0
+        print(f"  - Worker {e['worker']} (pid {e['pid']}): {e['filas']} filas, "
+              f"{e['clientes_insertados']} clientes, {e['reservas_insertadas']} reservas, "
+              f"{e['segundos']:.2f} s ({filas_por_segundo:,.0f} filas/s)")
+
+    print(f"\nResumen de carga:")
+    # Incluye el cliente de las filas sin email, que crea el proceso principal
+    print(f"Clientes insertados: {METRICAS.contadores['clientes_insertados']}")
+    print(f"Reservas insertadas: {sum(e['reservas_insertadas'] for e in estadisticas)}")
+    print(f"Detalles de reserva insertados: {sum(e['detalles_insertados'] for e in estadisticas)}")
+    print(f"Tiempo total: {segundos:.2f} s ({len(df) / segundos:,.0f} filas/s)")
+    finalizar(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Formato según la extensión del archivo; CSV sigue disponible como exportación
+EXTENSIONES = {
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.csv': 'csv',
+}
+
+TIPOS_ARROW = {
+    int: 'int64',
+    float: 'float64',
+    str: 'string',
+}
+
+
+def formato_de(ruta):
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in EXTENSIONES:
+        raise ValueError(f"Formato no soportado para {ruta}: use {', '.join(EXTENSIONES)}")
+    formato = EXTENSIONES[extension]
+    if formato != 'csv' and pa is None:
+        raise ImportError(f"Se necesita pyarrow para leer o escribir {ruta} (pip install pyarrow)")
+    return formato
+
+
+def ruta_por_defecto(ruta):
+    """
+    Ruta por defecto de un archivo intermedio de las etapas: `ruta` si existe
+    y se puede leer; si no, el CSV con el mismo nombre cuando existe (el
+    repositorio trae los intermedios en CSV hasta que se regeneran en Parquet).
+    """
+    csv = os.path.splitext(ruta)[0] + '.csv'
+    if (pa is None or not os.path.exists(ruta)) and os.path.exists(csv):
+        return csv
+    return ruta
+
+
+# --- Tipado según COLUMNS_TYPES ---
+def aplicar_tipos(df, tipos):
+    """
+    Convierte las columnas de `df` presentes en `tipos` ({columna: int|float|str})
+    a tipos con nulos explícitos: Int64, float64 y string. Las demás columnas
+    quedan como están.
+    """
+    df = df.copy()
+    for col, tipo in tipos.items():
+        if col not in df.columns:
+            continue
+        if tipo == int:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        elif tipo == float:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        else:
+            df[col] = df[col].astype('string')
+    return df
+
+
+def esquema_arrow(df, tipos):
+    """Esquema de Arrow para las columnas de `df`, tomando el tipo de `tipos` cuando existe."""
+    inferido = pa.Schema.from_pandas(df, preserve_index=False)
+    campos = []
+    for campo in inferido:
+        tipo = tipos.get(campo.name)
+        campos.append(pa.field(campo.name, TIPOS_ARROW[tipo]) if tipo else campo)
+    return pa.schema(campos)
+
+
+# --- Escritura y lectura ---
+def _a_pandas(tabla):
+    # Sin los metadatos de pandas los nulos llegan como NaN/None, igual que al leer
+    # un CSV (Int64 y pd.NA romperían las comparaciones `v != v` de los loaders)
+    return tabla.to_pandas(ignore_metadata=True)
+
+
+def escribir_tabla(df, ruta, tipos=None):
+    """Guarda `df` en `ruta` en el formato que indica su extensión."""
+    formato = formato_de(ruta)
+    if formato == 'csv':
+        df.to_csv(ruta, index=False)
+        return
+    if tipos:
+        df = aplicar_tipos(df, tipos)
+        tabla = pa.Table.from_pandas(df, schema=esquema_arrow(df, tipos), preserve_index=False)
+    else:
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+    if formato == 'parquet':
+        pq.write_table(tabla, ruta)
+    else:
+        feather.write_feather(tabla, ruta)
+
+
+def leer_tabla(ruta, columnas=None, dtype_csv=None):
+    """
+    Lee `ruta` como DataFrame. En Parquet y Feather solo se leen las
+    `columnas` pedidas y los tipos vienen del archivo; los CSV se leen con
+    `dtype_csv` (por ejemplo str), como hasta ahora.
+    """
+    formato = formato_de(ruta)
+    if formato == 'csv':
+        return pd.read_csv(ruta, usecols=columnas, dtype=dtype_csv)
+    if formato == 'parquet':
+        tabla = pq.read_table(ruta, columns=columnas)
+    else:
+        tabla = feather.read_table(ruta, columns=columnas)
+    return _a_pandas(tabla)
+
+
+def leer_por_bloques(ruta, tamano_bloque, columnas=None, dtype_csv=None):
+    """Genera DataFrames de hasta `tamano_bloque` filas, con índice continuo entre bloques."""
+    formato = formato_de(ruta)
+    if formato == 'csv':
+        yield from pd.read_csv(ruta, usecols=columnas, dtype=dtype_csv, chunksize=tamano_bloque)
+        return
+    if formato == 'parquet':
+        lotes = pq.ParquetFile(ruta).iter_batches(batch_size=tamano_bloque, columns=columnas)
+    else:
+        tabla = feather.read_table(ruta, columns=columnas)
+        lotes = tabla.to_batches(max_chunksize=tamano_bloque)
+    inicio = 0
+    for lote in lotes:
+        bloque = _a_pandas(lote)
+        bloque.index = pd.RangeIndex(inicio, inicio + len(bloque))
+        inicio += len(bloque)
+        yield bloque
+
+
+def leer_registros(ruta, tamano_bloque, columnas=None):
+    """
+    Genera listas de hasta `tamano_bloque` filas de un archivo Parquet o
+    Feather como dicts, con valores de Python tipados y None en los nulos.
+    """
+    if formato_de(ruta) == 'parquet':
+        lotes = pq.ParquetFile(ruta).iter_batches(batch_size=tamano_bloque, columns=columnas)
+    else:
+        lotes = feather.read_table(ruta, columns=columnas).to_batches(max_chunksize=tamano_bloque)
+    for lote in lotes:
+        yield lote.to_pylist()
+
+
+def valores_distintos(ruta, columnas, tamano_bloque=50000):
+    """Retorna {columna: set(valores)} leyendo solo `columnas` del archivo."""
+    distintos = {col: set() for col in columnas}
+    for bloque in leer_por_bloques(ruta, tamano_bloque, columnas, dtype_csv=str):
+        for col in columnas:
+            distintos[col].update(bloque[col].dropna().unique())
+    return distintos
+
+
+def normalizar_tipos(df, tipos):
+    """
+    Retorna `df` con la misma representación que tendría tras escribirse con
+    `escribir_tabla(df, ruta, tipos)` y leerse con `leer_tabla`. Permite pasar
+    un bloque de una etapa a la siguiente en memoria sin escribir el archivo.
+    """
+    df = aplicar_tipos(df, tipos)
+    tabla = pa.Table.from_pandas(df, schema=esquema_arrow(df, tipos), preserve_index=False)
+    return _a_pandas(tabla).set_axis(df.index)
+
+
+class EscritorPorBloques:
+    """
+    Escribe un archivo bloque a bloque sin acumularlo en memoria. En Parquet y
+    Feather el esquema del primer bloque fija el de todo el archivo; en CSV
+    solo el primer bloque lleva encabezado.
+    """
+
+    def __init__(self, ruta, tipos=None):
+        self.ruta = ruta
+        self.formato = formato_de(ruta)
+        self.tipos = tipos or {}
+        self.esquema = None
+        self.escritor = None
+        self.filas = 0
+
+    def escribir(self, df):
+        if self.formato == 'csv':
+            df.to_csv(self.ruta, mode='a' if self.filas else 'w', header=not self.filas, index=False)
+        else:
+            df = aplicar_tipos(df, self.tipos)
+            if self.esquema is None:
+                self.esquema = esquema_arrow(df, self.tipos)
+                if self.formato == 'parquet':
+                    self.escritor = pq.ParquetWriter(self.ruta, self.esquema)
+                else:
+                    self.escritor = pa.ipc.new_file(self.ruta, self.esquema)
+            tabla = pa.Table.from_pandas(df, schema=self.esquema, preserve_index=False)
+            self.escritor.write_table(tabla)
+        self.filas += len(df)
+
+    def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        elif self.formato != 'csv' and self.filas == 0:
+            # Sin bloques no hay esquema: se deja constancia con un archivo vacío
+            escribir_tabla(pd.DataFrame(), self.ruta)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
@@ -0,0 +1,53 @@
+# --- Índice en memoria de la identidad de los clientes ---
+class IndiceClientes:
+    """
+    Resuelve la identidad de los clientes sin consultar la base de datos por
+    cada fila. Al crearse lee una sola vez las claves de Clientes (email y
+    tipo/número de documento) con una proyección y mantiene dos tablas hash
+    hacia el `_id`.
+
+    La búsqueda reproduce la de los loaders con find_one: primero por email
+    (incluido el email vacío o "NULL", que agrupa a todos los clientes sin
+    email en el primero que se registró) y, si no hay coincidencia, por tipo
+    y número de documento cuando ambos tienen valor. Ante claves repetidas
+    gana el primer cliente registrado, igual que el orden natural de find_one.
+    """
+
+    def __init__(self, clientes_col=None):
+        self.por_email = {}
+        self.por_documento = {}
+        if clientes_col is not None:
+            cursor = clientes_col.find(
+                {},
+                {"email": 1, "tipo_documento_identidad": 1, "numero_documento_identidad": 1}
+            )
+            for doc in cursor:
+                self.registrar(doc)
+
+    def __len__(self):
+        return len(self.por_email)
+
+    def buscar(self, email, tipo_doc, num_doc):
+        cliente_id = self.por_email.get(email)
+        if cliente_id is None and tipo_doc and num_doc:
+            cliente_id = self.por_documento.get((tipo_doc, num_doc))
+        return cliente_id
+
+    def registrar(self, cliente_doc):
+        """Agrega un cliente (ya existente o recién creado en la carga)."""
+        cliente_id = cliente_doc['_id']
+        if 'email' in cliente_doc:
+            self.por_email.setdefault(cliente_doc['email'], cliente_id)
+        tipo_doc = cliente_doc.get('tipo_documento_identidad')
+        num_doc = cliente_doc.get('numero_documento_identidad')
+        if tipo_doc is not None and num_doc is not None:
+            self.por_documento.setdefault((tipo_doc, num_doc), cliente_id)
+
+    def descartar(self, cliente_doc):
+        """Quita un cliente cuya inserción falló, si es el que ocupa sus claves."""
+        cliente_id = cliente_doc['_id']
+        if self.por_email.get(cliente_doc.get('email')) == cliente_id:
+            del self.por_email[cliente_doc['email']]
+        clave = (cliente_doc.get('tipo_documento_identidad'), cliente_doc.get('numero_documento_identidad'))
+        if self.por_documento.get(clave) == cliente_id:
+            del self.por_documento[clave]
@@ -0,0 +1,184 @@
+import argparse
+from contextlib import contextmanager, nullcontext
+
+from pymongo import IndexModel, MongoClient
+from pymongo.errors import OperationFailure
+
+from esquema_bd import CAMPO_DETALLE, MODOS_ESQUEMA, OPCIONES_VALIDACION, indices_de, validadores_de
+from metricas import METRICAS
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+
+# Índices secundarios no únicos que una carga masiva quita y reconstruye al final:
+# ninguna búsqueda de los loaders los usa y mantenerlos encarece cada insert
+PERFIL_CARGA_MASIVA = {
+    "Reservas": [[("fecha_llegada", 1)], [("estado_reserva", 1)]],
+    "DetallesReserva": [[("tipo_habitacion_reservada", 1)]],
+}
+# El mismo perfil con el detalle embebido en Reservas
+PERFIL_CARGA_MASIVA_EMBEBIDO = {
+    "Reservas": [[("fecha_llegada", 1)], [("estado_reserva", 1)], [(f"{CAMPO_DETALLE}.tipo_habitacion_reservada", 1)]],
+}
+PERFILES_CARGA_MASIVA = {'separado': PERFIL_CARGA_MASIVA, 'embebido': PERFIL_CARGA_MASIVA_EMBEBIDO}
+
+
+def nombre_indice(claves):
+    """Nombre por defecto de MongoDB para un índice: 'campo_1_otro_-1'."""
+    return '_'.join(f"{campo}_{orden}" for campo, orden in claves)
+
+
+def modelos(coleccion, solo=None, modo='separado'):
+    """IndexModel de `coleccion` según los índices del modo `modo`; `solo` filtra por lista de claves."""
+    return [
+        IndexModel(claves, name=nombre_indice(claves), **opciones)
+        for claves, opciones in indices_de(modo).get(coleccion, [])
+        if solo is None or claves in solo
+    ]
+
+
+def asegurar_indices(db, colecciones=None, modo='separado'):
+    """Crea los índices del modo `modo` que falten (create_indexes no toca los que ya existen)."""
+    for coleccion in colecciones or indices_de(modo):
+        indices = modelos(coleccion, modo=modo)
+        if indices:
+            with METRICAS.etapa('indices'):
+                db[coleccion].create_indexes(indices)
+
+
+def recrear_coleccion(db, coleccion, con_indices=True, modo='separado'):
+    """
+    Elimina `coleccion` y la vuelve a crear vacía con su validador $jsonSchema
+    y, si `con_indices`, con sus índices: el mismo estado que deja
+    CreacionBD_CostaInka.js (o su equivalente del modo embebido).
+    """
+    db.drop_collection(coleccion)
+    db.create_collection(coleccion, validator=validadores_de(modo)[coleccion], **OPCIONES_VALIDACION)
+    if con_indices:
+        asegurar_indices(db, [coleccion], modo)
+
+
+def indices_unicos(colecciones=None, modo='separado'):
+    """Retorna [(colección, claves, opciones)] de los índices únicos del modo `modo`."""
+    indices = indices_de(modo)
+    return [
+        (coleccion, claves, opciones)
+        for coleccion in colecciones or indices
+        for claves, opciones in indices.get(coleccion, [])
+        if opciones.get('unique')
+    ]
+
+
+def verificar_indices_unicos(db, colecciones=None, crear=True, modo='separado'):
+    """
+    Comprueba que existan los índices únicos (email y documento de Clientes,
+    nombres de los catálogos, relaciones 1 a 1 de Reservas/DetallesReserva)
+    antes de una carga: sin ellos nada impide que dos cargas creen el mismo
+    cliente o tipo. Un índice con las mismas claves pero sin `unique` no
+    cuenta. Con `crear=True` se crean los que falten; retorna los que siguen
+    faltando (por ejemplo, porque los datos ya tienen duplicados).
+    """
+    faltantes = []
+    for coleccion, claves, opciones in indices_unicos(colecciones, modo):
+        existentes = db[coleccion].index_information()
+        if any(list(info['key']) == claves and info.get('unique') for info in existentes.values()):
+            continue
+        if crear:
+            try:
+                db[coleccion].create_index(claves, name=nombre_indice(claves), **opciones)
+                print(f"Índice único creado: {coleccion}.{nombre_indice(claves)}")
+                continue
+            except OperationFailure as e:
+                print(f"Advertencia: no se pudo crear el índice único {coleccion}.{nombre_indice(claves)}: {e}")
+        faltantes.append((coleccion, nombre_indice(claves)))
+    return faltantes
+
+
+def quitar_indices(db, perfil=PERFIL_CARGA_MASIVA):
+    """Elimina los índices del perfil que existan y retorna {colección: [claves]} de los eliminados."""
+    quitados = {}
+    for coleccion, lista_claves in perfil.items():
+        existentes = {tuple(info['key']): nombre for nombre, info in db[coleccion].index_information().items()}
+        for claves in lista_claves:
+            nombre = existentes.get(tuple(claves))
+            if nombre is not None:
+                db[coleccion].drop_index(nombre)
+                quitados.setdefault(coleccion, []).append(claves)
+    return quitados
+
+
+def reconstruir_indices(db, perfil=PERFIL_CARGA_MASIVA, modo='separado'):
+    """Crea (con las opciones de los índices del modo `modo`) los índices del perfil."""
+    with METRICAS.etapa('reconstruir_indices'):
+        for coleccion, lista_claves in perfil.items():
+            indices = modelos(coleccion, lista_claves, modo)
+            if indices:
+                db[coleccion].create_indexes(indices)
+
+
+@contextmanager
+def carga_masiva(db, perfil=PERFIL_CARGA_MASIVA, modo='separado'):
+    """
+    Quita los índices secundarios del perfil durante el bloque with y los
+    reconstruye al salir, aunque la carga falle: MongoDB construye un índice
+    de una vez mucho más rápido que manteniéndolo insert a insert. Si el
+    proceso muere a mitad de la carga, `python indices.py asegurar` los recrea.
+    """
+    quitados = quitar_indices(db, perfil)
+    if quitados:
+        print("Índices quitados para la carga: " + ', '.join(
+            f"{coleccion}.{nombre_indice(claves)}" for coleccion, lista in quitados.items() for claves in lista))
+    try:
+        yield quitados
+    finally:
+        print("Reconstruyendo índices secundarios...")
+        reconstruir_indices(db, perfil, modo)
+
+
+def preparar_carga(db, masiva=False, modo='separado'):
+    """
+    Para el main de los loaders: verifica los índices únicos del modo de
+    esquema `modo` y retorna el contexto de la carga (con el perfil de carga
+    masiva si se pide).
+    """
+    faltantes = verificar_indices_unicos(db, modo=modo)
+    if faltantes:
+        print("Advertencia: faltan índices únicos: " + ', '.join(f"{c}.{n}" for c, n in faltantes))
+    return carga_masiva(db, PERFILES_CARGA_MASIVA[modo], modo) if masiva else nullcontext({})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Administra los índices de CostaDelInkaDB (los de CreacionBD_CostaInka.js)')
+    parser.add_argument('accion', choices=['asegurar', 'verificar', 'quitar-carga-masiva', 'reconstruir'],
+                        help='asegurar: crear todos los índices que falten; verificar: revisar los únicos; '
+                             'quitar-carga-masiva / reconstruir: índices del perfil de carga masiva')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='separado: Reservas y DetallesReserva; embebido: detalle dentro de Reservas')
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    args = parser.parse_args()
+    perfil = PERFILES_CARGA_MASIVA[args.esquema]
+
+    client = MongoClient(args.mongo_uri)
+    db = client[DB_NAME]
+    try:
+        if args.accion == 'asegurar':
+            asegurar_indices(db, modo=args.esquema)
+            print("Índices asegurados.")
+        elif args.accion == 'verificar':
+            faltantes = verificar_indices_unicos(db, crear=False, modo=args.esquema)
+            for coleccion, nombre in faltantes:
+                print(f"Falta el índice único {coleccion}.{nombre}")
+            if not faltantes:
+                print("Todos los índices únicos existen.")
+        elif args.accion == 'quitar-carga-masiva':
+            quitados = quitar_indices(db, perfil)
+            print(f"Índices quitados: {sum(len(l) for l in quitados.values())}")
+        else:
+            reconstruir_indices(db, perfil, args.esquema)
+            print("Índices del perfil de carga masiva reconstruidos.")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
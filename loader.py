@@ -1,214 +1,273 @@
+import argparse
 import csv
+from itertools import islice
 from pymongo import MongoClient
-from bson.objectid import ObjectId
-from datetime import datetime
-
-# --- Conexión a MongoDB ---
-try:
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['CostaDelInkaDB']
-    print("Conexión a MongoDB exitosa.")
-except Exception as e:
-    print(f"Error al conectar a MongoDB: {e}")
-    exit()
-
-# Colecciones
-clientes_col = db['Clientes']
-reservas_col = db['Reservas']
-detalles_reserva_col = db['DetallesReserva']
-tipos_habitacion_col = db['TiposHabitacion']
-tipos_cliente_col = db['TiposCliente']
-modalidades_pago_col = db['ModalidadesPago']
-
-# --- Función para parsear fechas ---
-def parse_csv_date(date_str, year_str=None, month_str=None, day_str=None):
-    if date_str and date_str != 'NULL':
-        try:
-            return datetime.strptime(date_str, '%d/%m/%y')
-        except ValueError:
+from datetime import datetime, timedelta
+
+from identidad_clientes import IndiceClientes
+from dimensiones import cache_tipos_cliente, cache_tipos_habitacion
+from formato_intermedio import formato_de, leer_registros, ruta_por_defecto, valores_distintos
+from escritura_lotes import LoteReservas, TAMANO_LOTE_POR_DEFECTO
+from etl_carga_mongodb import al_escribir_carga
+from esquema_bd import MODOS_ESQUEMA
+from carga_incremental import Checkpoint, ClavesReserva, id_cliente
+from conversores import convertir
+from indices import preparar_carga
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+
+CSV_FILE_PATH = 'hotel_bookings_es.parquet'
+TAMANO_BLOQUE_POR_DEFECTO = 1000
+MESES = ['Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre']
+
+# --- Etapa 1: lectura del CSV por bloques ---
+def leer_por_bloques(csv_file_path, tamano_bloque=TAMANO_BLOQUE_POR_DEFECTO, limite=None):
+    """
+    Genera listas de hasta `tamano_bloque` tuplas (número de fila, fila). Solo
+    hay un bloque en memoria a la vez; `limite` corta la lectura tras esa
+    cantidad de filas (None lee el archivo completo). Acepta CSV, Parquet y Feather.
+    """
+    if formato_de(csv_file_path) == 'csv':
+        with open(csv_file_path, mode='r', encoding='utf-8') as infile:
+            yield from _agrupar(csv.DictReader(infile), tamano_bloque, limite)
+    else:
+        # Como en csv.DictReader, los campos vacíos llegan como ''
+        registros = (
+            {col: '' if valor is None else valor for col, valor in row.items()}
+            for bloque in leer_registros(csv_file_path, tamano_bloque) for row in bloque
+        )
+        yield from _agrupar(registros, tamano_bloque, limite)
+
+def _agrupar(registros, tamano_bloque, limite):
+    filas = enumerate(registros, start=1)
+    if limite is not None:
+        filas = islice(filas, limite)
+    while True:
+        bloque = list(islice(filas, tamano_bloque))
+        if not bloque:
+            break
+        yield bloque
+
+# --- Etapa 2: transformación de cada fila en documentos ---
+def construir_documentos(row, count):
+    """Retorna (cliente_data, detalle_reserva_data, reserva_data) con los _id sin asignar."""
+    def valor(col, default=0):
+        # Conversión según el esquema, memorizada por valor (ver conversores.py)
+        return convertir(col, row.get(col, default))
+
+    cliente_email = row.get('email') or f"NULL"
+    cliente_data = {
+        "_id": None,
+        "nombre_completo": row.get('nombre_completo', f"Cliente Reserva {count}"),
+        "email": cliente_email,
+        "telefono": row.get('telefono', ''),
+        "tipo_documento_identidad": row.get('tipo_documento_identidad', ''),
+        "numero_documento_identidad": row.get('numero_documento_identidad', ''),
+        "fecha_nacimiento": valor('fecha_nacimiento', None),
+        "pais_origen_cliente": row.get('pais_origen_cliente', 'Desconocido'),
+        "es_huesped_recurrente_historico": valor('es_huesped_recurrente_historico'),
+        "total_cancelaciones_previas_cliente": valor('total_cancelaciones_previas_cliente'),
+        "total_reservas_previas_no_canceladas_cliente": valor('total_reservas_previas_no_canceladas_cliente'),
+        "historial_ids_reservas": []
+    }
+
+    detalle_reserva_data = {
+        "_id": None,
+        "reserva_id": None,  # Se actualizará después
+        "pais_origen_reserva": row.get('pais_origen_cliente', 'Desconocido'),
+        "es_huesped_recurrente_al_reservar": cliente_data["es_huesped_recurrente_historico"],
+        "cancelaciones_previas_cliente_al_reservar": cliente_data["total_cancelaciones_previas_cliente"],
+        "reservas_previas_no_canceladas_cliente_al_reservar": cliente_data["total_reservas_previas_no_canceladas_cliente"],
+        "tipo_habitacion_reservada": row.get('tipo_habitacion_reservada'),
+        "tipo_habitacion_asignada": row.get('tipo_habitacion_asignada'),
+        "cambios_en_reserva": valor('cambios_en_reserva'),
+        "tipo_cliente_en_reserva": row.get('tipo_cliente_en_reserva')
+    }
+
+    # Parsear fecha de llegada
+    fecha_llegada = None
+    try:
+        anio = int(row.get('anio_llegada'))
+        mes = row.get('mes_llegada')
+        dia = int(row.get('dia_llegada'))
+        # Convertir mes a número
+        mes_num = MESES.index(mes) + 1 if mes in MESES else 1
+        fecha_llegada = datetime(anio, mes_num, dia)
+    except Exception:
+        pass
+    noches_estadia_total = max(1, valor('noches_fin_semana') + valor('noches_semana'))
+    fecha_salida = None
+    if fecha_llegada:
+        fecha_salida = fecha_llegada + timedelta(days=noches_estadia_total)
+    reserva_data = {
+        "_id": None,
+        "cliente_id": None,
+        "detalle_reserva_id": None,
+        "fecha_creacion_reserva": datetime.now(),
+        "fue_cancelada": valor('fue_cancelada'),
+        "tiempo_anticipacion_reserva_dias": valor('tiempo_anticipacion_reserva_dias'),
+        "fecha_llegada": fecha_llegada,
+        "fecha_salida": fecha_salida,
+        "noches_estadia": noches_estadia_total,
+        "estado_reserva": row.get('estado_reserva'),
+        # d/m/yy o Y-m-d; None si no se reconoce
+        "fecha_estado_reserva": valor('fecha_estado_reserva', None),
+        "adr": valor('adr', 0.0),
+        "canal_reserva": row.get('canal_reserva'),
+        "hotel": row.get('hotel')
+    }
+    return cliente_data, detalle_reserva_data, reserva_data
+
+def transformar(bloques, indice_clientes, desde=0):
+    """
+    Convierte cada fila en documentos enlazados y resuelve el cliente con el
+    índice en memoria. Genera tuplas (fila, cliente nuevo o None, detalle, reserva).
+    Los ids se derivan del contenido de la fila; las primeras `desde` filas
+    (ya cargadas según el checkpoint) solo avanzan el cálculo de esos ids.
+    """
+    claves_reserva = ClavesReserva()
+    for bloque in bloques:
+        for count, row in bloque:
+            ids = claves_reserva.siguiente(row.values())
+            if count <= desde:
+                continue
             try:
-                return datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                print(f"Advertencia: No se pudo parsear la fecha '{date_str}'")
-                return None
-    elif year_str and month_str and day_str:
-        try:
-            month_number = datetime.strptime(month_str, "%B").month
-            return datetime(int(year_str), month_number, int(day_str))
-        except ValueError:
-            print(f"Advertencia: No se pudo construir la fecha de llegada desde {year_str}-{month_str}-{day_str}")
-            return None
-    return None
-
-# --- Función para crear o obtener tipo de habitación ---
-def get_or_create_tipo_habitacion(tipo_habitacion):
-    tipo_habitacion_doc = tipos_habitacion_col.find_one({"nombre_tipo_habitacion": tipo_habitacion})
-    if not tipo_habitacion_doc:
-        tipo_habitacion_id = ObjectId()
-        tipo_habitacion_data = {
-            "_id": tipo_habitacion_id,
-            "nombre_tipo_habitacion": tipo_habitacion,
-            "capacidad_maxima_adultos": 2,  # Valor por defecto
-            "precio_base_noche": 100.0,  # Valor por defecto
-            "activo": True
-        }
-        tipos_habitacion_col.insert_one(tipo_habitacion_data)
-        return tipo_habitacion_id
-    return tipo_habitacion_doc['_id']
-
-# --- Función para crear o obtener tipo de cliente ---
-def get_or_create_tipo_cliente(tipo_cliente):
-    tipo_cliente_doc = tipos_cliente_col.find_one({"nombre_tipo_cliente": tipo_cliente})
-    if not tipo_cliente_doc:
-        tipo_cliente_id = ObjectId()
-        tipo_cliente_data = {
-            "_id": tipo_cliente_id,
-            "nombre_tipo_cliente": tipo_cliente,
-            "activo": True
-        }
-        tipos_cliente_col.insert_one(tipo_cliente_data)
-        return tipo_cliente_id
-    return tipo_cliente_doc['_id']
-
-# --- Leer y Procesar el CSV ---
-csv_file_path = 'hotel_bookings_es.csv'
-
-try:
-    with open(csv_file_path, mode='r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-        count = 0
-        for row in reader:
-            count += 1
-            print(f"\nProcesando fila {count}")
-
-            # 1. Crear/Obtener Cliente
-            cliente_email = row.get('email') or f"NULL"
-            # Buscar por email primero
-            cliente_doc = clientes_col.find_one({"email": cliente_email})
-            # Si no existe, buscar por tipo_documento_identidad + numero_documento_identidad
-            if not cliente_doc:
-                tipo_doc = row.get('tipo_documento_identidad', '')
-                num_doc = row.get('numero_documento_identidad', '')
-                if tipo_doc and num_doc:
-                    cliente_doc = clientes_col.find_one({
-                        "tipo_documento_identidad": tipo_doc,
-                        "numero_documento_identidad": num_doc
-                    })
-            if not cliente_doc:
-                cliente_id = ObjectId()
-                cliente_data = {
-                    "_id": cliente_id,
-                    "nombre_completo": row.get('nombre_completo', f"Cliente Reserva {count}"),
-                    "email": cliente_email,
-                    "telefono": row.get('telefono', ''),
-                    "tipo_documento_identidad": row.get('tipo_documento_identidad', ''),
-                    "numero_documento_identidad": row.get('numero_documento_identidad', ''),
-                    "fecha_nacimiento": None,
-                    "pais_origen_cliente": row.get('pais_origen_cliente', 'Desconocido'),
-                    "es_huesped_recurrente_historico": bool(int(float(row.get('es_huesped_recurrente_historico', 0)))),
-                    "total_cancelaciones_previas_cliente": int(float(row.get('total_cancelaciones_previas_cliente', 0))),
-                    "total_reservas_previas_no_canceladas_cliente": int(float(row.get('total_reservas_previas_no_canceladas_cliente', 0))),
-                    "historial_ids_reservas": []
-                }
-                # Parsear fecha_nacimiento si existe
-                fecha_nac = row.get('fecha_nacimiento')
-                if fecha_nac:
-                    try:
-                        cliente_data["fecha_nacimiento"] = datetime.strptime(fecha_nac, '%Y-%m-%d')
-                    except Exception:
-                        pass
-                clientes_col.insert_one(cliente_data)
-                print(f"Cliente insertado con ID: {cliente_id}")
+                cliente_data, detalle_reserva_data, reserva_data = construir_documentos(row, count)
+            except Exception as e:
+                METRICAS.error(f"Error al transformar la fila {count}: {e}")
+                yield count, None, None, None
+                continue
+
+            # 1. Crear/Obtener Cliente: por email primero y luego por documento
+            cliente_nuevo = None
+            cliente_id = indice_clientes.buscar(
+                cliente_data["email"],
+                row.get('tipo_documento_identidad', ''),
+                row.get('numero_documento_identidad', '')
+            )
+            if cliente_id is not None:
+                METRICAS.contar('clientes_encontrados')
             else:
-                cliente_id = cliente_doc['_id']
-                print(f"Cliente encontrado con ID: {cliente_id}")
-
-            # 2. Crear Detalles de Reserva
-            detalle_reserva_id = ObjectId()
-            tipo_habitacion_id = get_or_create_tipo_habitacion(row.get('tipo_habitacion_reservada', 'C'))
-            
-            detalle_reserva_data = {
-                "_id": detalle_reserva_id,
-                "reserva_id": None,  # Se actualizará después
-                "pais_origen_reserva": row.get('pais_origen_cliente', 'Desconocido'),
-                "es_huesped_recurrente_al_reservar": bool(int(float(row.get('es_huesped_recurrente_historico', 0)))),
-                "cancelaciones_previas_cliente_al_reservar": int(float(row.get('total_cancelaciones_previas_cliente', 0))),
-                "reservas_previas_no_canceladas_cliente_al_reservar": int(float(row.get('total_reservas_previas_no_canceladas_cliente', 0))),
-                "tipo_habitacion_reservada": row.get('tipo_habitacion_reservada'),
-                "tipo_habitacion_asignada": row.get('tipo_habitacion_asignada'),
-                "cambios_en_reserva": int(float(row.get('cambios_en_reserva', 0))),
-                "tipo_cliente_en_reserva": row.get('tipo_cliente_en_reserva')
-            }
-
-            # 3. Crear Reserva Principal
-            reserva_id = ObjectId()
-            # Parsear fecha de llegada
-            fecha_llegada = None
-            try:
-                anio = int(row.get('anio_llegada'))
-                mes = row.get('mes_llegada')
-                dia = int(row.get('dia_llegada'))
-                # Convertir mes a número
-                meses = ['Enero','Febrero','Marzo','Abril','Mayo','Junio','Julio','Agosto','Septiembre','Octubre','Noviembre','Diciembre']
-                mes_num = meses.index(mes) + 1 if mes in meses else 1
-                fecha_llegada = datetime(anio, mes_num, dia)
-            except Exception:
-                pass
-            noches_estadia_weekend = int(float(row.get('noches_fin_semana', 0)))
-            noches_estadia_week = int(float(row.get('noches_semana', 0)))
-            noches_estadia_total = max(1, noches_estadia_weekend + noches_estadia_week)
-            fecha_salida = None
-            if fecha_llegada:
-                from datetime import timedelta
-                fecha_salida = fecha_llegada + timedelta(days=noches_estadia_total)
-            reserva_data = {
-                "_id": reserva_id,
-                "cliente_id": cliente_id,
-                "detalle_reserva_id": detalle_reserva_id,
-                "fecha_creacion_reserva": datetime.now(),
-                "fue_cancelada": bool(int(float(row.get('fue_cancelada', 0)))),
-                "tiempo_anticipacion_reserva_dias": int(float(row.get('tiempo_anticipacion_reserva_dias', 0))),
-                "fecha_llegada": fecha_llegada,
-                "fecha_salida": fecha_salida,
-                "noches_estadia": noches_estadia_total,
-                "estado_reserva": row.get('estado_reserva'),
-                "fecha_estado_reserva": None,
-                "adr": float(row.get('adr', 0.0)),
-                "canal_reserva": row.get('canal_reserva')
-            }
-            # Parsear fecha_estado_reserva
-            fecha_estado = row.get('fecha_estado_reserva')
-            if fecha_estado:
-                try:
-                    # Puede venir en formato d/m/yy
-                    reserva_data["fecha_estado_reserva"] = datetime.strptime(fecha_estado, '%d/%m/%y')
-                except Exception:
-                    try:
-                        reserva_data["fecha_estado_reserva"] = datetime.strptime(fecha_estado, '%Y-%m-%d')
-                    except Exception:
-                        pass
-            # Actualizar detalle_reserva_data con el reserva_id
-            detalle_reserva_data["reserva_id"] = reserva_id
-            try:
-                detalles_reserva_col.insert_one(detalle_reserva_data)
-                print(f"DetalleReserva insertado con ID: {detalle_reserva_id}")
-                reservas_col.insert_one(reserva_data)
-                print(f"Reserva insertada con ID: {reserva_id}")
-                clientes_col.update_one(
-                    {"_id": cliente_id},
-                    {"$push": {"historial_ids_reservas": reserva_id}}
+                cliente_id = id_cliente(
+                    cliente_data["email"],
+                    cliente_data["tipo_documento_identidad"],
+                    cliente_data["numero_documento_identidad"]
                 )
-                print(f"Cliente actualizado con la nueva reserva.")
-            except Exception as e:
-                print(f"Error al insertar documentos para la fila {count}: {e}")
-            if count >= 16000:
-                print("\nLímite de 16000 filas procesadas.")
-                break
+                cliente_data["_id"] = cliente_id
+                indice_clientes.registrar(cliente_data)
+                cliente_nuevo = cliente_data
+
+            # 2. Enlazar Detalles de Reserva y Reserva
+            reserva_id, detalle_reserva_data["_id"] = ids
+            detalle_reserva_data["reserva_id"] = reserva_id
+            reserva_data["_id"] = reserva_id
+            reserva_data["cliente_id"] = cliente_id
+            reserva_data["detalle_reserva_id"] = detalle_reserva_data["_id"]
+            yield count, cliente_nuevo, detalle_reserva_data, reserva_data
+
+# --- Etapa 3: sumidero que escribe por lotes ---
+def escribir_por_lotes(documentos, lote, indice_clientes, checkpoint=None):
+    """
+    Consume los documentos transformados y los escribe en lotes, registrando en
+    `checkpoint` la última fila escrita tras cada lote. Retorna la última fila leída.
+    """
+    count = checkpoint.ultima_fila if checkpoint is not None else 0
+    for count, cliente_nuevo, detalle_reserva_data, reserva_data in documentos:
+        if reserva_data is None:
+            lote.fallida(count)
+            continue
+        if cliente_nuevo is not None:
+            lote.agregar_cliente(count, cliente_nuevo)
+        lote.agregar_reserva(count, detalle_reserva_data, reserva_data)
+        if lote.lleno():
+            for cliente_doc in lote.vaciar():
+                indice_clientes.descartar(cliente_doc)
+            if checkpoint is not None:
+                checkpoint.guardar(count)
+            METRICAS.progreso(lambda: f"Lote {lote.lotes_escritos} escrito ({count} filas procesadas)")
+    for cliente_doc in lote.vaciar():
+        indice_clientes.descartar(cliente_doc)
+    if checkpoint is not None:
+        checkpoint.guardar(count)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga hotel_bookings_es en CostaDelInkaDB por streaming')
+    parser.add_argument('--archivo', default=ruta_por_defecto(CSV_FILE_PATH))
+    parser.add_argument('--limite', type=int, default=None,
+                        help='Cantidad máxima de filas a procesar (por defecto, todas)')
+    parser.add_argument('--tamano-bloque', type=int, default=TAMANO_BLOQUE_POR_DEFECTO,
+                        help='Filas leídas del CSV por bloque')
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_POR_DEFECTO,
+                        help='Reservas acumuladas antes de escribir en MongoDB')
+    parser.add_argument('--sin-checkpoint', action='store_true',
+                        help='No leer ni escribir el checkpoint de la carga')
+    parser.add_argument('--carga-masiva', action='store_true',
+                        help='Quitar los índices secundarios de Reservas/DetallesReserva y reconstruirlos al final')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='separado: Reservas y DetallesReserva; embebido: el detalle dentro de cada reserva')
+    parser.add_argument('--analitica', action='store_true',
+                        help='Actualizar los resúmenes de analitica.py tras cada lote')
+    parser.add_argument('--indice-ocupacion', metavar='RUTA',
+                        help='Mantener al día tras cada lote el índice de ocupación de ocupacion.py (.npz)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    # --- Conexión a MongoDB ---
+    try:
+        client = MongoClient('mongodb://localhost:27017/')
+        db = client['CostaDelInkaDB']
+        print("Conexión a MongoDB exitosa.")
+    except Exception as e:
+        print(f"Error al conectar a MongoDB: {e}")
+        exit()
+
+    csv_file_path = args.archivo
+    try:
+        checkpoint = None if args.sin_checkpoint else Checkpoint(db, csv_file_path)
+        if checkpoint is not None and checkpoint.completado:
+            print("Este archivo ya se cargó completo en esta base: no hay nada que cargar.")
+            return
+        desde = checkpoint.ultima_fila if checkpoint is not None else 0
+        if desde:
+            print(f"Reanudando la carga desde la fila {desde+1}")
+
+        # Índices únicos verificados antes de empezar (ver indices.py)
+        contexto_carga = preparar_carga(db, args.carga_masiva, args.esquema)
+
+        # Índice en memoria de los clientes existentes (una sola lectura de Clientes)
+        indice_clientes = IndiceClientes(db['Clientes'])
+
+        # Crear de una vez los tipos de habitación y de cliente presentes en el CSV
+        distintos = valores_distintos(csv_file_path, ['tipo_habitacion_reservada', 'tipo_cliente_en_reserva'])
+        cache_tipos_habitacion(db).precargar(distintos['tipo_habitacion_reservada'])
+        cache_tipos_cliente(db).precargar(distintos['tipo_cliente_en_reserva'])
+
+        # Pipeline: lectura por bloques -> transformación -> escritura por lotes
+        al_escribir = al_escribir_carga(db, args.esquema == 'embebido', args.analitica, args.indice_ocupacion)
+        lote = LoteReservas(db, args.tamano_lote, upsert=True, embebido=args.esquema == 'embebido',
+                            al_escribir=al_escribir)
+        bloques = METRICAS.cronometrar(leer_por_bloques(csv_file_path, args.tamano_bloque, args.limite), 'lectura')
+        documentos = METRICAS.cronometrar(transformar(bloques, indice_clientes, desde), 'transformacion')
+        with contexto_carga:
+            count = escribir_por_lotes(documentos, lote, indice_clientes, checkpoint)
+
+        if args.limite is not None and count >= args.limite:
+            print(f"\nLímite de {args.limite} filas procesadas.")
+        elif checkpoint is not None:
+            checkpoint.guardar(count, completado=True)
         print(f"\nProceso completado. {count} filas procesadas.")
-except FileNotFoundError:
-    print(f"Error: El archivo {csv_file_path} no fue encontrado.")
-except Exception as e:
-    print(f"Ocurrió un error general: {e}")
-finally:
-    client.close()
-    print("Conexión a MongoDB cerrada.")
\ No newline at end of file
+        print(f"Clientes insertados: {lote.clientes_insertados}")
+        print(f"Reservas insertadas: {lote.reservas_insertadas}")
+        print(f"Filas con error: {lote.filas_fallidas}")
+    except FileNotFoundError:
+        print(f"Error: El archivo {csv_file_path} no fue encontrado.")
+    except Exception as e:
+        print(f"Ocurrió un error general: {e}")
+    finally:
+        client.close()
+        print("Conexión a MongoDB cerrada.")
+    finalizar(args)
+
+if __name__ == '__main__':
+    main()
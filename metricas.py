@@ -0,0 +1,271 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Segundos mínimos entre dos mensajes de progreso
+INTERVALO_PROGRESO = 5.0
+# Errores por fila que se imprimen; los siguientes solo se cuentan
+MAX_ERRORES_IMPRESOS = 20
+# Límites superiores (ms) de los buckets de los histogramas de latencia
+LIMITES_LATENCIA_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+# --- Histograma de latencias con buckets fijos ---
+class Histograma:
+    """
+    Cuenta latencias en buckets de límites fijos: registrar cuesta lo mismo
+    sin importar cuántas mediciones haya y dos histogramas (por ejemplo, de
+    workers distintos) se combinan sumando sus buckets. Los percentiles se
+    aproximan por el límite superior del bucket que los contiene.
+    """
+
+    def __init__(self, limites=LIMITES_LATENCIA_MS):
+        self.limites = list(limites)
+        self.cuentas = [0] * (len(self.limites) + 1)
+        self.cantidad = 0
+        self.suma_ms = 0.0
+        self.max_ms = 0.0
+
+    def registrar(self, ms):
+        self.cuentas[bisect_left(self.limites, ms)] += 1
+        self.cantidad += 1
+        self.suma_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentil(self, p):
+        objetivo = p * self.cantidad
+        acumulado = 0
+        for i, cuenta in enumerate(self.cuentas):
+            acumulado += cuenta
+            if cuenta and acumulado >= objetivo:
+                return min(self.limites[i], self.max_ms) if i < len(self.limites) else self.max_ms
+        return 0.0
+
+    def combinar(self, resumen):
+        """Suma el histograma de otro proceso, tal como lo entrega `resumen`."""
+        for i, cuenta in enumerate(resumen['buckets'].values()):
+            self.cuentas[i] += cuenta
+        self.cantidad += resumen['cantidad']
+        self.suma_ms += resumen['promedio_ms'] * resumen['cantidad']
+        self.max_ms = max(self.max_ms, resumen['max_ms'])
+
+    def resumen(self):
+        etiquetas = [f"<={l}" for l in self.limites] + [f">{self.limites[-1]}"]
+        return {
+            'cantidad': self.cantidad,
+            'promedio_ms': round(self.suma_ms / self.cantidad, 3) if self.cantidad else 0.0,
+            'p50_ms': self.percentil(0.50),
+            'p95_ms': self.percentil(0.95),
+            'p99_ms': self.percentil(0.99),
+            'max_ms': round(self.max_ms, 3),
+            'buckets': dict(zip(etiquetas, self.cuentas)),
+        }
+
+
+# --- Registro de métricas del proceso ---
+class Metricas:
+    """
+    Contadores, tiempos por etapa e histogramas de latencia de un proceso,
+    más la salida de progreso limitada a un mensaje cada `intervalo_progreso`
+    segundos. Reemplaza los print por fila de los loaders: imprimir en la
+    terminal por cada fila llega a pesar tanto como la carga misma.
+
+    Los tiempos de etapa son exclusivos: si una etapa corre dentro de otra
+    (p. ej. la lectura dentro de la transformación de un pipeline de
+    generadores), su tiempo se descuenta del de la etapa exterior.
+    """
+
+    def __init__(self, intervalo_progreso=INTERVALO_PROGRESO, max_errores=MAX_ERRORES_IMPRESOS):
+        self.intervalo_progreso = intervalo_progreso
+        self.max_errores = max_errores
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._monitor = None
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta lo medido hasta ahora (p. ej. la preparación de un benchmark)."""
+        self.contadores = Counter()
+        self.tiempos = Counter()
+        self.latencias = {}
+        self.inicio = time.perf_counter()
+        self._ultimo_progreso = self.inicio
+        self._errores_impresos = 0
+
+    def configurar(self, intervalo_progreso=None, max_errores=None):
+        if intervalo_progreso is not None:
+            self.intervalo_progreso = intervalo_progreso
+        if max_errores is not None:
+            self.max_errores = max_errores
+
+    # Contadores
+    def contar(self, nombre, cantidad=1):
+        if cantidad:
+            with self._lock:
+                self.contadores[nombre] += cantidad
+
+    # Latencias
+    def registrar_latencia(self, nombre, segundos):
+        with self._lock:
+            if nombre not in self.latencias:
+                self.latencias[nombre] = Histograma()
+            self.latencias[nombre].registrar(segundos * 1000)
+
+    @contextmanager
+    def medir(self, nombre):
+        """Registra en el histograma `nombre` la duración del bloque with."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar_latencia(nombre, time.perf_counter() - inicio)
+
+    def viaje_bd(self, comando, segundos=None):
+        """Cuenta una petición a MongoDB y, si se conoce, su latencia."""
+        self.contar('viajes_bd')
+        self.contar(f'viajes_bd.{comando}')
+        if segundos is not None:
+            self.registrar_latencia(f'mongo.{comando}', segundos)
+
+    def monitorear_mongo(self):
+        """Registra (una vez) el listener que mide cada comando de los MongoClient que se creen después."""
+        if self._monitor is None:
+            self._monitor = MonitorMongo(self)
+            monitoring.register(self._monitor)
+
+    # Tiempos por etapa
+    @contextmanager
+    def etapa(self, nombre):
+        pila = getattr(self._local, 'pila', None)
+        if pila is None:
+            pila = self._local.pila = []
+        inicio = time.perf_counter()
+        pila.append(0.0)  # tiempo de las etapas anidadas
+        try:
+            yield
+        finally:
+            anidado = pila.pop()
+            total = time.perf_counter() - inicio
+            with self._lock:
+                self.tiempos[nombre] += total - anidado
+            if pila:
+                pila[-1] += total
+
+    def cronometrar(self, iterable, nombre):
+        """Itera `iterable` sumando a la etapa `nombre` el tiempo que tarda en producir cada elemento."""
+        iterador = iter(iterable)
+        while True:
+            with self.etapa(nombre):
+                try:
+                    elemento = next(iterador)
+                except StopIteration:
+                    return
+            yield elemento
+
+    # Salida
+    def progreso(self, mensaje, forzar=False):
+        """
+        Imprime `mensaje` si pasaron `intervalo_progreso` segundos desde el
+        último. `mensaje` puede ser una función, que solo se evalúa si se imprime.
+        """
+        ahora = time.perf_counter()
+        if not forzar and ahora - self._ultimo_progreso < self.intervalo_progreso:
+            return
+        self._ultimo_progreso = ahora
+        print(mensaje() if callable(mensaje) else mensaje, flush=True)
+
+    def error(self, mensaje):
+        """Cuenta un error y lo imprime solo si aún no se alcanzó `max_errores`."""
+        self.contar('errores')
+        with self._lock:
+            self._errores_impresos += 1
+            impresos = self._errores_impresos
+        if impresos <= self.max_errores:
+            print(mensaje)
+        if impresos == self.max_errores:
+            print(f"(se alcanzaron {self.max_errores} errores: los siguientes solo se cuentan)")
+
+    # Resumen
+    def resumen(self):
+        segundos = time.perf_counter() - self.inicio
+        with self._lock:
+            return {
+                'segundos': round(segundos, 3),
+                'contadores': dict(sorted(self.contadores.items())),
+                'tiempos_s': {k: round(v, 4) for k, v in sorted(self.tiempos.items())},
+                'latencias': {k: h.resumen() for k, h in sorted(self.latencias.items())},
+            }
+
+    def combinar(self, resumen):
+        """Agrega las métricas de otro proceso (el `resumen()` de un worker)."""
+        with self._lock:
+            self.contadores.update(resumen['contadores'])
+            self.tiempos.update(resumen['tiempos_s'])
+            for nombre, histograma in resumen['latencias'].items():
+                if nombre not in self.latencias:
+                    self.latencias[nombre] = Histograma()
+                self.latencias[nombre].combinar(histograma)
+
+    def imprimir_resumen(self):
+        resumen = self.resumen()
+        print(f"\nMétricas ({resumen['segundos']:.2f} s):")
+        for nombre, valor in resumen['contadores'].items():
+            print(f"  {nombre}: {valor:,}")
+        if resumen['tiempos_s']:
+            print("  Tiempo por etapa:")
+            for nombre, segundos in resumen['tiempos_s'].items():
+                print(f"    {nombre}: {segundos:.2f} s")
+        if resumen['latencias']:
+            print("  Latencias (ms):")
+            for nombre, h in resumen['latencias'].items():
+                print(f"    {nombre}: n={h['cantidad']:,} promedio={h['promedio_ms']:.2f} "
+                      f"p50<={h['p50_ms']} p95<={h['p95_ms']} p99<={h['p99_ms']} max={h['max_ms']:.2f}")
+
+    def guardar(self, ruta):
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(self.resumen(), f, ensure_ascii=False, indent=2)
+
+
+class MonitorMongo(monitoring.CommandListener):
+    """Cuenta cada comando enviado a MongoDB y registra su latencia por tipo de comando."""
+
+    def __init__(self, metricas):
+        self.metricas = metricas
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metricas.viaje_bd(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.metricas.viaje_bd(event.command_name, event.duration_micros / 1e6)
+        self.metricas.contar('viajes_bd_fallidos')
+
+
+# Métricas del proceso, compartidas por todos los módulos
+METRICAS = Metricas()
+
+
+# --- Opciones de línea de comandos comunes a los scripts ---
+def agregar_argumentos(parser):
+    parser.add_argument('--metricas', help='Guardar las métricas en este archivo JSON al terminar')
+    parser.add_argument('--intervalo-progreso', type=float, default=INTERVALO_PROGRESO,
+                        help='Segundos mínimos entre dos mensajes de progreso')
+
+
+def iniciar(args):
+    METRICAS.configurar(intervalo_progreso=args.intervalo_progreso)
+    METRICAS.monitorear_mongo()
+
+
+def finalizar(args):
+    METRICAS.imprimir_resumen()
+    if args.metricas:
+        METRICAS.guardar(args.metricas)
+        print(f"Métricas guardadas en {args.metricas}")
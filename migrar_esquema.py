@@ -0,0 +1,125 @@
+import argparse
+import time
+
+from pymongo import MongoClient
+
+from esquema_bd import CAMPO_DETALLE, CAMPO_INSERCION, OPCIONES_VALIDACION, validadores_de
+from indices import modelos
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+
+# Sufijo de las colecciones donde se arma el resultado antes de reemplazar las originales
+SUFIJO_TEMPORAL = '_migracion'
+
+
+# --- Colecciones temporales ---
+def _crear_temporal(db, destino, modo):
+    """Crea vacía la colección temporal de `destino` con el validador del modo `modo`."""
+    temporal = destino + SUFIJO_TEMPORAL
+    db.drop_collection(temporal)
+    db.create_collection(temporal, validator=validadores_de(modo)[destino], **OPCIONES_VALIDACION)
+    return temporal
+
+
+def _reemplazar(db, temporal, destino, modo):
+    """
+    Construye los índices de `destino` sobre la temporal ya llena (de una vez,
+    no documento a documento) y la renombra como `destino`, reemplazándola.
+    """
+    indices = modelos(destino, modo=modo)
+    if indices:
+        db[temporal].create_indexes(indices)
+    db[temporal].rename(destino, dropTarget=True)
+
+
+def _fusionar_en(temporal):
+    return {"$merge": {"into": temporal, "on": "_id", "whenMatched": "fail", "whenNotMatched": "insert"}}
+
+
+# --- separado -> embebido ---
+def embeber(db, conservar_detalles=False):
+    """
+    Copia cada reserva con su detalle como subdocumento en una colección
+    temporal y luego la renombra como Reservas. Todo ocurre en el servidor
+    ($lookup + $merge): ningún documento viaja al cliente. Si alguna reserva
+    no tiene detalle no se reemplaza nada. Retorna la cantidad de reservas.
+    """
+    total = db['Reservas'].estimated_document_count()
+    temporal = _crear_temporal(db, 'Reservas', 'embebido')
+    db['Reservas'].aggregate([
+        {"$lookup": {"from": "DetallesReserva", "localField": "detalle_reserva_id",
+                     "foreignField": "_id", "as": CAMPO_DETALLE}},
+        {"$unwind": f"${CAMPO_DETALLE}"},
+        {"$project": {"detalle_reserva_id": 0, f"{CAMPO_DETALLE}.reserva_id": 0}},
+        _fusionar_en(temporal),
+    ])
+    migradas = db[temporal].count_documents({})
+    if migradas != total:
+        db.drop_collection(temporal)
+        raise ValueError(f"{total - migradas} reservas no tienen detalle: no se modificó la base")
+
+    _reemplazar(db, temporal, 'Reservas', 'embebido')
+    if not conservar_detalles:
+        db.drop_collection('DetallesReserva')
+    return migradas
+
+
+# --- embebido -> separado ---
+def separar(db):
+    """
+    Reconstruye DetallesReserva a partir de los subdocumentos (con el mismo
+    _id de detalle) y Reservas con su detalle_reserva_id, ambas en colecciones
+    temporales que luego reemplazan a las actuales. Un detalle sin CAMPO_INSERCION
+    propio toma el de su reserva. Retorna la cantidad de reservas.
+    """
+    temporal_detalles = _crear_temporal(db, 'DetallesReserva', 'separado')
+    db['Reservas'].aggregate([
+        {"$match": {CAMPO_DETALLE: {"$type": "object"}}},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": [
+            {"_id": f"${CAMPO_DETALLE}._id", "reserva_id": "$_id", CAMPO_INSERCION: f"${CAMPO_INSERCION}"},
+            f"${CAMPO_DETALLE}"
+        ]}}},
+        _fusionar_en(temporal_detalles),
+    ])
+    temporal_reservas = _crear_temporal(db, 'Reservas', 'separado')
+    db['Reservas'].aggregate([
+        {"$set": {"detalle_reserva_id": f"${CAMPO_DETALLE}._id"}},
+        {"$project": {CAMPO_DETALLE: 0}},
+        _fusionar_en(temporal_reservas),
+    ])
+
+    _reemplazar(db, temporal_detalles, 'DetallesReserva', 'separado')
+    _reemplazar(db, temporal_reservas, 'Reservas', 'separado')
+    return db['Reservas'].estimated_document_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convierte CostaDelInkaDB entre el esquema separado (Reservas + DetallesReserva) '
+                    'y el embebido (detalle dentro de cada reserva)'
+    )
+    parser.add_argument('destino', choices=['embebido', 'separado'], help='Modo de esquema al que se migra')
+    parser.add_argument('--conservar-detalles', action='store_true',
+                        help='Al migrar a embebido, no eliminar la colección DetallesReserva')
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    db = client[DB_NAME]
+    inicio = time.perf_counter()
+    try:
+        if args.destino == 'embebido':
+            cantidad = embeber(db, args.conservar_detalles)
+        else:
+            cantidad = separar(db)
+        print(f"Migración al esquema {args.destino} completada: {cantidad} reservas "
+              f"en {time.perf_counter() - inicio:.2f} s.")
+    except Exception as e:
+        print(f"Error en la migración: {e}")
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import os
+import threading
+import time
+from datetime import date, timezone
+
+import numpy as np
+from pymongo import MongoClient
+
+from esquema_bd import CAMPO_DETALLE, CAMPO_INSERCION, MODOS_ESQUEMA
+from metricas import METRICAS
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+
+# Archivo por defecto del índice
+RUTA_INDICE = 'indice_ocupacion.npz'
+# Tipo de habitación por el que se cuenta la ocupación (campo de DetallesReserva)
+CAMPO_TIPO = 'tipo_habitacion_reservada'
+# Días que se agregan de más al ampliar el arreglo, para no ampliarlo en cada lote
+MARGEN_DIAS = 366
+
+
+# --- Índice de ocupación: habitaciones ocupadas por tipo y día ---
+class IndiceOcupacion:
+    """
+    Cuenta, para cada tipo de habitación y cada noche, las reservas no
+    canceladas que la ocupan: `conteos[tipo, dia]`, con el día 0 en `inicio`.
+    Cada tipo ocupa una fila contigua, así una consulta por rango de fechas
+    es un slice de NumPy y no una búsqueda en Reservas.
+
+    Las reservas se suman con un arreglo de diferencias (+1 la noche de
+    llegada, -1 el día de salida) y una suma acumulada: agregar un lote cuesta
+    lo mismo sin importar cuántas noches tenga cada reserva.
+
+    `reservas` y `ultima_insercion` son la huella de la base que el índice
+    refleja: la cantidad de documentos de Reservas (canceladas incluidas) y
+    el CAMPO_INSERCION más reciente (ms desde 1970, UTC) cuando se construyó,
+    actualizados con cada lote que se le agregó después.
+    """
+
+    def __init__(self, inicio=None, conteos=None, tipos=(), reservas=None, ultima_insercion=None):
+        self.reservas = reservas
+        self.ultima_insercion = ultima_insercion
+        self._fijar_inicio(inicio)
+        self.tipos = list(tipos)
+        self.conteos = conteos if conteos is not None else np.zeros((len(self.tipos), 0), dtype=np.int32)
+        self._columna = {tipo: i for i, tipo in enumerate(self.tipos)}
+        self._lock = threading.RLock()
+
+    def _fijar_inicio(self, inicio):
+        self.inicio = inicio  # numpy.datetime64[D] del día 0, None si está vacío
+        # El mismo día como ordinal de Python, para las consultas
+        self._ordinal0 = inicio.item().toordinal() if inicio is not None else None
+
+    # Mantenimiento
+    def _ampliar(self, tipos, primer_dia, fin):
+        # Agrega las filas de los tipos nuevos y los días que falten en [primer_dia, fin)
+        nuevos = [t for t in dict.fromkeys(tipos) if t not in self._columna]
+        for tipo in nuevos:
+            self._columna[tipo] = len(self.tipos)
+            self.tipos.append(tipo)
+        if self.inicio is None:
+            self._fijar_inicio(primer_dia)
+        antes = max(0, int((self.inicio - primer_dia) // np.timedelta64(1, 'D')))
+        despues = max(0, int((fin - self.inicio) // np.timedelta64(1, 'D')) - self.conteos.shape[1])
+        if nuevos or antes or despues:
+            antes = antes + MARGEN_DIAS if antes else 0
+            despues = despues + MARGEN_DIAS if despues else 0
+            self.conteos = np.pad(self.conteos, ((0, len(nuevos)), (antes, despues)))
+            self._fijar_inicio(self.inicio - np.timedelta64(antes, 'D'))
+
+    def agregar(self, llegadas, noches, tipos, signo=1):
+        """
+        Suma (o resta, con `signo=-1`) reservas dadas por sus fechas de
+        llegada, noches de estadía y tipo de habitación. Se ignoran las que no
+        tienen fecha, noches o tipo.
+        """
+        llegadas = np.asarray(llegadas, dtype='datetime64[D]')
+        noches = np.asarray(noches, dtype=np.int64)
+        validas = ~np.isnat(llegadas) & (noches > 0) & np.array([isinstance(t, str) for t in tipos], dtype=bool)
+        if not validas.any():
+            return
+        llegadas, noches = llegadas[validas], noches[validas]
+        tipos = [t for t, valida in zip(tipos, validas) if valida]
+        salidas = llegadas + noches.astype('timedelta64[D]')
+
+        with self._lock:
+            self._ampliar(tipos, llegadas.min(), salidas.max())
+            filas = np.array([self._columna[t] for t in tipos])
+            desde = (llegadas - self.inicio).astype(np.int64)
+            hasta = (salidas - self.inicio).astype(np.int64)
+            base = desde.min()
+            diferencias = np.zeros((len(self.tipos), hasta.max() - base + 1), dtype=np.int64)
+            np.add.at(diferencias, (filas, desde - base), signo)
+            np.add.at(diferencias, (filas, hasta - base), -signo)
+            self.conteos[:, base:hasta.max()] += np.cumsum(diferencias[:, :-1], axis=1).astype(self.conteos.dtype)
+
+    # Consultas
+    def _dia(self, fecha):
+        # Con ordinales de Python: convertir a datetime64 cuesta más que la consulta misma
+        if isinstance(fecha, str):
+            fecha = date.fromisoformat(fecha[:10])
+        elif not isinstance(fecha, date):
+            fecha = np.datetime64(fecha, 'D').item()
+        return fecha.toordinal() - self._ordinal0
+
+    def _rango(self, tipo, desde, hasta):
+        # (fila, primer día, día final) dentro del arreglo, o None si no hay datos
+        fila = self._columna.get(tipo)
+        if fila is None or self.inicio is None:
+            return None
+        return fila, max(self._dia(desde), 0), min(self._dia(hasta), self.conteos.shape[1])
+
+    def ocupacion(self, tipo, desde, hasta):
+        """Arreglo con las habitaciones de `tipo` ocupadas cada noche de [desde, hasta)."""
+        noches = int((np.datetime64(hasta, 'D') - np.datetime64(desde, 'D')) // np.timedelta64(1, 'D'))
+        resultado = np.zeros(max(0, noches), dtype=np.int64)
+        rango = self._rango(tipo, desde, hasta)
+        if rango is not None and rango[1] < rango[2]:
+            fila, i, j = rango
+            desplazamiento = i - self._dia(desde)
+            resultado[desplazamiento:desplazamiento + j - i] = self.conteos[fila, i:j]
+        return resultado
+
+    def max_ocupadas(self, tipo, desde, hasta):
+        """Máximo de habitaciones de `tipo` ocupadas en una misma noche de [desde, hasta)."""
+        rango = self._rango(tipo, desde, hasta)
+        if rango is None or rango[1] >= rango[2]:
+            return 0
+        fila, i, j = rango
+        return int(self.conteos[fila, i:j].max())
+
+    def disponibles(self, tipo, desde, hasta, total_habitaciones):
+        """Habitaciones de `tipo` libres todas las noches de [desde, hasta), de un total de `total_habitaciones`."""
+        return max(0, total_habitaciones - self.max_ocupadas(tipo, desde, hasta))
+
+    # Persistencia
+    def guardar(self, ruta=RUTA_INDICE):
+        with self._lock:
+            temporal = f"{ruta}.tmp"
+            with open(temporal, 'wb') as f:
+                np.savez(f, conteos=self.conteos, tipos=np.array(self.tipos, dtype=str),
+                         inicio=np.array(self.inicio if self.inicio is not None else 'NaT', dtype='datetime64[D]'),
+                         reservas=np.array(-1 if self.reservas is None else self.reservas, dtype=np.int64),
+                         ultima_insercion=np.array(-1 if self.ultima_insercion is None else self.ultima_insercion,
+                                                   dtype=np.int64))
+            # Reemplazo atómico, como el checkpoint de la carga
+            os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_INDICE):
+        with np.load(ruta, allow_pickle=False) as datos:
+            inicio = datos['inicio'][()]
+            # Los índices guardados antes de tener huella no coinciden con ninguna base
+            reservas = int(datos['reservas']) if 'reservas' in datos.files else -1
+            ultima = int(datos['ultima_insercion']) if 'ultima_insercion' in datos.files else -1
+            return cls(None if np.isnat(inicio) else inicio, datos['conteos'], datos['tipos'].tolist(),
+                       None if reservas < 0 else reservas, None if ultima < 0 else ultima)
+
+    def huella(self):
+        return self.reservas, self.ultima_insercion
+
+
+# --- Huella de Reservas ---
+def ultima_insercion(db, filtro=None):
+    """
+    CAMPO_INSERCION más reciente (ms desde 1970, UTC) de las reservas que
+    cumplen `filtro`, o None si ninguna lo tiene. Sin filtro recorre Reservas
+    (no hay índice por CAMPO_INSERCION), pero solo al abrir el índice.
+    """
+    documento = db['Reservas'].find_one({CAMPO_INSERCION: {"$type": "date"}, **(filtro or {})},
+                                        {CAMPO_INSERCION: 1}, sort=[(CAMPO_INSERCION, -1)])
+    if documento is None:
+        return None
+    instante = documento[CAMPO_INSERCION]
+    if instante.tzinfo is not None:
+        instante = instante.astimezone(timezone.utc).replace(tzinfo=None)
+    return int(np.datetime64(instante, 'ms').astype(np.int64))
+
+
+def huella(db):
+    """Cantidad de reservas y última inserción: cambia con cualquier carga o limpieza de la base."""
+    return db['Reservas'].estimated_document_count(), ultima_insercion(db)
+
+
+# --- Lectura de Reservas ---
+def leer_reservas(db, modo='separado', filtro=None):
+    """
+    Retorna (llegadas, noches, tipos) de las reservas no canceladas que
+    cumplen `filtro`, con el tipo de habitación de su detalle.
+    """
+    consulta = {"fue_cancelada": False, "fecha_llegada": {"$type": "date"}, **(filtro or {})}
+    if modo == 'embebido':
+        documentos = list(db['Reservas'].find(
+            consulta, {"_id": 0, "fecha_llegada": 1, "noches_estadia": 1, f"{CAMPO_DETALLE}.{CAMPO_TIPO}": 1}
+        ))
+        tipos = [(d.get(CAMPO_DETALLE) or {}).get(CAMPO_TIPO) for d in documentos]
+    else:
+        documentos = list(db['Reservas'].find(
+            consulta, {"_id": 0, "fecha_llegada": 1, "noches_estadia": 1, "detalle_reserva_id": 1}
+        ))
+        ids_detalle = [d.get('detalle_reserva_id') for d in documentos]
+        # Sin filtro se leen todos los detalles de una vez en lugar de buscarlos por _id
+        consulta_detalles = {} if filtro is None else {"_id": {"$in": ids_detalle}}
+        tipo_por_detalle = {d['_id']: d.get(CAMPO_TIPO) for d in db['DetallesReserva'].find(consulta_detalles, {CAMPO_TIPO: 1})}
+        tipos = [tipo_por_detalle.get(i) for i in ids_detalle]
+
+    llegadas = np.array([d['fecha_llegada'] for d in documentos], dtype='datetime64[us]').astype('datetime64[D]')
+    noches = np.array([d.get('noches_estadia') or 0 for d in documentos], dtype=np.int64)
+    return llegadas, noches, tipos
+
+
+def construir(db, modo='separado'):
+    """Construye el índice desde cero con todas las reservas no canceladas."""
+    reservas, ultima = huella(db)
+    indice = IndiceOcupacion(reservas=reservas, ultima_insercion=ultima)
+    with METRICAS.etapa('ocupacion'):
+        indice.agregar(*leer_reservas(db, modo))
+    return indice
+
+
+def cargar_o_construir(db, ruta=RUTA_INDICE, modo='separado'):
+    """
+    El índice guardado en `ruta` si su huella (cantidad de reservas y última
+    inserción) coincide con la de la base; si no existe o quedó de otra base
+    (p. ej. antes de clean_db.py), uno construido desde Reservas y guardado.
+    """
+    if os.path.exists(ruta):
+        indice = IndiceOcupacion.cargar(ruta)
+        if indice.huella() == huella(db):
+            return indice
+        print(f"El índice de ocupación {ruta} no corresponde a la base actual: se reconstruye.")
+    indice = construir(db, modo)
+    indice.guardar(ruta)
+    return indice
+
+
+def actualizador(db, ruta=RUTA_INDICE, modo='separado'):
+    """
+    Función para `LoteReservas(al_escribir=...)`: suma al índice de `ruta`
+    las reservas que creó cada lote y lo vuelve a guardar. Solo ve
+    inserciones: si una reserva se cancela después, hay que reconstruirlo.
+    """
+    indice = cargar_o_construir(db, ruta, modo)
+
+    def al_escribir(ids_reservas):
+        filtro = {"_id": {"$in": list(ids_reservas)}}
+        with METRICAS.etapa('ocupacion'):
+            reservas = leer_reservas(db, modo, filtro)
+            ultima = ultima_insercion(db, filtro)
+            # Conteos y huella cambian y se guardan juntos: otro lote no ve un estado intermedio
+            with indice._lock:
+                indice.agregar(*reservas)
+                indice.reservas += len(ids_reservas)
+                if ultima is not None:
+                    indice.ultima_insercion = max(ultima, indice.ultima_insercion or ultima)
+                indice.guardar(ruta)
+    return al_escribir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Índice de ocupación por día y tipo de habitación de CostaDelInkaDB')
+    parser.add_argument('accion', choices=['construir', 'consultar'],
+                        help='construir: rehacer el índice desde Reservas; consultar: ocupación de un tipo en un rango')
+    parser.add_argument('--tipo', help='Tipo de habitación (consultar)')
+    parser.add_argument('--desde', help='Primera noche, AAAA-MM-DD (consultar)')
+    parser.add_argument('--hasta', help='Día de salida, AAAA-MM-DD (consultar)')
+    parser.add_argument('--total', type=int, help='Habitaciones de ese tipo, para calcular las disponibles')
+    parser.add_argument('--ruta', default=RUTA_INDICE)
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado')
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    args = parser.parse_args()
+
+    if args.accion == 'construir':
+        client = MongoClient(args.mongo_uri)
+        try:
+            inicio = time.perf_counter()
+            indice = construir(client[DB_NAME], args.esquema)
+            indice.guardar(args.ruta)
+        finally:
+            client.close()
+        dias = indice.conteos.shape[1]
+        print(f"Índice construido en {time.perf_counter() - inicio:.2f} s: "
+              f"{len(indice.tipos)} tipos de habitación, {dias} días. Guardado en {args.ruta}")
+        return
+
+    if not (args.tipo and args.desde and args.hasta):
+        parser.error("consultar requiere --tipo, --desde y --hasta")
+    indice = IndiceOcupacion.cargar(args.ruta)
+    por_noche = indice.ocupacion(args.tipo, args.desde, args.hasta)
+    print(f"Tipo {args.tipo}, {args.desde} a {args.hasta}: máximo {int(por_noche.max(initial=0))} ocupadas")
+    if args.total is not None:
+        print(f"Disponibles: {indice.disponibles(args.tipo, args.desde, args.hasta, args.total)} de {args.total}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import time
+from contextlib import nullcontext
+from datetime import date
+
+from pymongo import MongoClient
+
+from carga_incremental import ClavesReserva
+from clientes_ficticios import GeneradorClientes
+from dimensiones import cache_tipos_habitacion
+from escritura_lotes import LoteReservas, TAMANO_LOTE_POR_DEFECTO
+from esquema_bd import MODOS_ESQUEMA
+from etl_carga_mongodb import al_escribir_carga, resolver_documentos
+from formato_intermedio import EscritorPorBloques, leer_por_bloques, normalizar_tipos
+from identidad_clientes import IndiceClientes
+from indices import preparar_carga
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+from preprocesamiento_basico import COLUMNS_TYPES, parsear_tipos, separar_rechazadas, validar
+from preprocesar_y_traducir_csv import (
+    COLUMN_MAP, CATEGORICAL_COLS, LIBRETRANSLATE_URL, TRANSLATION_CACHE_FILE, CacheTraducciones,
+    aplicar_mapeos_manuales, renombrar_columnas, traducir_columnas
+)
+from reduce_hotel_bookings import MODES, allocate, count_strata, sample_head, sample_reservoir, sample_stratified
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+FUENTE = 'hotel_bookings.csv'
+LIMITE_POR_DEFECTO = 15638
+TAMANO_BLOQUE_POR_DEFECTO = 5000
+
+# Tipos de las columnas originales (en inglés), tomados de COLUMNS_TYPES
+TIPOS_ORIGEN = {en: COLUMNS_TYPES[es] for en, es in COLUMN_MAP.items() if es in COLUMNS_TYPES}
+
+
+# --- Etapas: cada una recibe y retorna un iterador de bloques ---
+def reducir(bloques, limite, modo, semilla, fuente, tamano_bloque):
+    """
+    Reduce la fuente a `limite` filas con el muestreo de reduce_hotel_bookings.
+    'head' deja de leer la fuente al alcanzar el límite; 'reservoir' y
+    'stratified' necesitan recorrerla entera y entregan la muestra por bloques.
+    """
+    if modo == 'head':
+        yield from sample_head(bloques, limite)
+        return
+    if modo == 'reservoir':
+        muestra = sample_reservoir(bloques, limite, semilla)
+    else:
+        muestra = sample_stratified(bloques, allocate(count_strata(fuente, tamano_bloque), limite), semilla)
+    for inicio in range(0, len(muestra), tamano_bloque):
+        yield muestra.iloc[inicio:inicio + tamano_bloque]
+
+
+def traducir(bloques, cache, endpoint):
+    for bloque in bloques:
+        bloque, _ = renombrar_columnas(bloque)
+        bloque = aplicar_mapeos_manuales(bloque)
+        yield traducir_columnas(bloque, CATEGORICAL_COLS, cache, endpoint)
+
+
+def sintetizar(bloques, generador):
+    for bloque in bloques:
+        clientes = generador.generar(len(bloque))
+        for col in clientes.columns:
+            bloque[col] = clientes[col].to_numpy()
+        yield bloque
+
+
+def validar_bloques(bloques, escritor_rechazos=None):
+    # Los documentos vistos se acumulan para detectar duplicados entre bloques
+    vistos = set()
+    for bloque in bloques:
+        faltantes = [col for col in COLUMNS_TYPES if col not in bloque.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas para validar: {faltantes}")
+        bloque = parsear_tipos(bloque)
+        motivos = validar(bloque, vistos)
+        validas, rechazadas = separar_rechazadas(bloque, motivos)
+        METRICAS.contar('filas_rechazadas', len(rechazadas))
+        if escritor_rechazos is not None and len(rechazadas):
+            escritor_rechazos.escribir(rechazadas)
+        yield validas
+
+
+def guardar(bloques, escritor):
+    """Etapa de paso: escribe cada bloque en `escritor` y lo entrega sin cambios."""
+    for bloque in bloques:
+        escritor.escribir(bloque)
+        yield bloque
+
+
+def cargar(bloques, db, tamano_lote, embebido=False, analitica=False, indice_ocupacion=None):
+    """
+    Carga los bloques validados con ids deterministas y upserts, igual que
+    `etl_carga_mongodb.cargar_por_lotes`, manteniendo el índice de clientes y
+    el contador de ids entre bloques. Con `embebido` el detalle se guarda
+    dentro de cada reserva; con `analitica` y/o `indice_ocupacion` los
+    resúmenes y el índice de ocupación se actualizan tras cada lote.
+    """
+    indice_clientes = IndiceClientes(db['Clientes'])
+    tipos_habitacion = cache_tipos_habitacion(db)
+    claves_reserva = ClavesReserva()
+    al_escribir = al_escribir_carga(db, embebido, analitica, indice_ocupacion)
+    lote = LoteReservas(db, tamano_lote, upsert=True, embebido=embebido, al_escribir=al_escribir)
+    inicio = 0
+    for bloque in bloques:
+        # Misma representación que al leer hotel_bookings_es_validado.parquet
+        bloque = normalizar_tipos(bloque, COLUMNS_TYPES)
+        tipos_habitacion.precargar(bloque['tipo_habitacion_reservada'].unique())
+        for posicion, fila, error, cliente_nuevo, detalle_reserva_data, reserva_data in resolver_documentos(
+            bloque, indice_clientes, claves_reserva, inicio=inicio
+        ):
+            if error:
+                lote.fallida(fila, error)
+                continue
+            if cliente_nuevo is not None:
+                lote.agregar_cliente(fila, cliente_nuevo)
+            lote.agregar_reserva(fila, detalle_reserva_data, reserva_data)
+            if lote.lleno():
+                for cliente_doc in lote.vaciar():
+                    indice_clientes.descartar(cliente_doc)
+                METRICAS.progreso(lambda: f"  - {lote.reservas_insertadas} reservas cargadas hasta la fila {posicion}")
+        inicio += len(bloque)
+        yield bloque
+    for cliente_doc in lote.vaciar():
+        indice_clientes.descartar(cliente_doc)
+    print(f"Clientes insertados: {lote.clientes_insertados}")
+    print(f"Reservas insertadas: {lote.reservas_insertadas}")
+    print(f"Detalles de reserva insertados: {lote.detalles_insertados}")
+    print(f"Filas con error: {lote.filas_fallidas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Pipeline completo en un solo proceso: reducir -> traducir -> sintetizar -> validar -> cargar'
+    )
+    parser.add_argument('--fuente', default=FUENTE, help='Archivo original (CSV, Parquet o Feather)')
+    parser.add_argument('--tamano-bloque', type=int, default=TAMANO_BLOQUE_POR_DEFECTO)
+    parser.add_argument('--limite', type=int, default=LIMITE_POR_DEFECTO,
+                        help='Filas que conserva la etapa de reducción')
+    parser.add_argument('--muestreo', choices=MODES, default='head',
+                        help='head: primeras filas; reservoir: muestra uniforme; stratified: por hotel/año/mes')
+    # Etapas que se pueden desactivar
+    parser.add_argument('--sin-reducir', action='store_true')
+    parser.add_argument('--sin-traducir', action='store_true')
+    parser.add_argument('--sin-sintetizar', action='store_true')
+    parser.add_argument('--sin-validar', action='store_true')
+    parser.add_argument('--sin-cargar', action='store_true')
+    # Salidas intermedias: solo se escriben si se piden
+    parser.add_argument('--salida-reducido', help='Guardar la salida de la reducción')
+    parser.add_argument('--salida-traducido', help='Guardar los datos traducidos y con clientes ficticios')
+    parser.add_argument('--salida-validado', help='Guardar las filas válidas')
+    parser.add_argument('--salida-rechazados', help='Guardar las filas rechazadas con su motivo')
+    # Opciones de cada etapa
+    parser.add_argument('--endpoint', default=LIBRETRANSLATE_URL)
+    parser.add_argument('--cache-traducciones', default=TRANSLATION_CACHE_FILE)
+    parser.add_argument('--semilla', type=int, default=None)
+    parser.add_argument('--fecha-referencia', type=date.fromisoformat, default=None,
+                        help='Fecha (AAAA-MM-DD) para las edades de los datos ficticios; '
+                             'por defecto, hoy, o una fecha fija si se indica --semilla')
+    parser.add_argument('--procesos', type=int, default=None)
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE_POR_DEFECTO)
+    parser.add_argument('--carga-masiva', action='store_true',
+                        help='Quitar los índices secundarios de Reservas/DetallesReserva y reconstruirlos al final')
+    parser.add_argument('--esquema', choices=MODOS_ESQUEMA, default='separado',
+                        help='separado: Reservas y DetallesReserva; embebido: el detalle dentro de cada reserva')
+    parser.add_argument('--analitica', action='store_true',
+                        help='Actualizar los resúmenes de analitica.py tras cada lote')
+    parser.add_argument('--indice-ocupacion', metavar='RUTA',
+                        help='Mantener al día tras cada lote el índice de ocupación de ocupacion.py (.npz)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    inicio = time.perf_counter()
+    escritores = []
+    client = None
+
+    def escritor(ruta, tipos=None):
+        e = EscritorPorBloques(ruta, tipos)
+        escritores.append(e)
+        return e
+
+    def leer(ruta):
+        # La inferencia de tipos de pandas puede variar entre bloques: se fijan los del esquema
+        for bloque in leer_por_bloques(ruta, args.tamano_bloque):
+            METRICAS.contar('filas_leidas', len(bloque))
+            yield normalizar_tipos(bloque, {**TIPOS_ORIGEN, **COLUMNS_TYPES})
+
+    # Cada etapa se cronometra por separado (sin contar el tiempo de las anteriores)
+    etapa = METRICAS.cronometrar
+    contexto_carga = nullcontext()
+    try:
+        bloques = etapa(leer(args.fuente), 'lectura')
+        if not args.sin_reducir:
+            bloques = etapa(reducir(bloques, args.limite, args.muestreo, args.semilla, args.fuente, args.tamano_bloque),
+                            'reducir')
+        if args.salida_reducido:
+            bloques = etapa(guardar(bloques, escritor(args.salida_reducido, TIPOS_ORIGEN)), 'guardar')
+        if not args.sin_traducir:
+            bloques = etapa(traducir(bloques, CacheTraducciones(args.cache_traducciones), args.endpoint), 'traducir')
+        if not args.sin_sintetizar:
+            bloques = etapa(sintetizar(bloques, GeneradorClientes(args.semilla, args.procesos, args.fecha_referencia)), 'sintetizar')
+        if args.salida_traducido:
+            bloques = etapa(guardar(bloques, escritor(args.salida_traducido, COLUMNS_TYPES)), 'guardar')
+        if not args.sin_validar:
+            rechazos = escritor(args.salida_rechazados) if args.salida_rechazados else None
+            bloques = etapa(validar_bloques(bloques, rechazos), 'validar')
+        if args.salida_validado:
+            bloques = etapa(guardar(bloques, escritor(args.salida_validado, COLUMNS_TYPES)), 'guardar')
+        if not args.sin_cargar:
+            client = MongoClient(args.mongo_uri)
+            contexto_carga = preparar_carga(client[DB_NAME], args.carga_masiva, args.esquema)
+            bloques = etapa(cargar(bloques, client[DB_NAME], args.tamano_lote, args.esquema == 'embebido',
+                                   args.analitica, args.indice_ocupacion), 'cargar')
+
+        # Consumir el pipeline: un bloque recorre todas las etapas antes de leer el siguiente
+        salida = 0
+        with contexto_carga:
+            for bloque in bloques:
+                salida += len(bloque)
+    finally:
+        for e in escritores:
+            e.cerrar()
+        if client is not None:
+            client.close()
+
+    segundos = time.perf_counter() - inicio
+    print(f"\nResumen del pipeline:")
+    print(f"Filas leídas de {args.fuente}: {METRICAS.contadores['filas_leidas']}")
+    print(f"Filas rechazadas por la validación: {METRICAS.contadores['filas_rechazadas']}")
+    print(f"Filas a la salida: {salida}")
+    for e in escritores:
+        print(f"Archivo escrito: {e.ruta} ({e.filas} filas)")
+    print(f"Tiempo total: {segundos:.2f} s ({salida / max(segundos, 1e-9):,.0f} filas/s)")
+    finalizar(args)
+
+
+if __name__ == '__main__':
+    main()
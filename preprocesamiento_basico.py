@@ -1,47 +1,11 @@
+import argparse
 import pandas as pd
 import numpy as np
-from datetime import datetime
-
-# Columnas esperadas y sus tipos
-COLUMNS_TYPES = {
-    'hotel': str,
-    'fue_cancelada': int,
-    'tiempo_anticipacion_reserva_dias': int,
-    'anio_llegada': int,
-    'mes_llegada': str,
-    'semana_llegada': int,
-    'dia_llegada': int,
-    'noches_fin_semana': int,
-    'noches_semana': int,
-    'adultos': int,
-    'ninos': float,
-    'bebes': float,
-    'regimen_alimenticio': str,
-    'pais_origen_cliente': str,
-    'segmento_mercado': str,
-    'canal_reserva': str,
-    'es_huesped_recurrente_historico': int,
-    'total_cancelaciones_previas_cliente': int,
-    'total_reservas_previas_no_canceladas_cliente': int,
-    'tipo_habitacion_reservada': str,
-    'tipo_habitacion_asignada': str,
-    'cambios_en_reserva': int,
-    'agente': str,
-    'compania': str,
-    'dias_en_lista_espera': int,
-    'tipo_cliente_en_reserva': str,
-    'adr': float,
-    'espacios_estacionamiento_requeridos': int,
-    'total_solicitudes_especiales': int,
-    'estado_reserva': str,
-    'fecha_estado_reserva': str,
-    'nombre_completo': str,
-    'email': str,
-    'telefono': str,
-    'tipo_documento_identidad': str,
-    'numero_documento_identidad': str,
-    'fecha_nacimiento': str
-}
+
+from conversores import fechas
+from esquema_bd import COLUMNS_TYPES
+from formato_intermedio import escribir_tabla, leer_tabla, ruta_por_defecto
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
 
 OBLIGATORIAS = [
     'hotel', 'anio_llegada', 'mes_llegada', 'dia_llegada', 'nombre_completo',
@@ -50,68 +14,108 @@ OBLIGATORIAS = [
 
 UNIQUE_KEY = ['tipo_documento_identidad', 'numero_documento_identidad']
 
-input_file = 'hotel_bookings_es.csv'
-output_file = 'hotel_bookings_es_validado.csv'
-
-print('Leyendo archivo...')
-df = pd.read_csv(input_file, dtype=str)
-
-# 1. Mapeo/verificación de columnas
-print('Verificando columnas...')
-missing_cols = [col for col in COLUMNS_TYPES if col not in df.columns]
-if missing_cols:
-    print(f'ERROR: Faltan columnas: {missing_cols}')
-    exit(1)
-
-# 2. Parseo de tipos
-print('Parseando tipos de datos...')
-for col, col_type in COLUMNS_TYPES.items():
-    if col_type == int:
-        df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
-    elif col_type == float:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    else:
-        df[col] = df[col].astype(str)
-
-# 3. Validación básica
-print('Validando datos...')
-invalid_rows = set()
-
-# Validar nulos en obligatorias
-def check_nulls(row, idx):
+input_file = 'hotel_bookings_es.parquet'
+output_file = 'hotel_bookings_es_validado.parquet'
+rejects_file = 'hotel_bookings_es_rechazados.csv'
+
+# Códigos de motivo de rechazo
+MOTIVO_NULO = 'NULO'
+MOTIVO_FECHA_NACIMIENTO = 'FECHA_NACIMIENTO_INVALIDA'
+MOTIVO_DUPLICADO = 'DOCUMENTO_DUPLICADO'
+
+# Parseo de tipos
+def parsear_tipos(df):
+    for col, col_type in COLUMNS_TYPES.items():
+        if col_type == int:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
+        elif col_type == float:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        else:
+            df[col] = df[col].astype(str)
+    return df
+
+# Validación vectorizada: retorna, por fila, los motivos de rechazo separados por '|' ('' si es válida).
+# `vistos` (set de documentos) permite validar un archivo por bloques: acumula los
+# documentos de los bloques anteriores para detectar duplicados entre bloques.
+def validar(df, vistos=None):
+    motivos = pd.Series('', index=df.index, dtype=object)
+
+    def agregar(mascara, codigo):
+        nonlocal motivos
+        motivos = motivos + np.where(mascara, '|' + codigo, '')
+
+    # Nulos en columnas obligatorias
     for col in OBLIGATORIAS:
-        val = row[col]
-        if pd.isnull(val) or str(val) == '' or str(val).lower() == 'nan':
-            print(f"Fila {idx+2}: Valor nulo en columna obligatoria '{col}'")
-            invalid_rows.add(idx)
-
-# Validar formato de fecha_nacimiento
-def check_fecha_nacimiento(row, idx):
-    fecha = row['fecha_nacimiento']
-    if fecha:
-        try:
-            datetime.strptime(fecha, '%Y-%m-%d')
-        except Exception:
-            print(f"Fila {idx+2}: Formato inválido en fecha_nacimiento: '{fecha}'")
-            invalid_rows.add(idx)
-
-# Validar unicidad de documento
-doc_set = set()
-def check_unicidad(row, idx):
-    key = (row['tipo_documento_identidad'], row['numero_documento_identidad'])
-    if key in doc_set:
-        print(f"Fila {idx+2}: Duplicado de documento: {key}")
-        invalid_rows.add(idx)
-    else:
-        doc_set.add(key)
-
-for idx, row in df.iterrows():
-    check_nulls(row, idx)
-    check_fecha_nacimiento(row, idx)
-    check_unicidad(row, idx)
-
-# 4. Guardar solo filas válidas
-print(f'Filas inválidas detectadas: {len(invalid_rows)}')
-df_valid = df.drop(list(invalid_rows))
-df_valid.to_csv(output_file, index=False)
-print(f'Archivo validado guardado como {output_file} ({len(df_valid)} filas válidas)')
\ No newline at end of file
+        texto = df[col].astype(str)
+        agregar(df[col].isna() | (texto == '') | (texto.str.lower() == 'nan'), f'{MOTIVO_NULO}:{col}')
+
+    # Formato de fecha_nacimiento (un valor vacío no se valida)
+    fecha = df['fecha_nacimiento']
+    fecha_invalida = fechas(fecha, 'fecha_nacimiento').isna()
+    agregar(fecha_invalida & fecha.ne(''), MOTIVO_FECHA_NACIMIENTO)
+
+    # Unicidad de documento: se conserva la primera aparición
+    duplicado = df.duplicated(UNIQUE_KEY, keep='first')
+    if vistos is not None:
+        claves = list(zip(*(df[col].tolist() for col in UNIQUE_KEY)))
+        duplicado |= pd.Series([clave in vistos for clave in claves], index=df.index)
+        vistos.update(claves)
+    agregar(duplicado, MOTIVO_DUPLICADO)
+    return motivos.str.lstrip('|')
+
+def separar_rechazadas(df, motivos):
+    """Retorna (filas válidas, filas rechazadas con su número de fila y motivo_rechazo)."""
+    invalidas = motivos != ''
+    df_rechazadas = df[invalidas].copy()
+    df_rechazadas.insert(0, 'fila', df_rechazadas.index + 2)
+    df_rechazadas['motivo_rechazo'] = motivos[invalidas]
+    return df[~invalidas], df_rechazadas
+
+def main():
+    parser = argparse.ArgumentParser(description='Valida hotel_bookings_es y separa las filas rechazadas')
+    parser.add_argument('--entrada', default=ruta_por_defecto(input_file))
+    parser.add_argument('--salida', default=ruta_por_defecto(output_file),
+                        help='Archivo validado; la extensión elige el formato (.parquet, .feather o .csv)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    print('Leyendo archivo...')
+    with METRICAS.etapa('lectura'):
+        df = leer_tabla(args.entrada, dtype_csv=str)
+
+    # 1. Mapeo/verificación de columnas
+    print('Verificando columnas...')
+    missing_cols = [col for col in COLUMNS_TYPES if col not in df.columns]
+    if missing_cols:
+        print(f'ERROR: Faltan columnas: {missing_cols}')
+        exit(1)
+
+    # 2. Parseo de tipos
+    print('Parseando tipos de datos...')
+    with METRICAS.etapa('parseo'):
+        df = parsear_tipos(df)
+
+    # 3. Validación básica
+    print('Validando datos...')
+    with METRICAS.etapa('validacion'):
+        motivos = validar(df)
+    invalidas = motivos != ''
+    METRICAS.contar('filas_leidas', len(df))
+    METRICAS.contar('filas_rechazadas', int(invalidas.sum()))
+
+    # 4. Guardar filas válidas y rechazadas por separado
+    print(f'Filas inválidas detectadas: {int(invalidas.sum())}')
+    for motivo, cantidad in motivos[invalidas].str.split('|').explode().value_counts().items():
+        print(f'  - {motivo}: {cantidad}')
+    df_valid, df_rechazadas = separar_rechazadas(df, motivos)
+    df_rechazadas.to_csv(rejects_file, index=False)
+    print(f'Filas rechazadas guardadas en {rejects_file}')
+
+    with METRICAS.etapa('escritura'):
+        escribir_tabla(df_valid, args.salida, COLUMNS_TYPES)
+    print(f'Archivo validado guardado como {args.salida} ({len(df_valid)} filas válidas)')
+    finalizar(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
-import pandas as pd
+import argparse
+import json
+import os
+import threading
+from datetime import date
 import requests
-import random
-from datetime import datetime
-from faker import Faker
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from clientes_ficticios import generar_clientes_ficticios
+from formato_intermedio import escribir_tabla, leer_tabla, ruta_por_defecto
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+from preprocesamiento_basico import COLUMNS_TYPES
 
 # Mapeo completo de columnas inglés -> español
 COLUMN_MAP = {
@@ -64,70 +71,182 @@ CATEGORICAL_COLS = [
     'tipo_cliente_en_reserva'
 ]
 
-TIPOS_DOC = ['DNI', 'CE', 'Pasaporte']
-
-fake = Faker('es_ES')
-
-# Función para generar número de documento
-def generar_numero_documento(tipo):
-    if tipo == 'DNI':
-        return str(random.randint(10000000, 99999999))
-    elif tipo == 'CE':
-        return str(random.randint(100000000, 999999999))
-    elif tipo == 'Pasaporte':
-        return f"P{random.randint(1000000, 9999999)}"
-    return '00000000'
-
-# Función para obtener datos ficticios usando Faker
-def obtener_datos_ficticios():
-    nombre = fake.name()
-    email = fake.email()
-    telefono = fake.phone_number()
-    fecha_nacimiento = fake.date_of_birth(minimum_age=18, maximum_age=80).strftime('%Y-%m-%d')
-    return nombre, email, telefono, fecha_nacimiento
-
-# Traducir valores únicos de una columna usando LibreTranslate
-def traducir_columna_libretranslate(df, col):
-    valores = df[col].dropna().unique()
-    traducciones = {}
-    print(f"Traduciendo columna '{col}' ({len(valores)} valores únicos)...")
-    for i, val in enumerate(valores, 1):
-        if isinstance(val, str) and val.strip():
-            try:
-                response = requests.post(
-                    'https://libretranslate.com/translate',
-                    data={
-                        'q': val,
-                        'source': 'en',
-                        'target': 'es',
-                        'format': 'text'
-                    },
-                    timeout=10
-                )
-                if response.status_code == 200:
-                    traduccion = response.json()['translatedText']
-                else:
-                    traduccion = val
-            except Exception:
-                traduccion = val
-            traducciones[val] = traduccion
-        else:
-            traducciones[val] = val
-        if i % 10 == 0 or i == len(valores):
-            print(f"  - {i}/{len(valores)} traducidos...")
-    df[col] = df[col].map(traducciones)
+# Servicio de traducción (configurable para usar un servidor local en pruebas)
+LIBRETRANSLATE_URL = os.environ.get('LIBRETRANSLATE_URL', 'https://libretranslate.com/translate')
+TRANSLATION_CACHE_FILE = 'traducciones_cache.json'
+TRANSLATION_MAX_WORKERS = 4
+TRANSLATION_BATCH_SIZE = 25
+# Ejecuciones en que se reintenta un valor que el servicio no tradujo
+TRANSLATION_MAX_INTENTOS = 3
+
+# --- Renombrado y mapeos manuales ---
+def renombrar_columnas(df):
+    """Retorna (df con columnas en español, lista de renombres 'origen → destino')."""
+    renombres = {k: v for k, v in COLUMN_MAP.items() if k in df.columns}
+    return df.rename(columns=renombres), [f"{k} → {v}" for k, v in renombres.items()]
+
+def aplicar_mapeos_manuales(df):
+    # Mapeos manuales SOLO para mes_llegada y estado_reserva
+    if 'mes_llegada' in df.columns:
+        df['mes_llegada'] = df['mes_llegada'].map(MESES_MAP).fillna(df['mes_llegada'])
+    if 'estado_reserva' in df.columns:
+        df['estado_reserva'] = df['estado_reserva'].map(ESTADO_RESERVA_MAP).fillna(df['estado_reserva'])
+    return df
+
+# --- Traducción con LibreTranslate y caché persistente ---
+class CacheTraducciones:
+    """
+    Caché en disco de traducciones, indexada por (idioma origen, idioma
+    destino, texto). Se comparte entre columnas y entre ejecuciones; solo se
+    guardan las traducciones que el servicio respondió correctamente.
+
+    Los textos que no se pudieron traducir se anotan aparte (clave
+    '_fallidas') con el número de ejecuciones en que fallaron, para dejar de
+    consultarlos tras TRANSLATION_MAX_INTENTOS en vez de pagar el timeout en
+    cada ejecución.
+    """
+
+    def __init__(self, ruta=TRANSLATION_CACHE_FILE):
+        self.ruta = ruta
+        self.datos = {}
+        if ruta and os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as f:
+                self.datos = json.load(f)
+        self.fallidas = self.datos.pop('_fallidas', {})
+
+    def obtener(self, source, target, texto):
+        return self.datos.get(source, {}).get(target, {}).get(texto)
+
+    def guardar(self, source, target, traducciones):
+        self.datos.setdefault(source, {}).setdefault(target, {}).update(traducciones)
+        fallidas = self.fallidas.get(source, {}).get(target, {})
+        for texto in traducciones:
+            fallidas.pop(texto, None)
+
+    def intentos_fallidos(self, source, target, texto):
+        return self.fallidas.get(source, {}).get(target, {}).get(texto, 0)
+
+    def registrar_fallos(self, source, target, textos):
+        fallidas = self.fallidas.setdefault(source, {}).setdefault(target, {})
+        for texto in textos:
+            fallidas[texto] = fallidas.get(texto, 0) + 1
+
+    def olvidar_fallos(self):
+        self.fallidas = {}
+
+    def persistir(self):
+        if not self.ruta:
+            return
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({**self.datos, '_fallidas': self.fallidas}, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(temporal, self.ruta)
+
+_sesiones = threading.local()
+
+def _sesion():
+    # requests.Session no es seguro entre hilos: una por hilo del pool
+    if not hasattr(_sesiones, 'sesion'):
+        _sesiones.sesion = requests.Session()
+    return _sesiones.sesion
+
+def _traducir_lote(textos, endpoint, source, target):
+    """
+    Traduce `textos` con una sola petición (LibreTranslate acepta una lista en
+    `q`). Si el servicio no responde una lista, se traduce texto por texto.
+    Retorna {texto: traducción} solo con los textos traducidos con éxito.
+    """
+    try:
+        METRICAS.contar('peticiones_traduccion')
+        with METRICAS.medir('libretranslate'):
+            response = _sesion().post(
+                endpoint,
+                json={'q': textos, 'source': source, 'target': target, 'format': 'text'},
+                timeout=10
+            )
+        if response.status_code == 200:
+            traducidos = response.json().get('translatedText')
+            if isinstance(traducidos, list) and len(traducidos) == len(textos):
+                return dict(zip(textos, traducidos))
+    except Exception:
+        pass
+    if len(textos) == 1:
+        return {}
+    resultado = {}
+    for texto in textos:
+        resultado.update(_traducir_lote([texto], endpoint, source, target))
+    return resultado
+
+def traducir_valores(valores, cache, endpoint=LIBRETRANSLATE_URL, source='en', target='es',
+                     max_concurrencia=TRANSLATION_MAX_WORKERS, tamano_lote=TRANSLATION_BATCH_SIZE,
+                     max_intentos=TRANSLATION_MAX_INTENTOS):
+    """
+    Retorna {valor: traducción} para `valores`. Los aciertos de caché no usan
+    la red; los fallos se envían en lotes a través de un pool de hilos acotado.
+    Un valor que no se pudo traducir se conserva sin cambios, como antes, y
+    deja de consultarse después de fallar en `max_intentos` ejecuciones.
+    """
+    textos = sorted({v for v in valores if isinstance(v, str) and v.strip()})
+    sin_traduccion = [t for t in textos if cache.obtener(source, target, t) is None]
+    faltantes = [t for t in sin_traduccion if cache.intentos_fallidos(source, target, t) < max_intentos]
+    descartados = len(sin_traduccion) - len(faltantes)
+    METRICAS.contar('traducciones_en_cache', len(textos) - len(sin_traduccion))
+    METRICAS.contar('traducciones_consultadas', len(faltantes))
+    METRICAS.contar('traducciones_descartadas', descartados)
+    print(f"Traducciones: {len(textos)} valores únicos, {len(textos) - len(sin_traduccion)} en caché, "
+          f"{descartados} sin traducción tras {max_intentos} intentos, {len(faltantes)} a consultar en {endpoint}")
+    if faltantes:
+        lotes = [faltantes[i:i + tamano_lote] for i in range(0, len(faltantes), tamano_lote)]
+        with ThreadPoolExecutor(max_workers=max_concurrencia) as pool:
+            futuros = {pool.submit(_traducir_lote, lote, endpoint, source, target): lote for lote in lotes}
+            for i, futuro in enumerate(as_completed(futuros), 1):
+                traducidos = futuro.result()
+                cache.guardar(source, target, traducidos)
+                cache.registrar_fallos(source, target, [t for t in futuros[futuro] if t not in traducidos])
+                METRICAS.progreso(lambda: f"  - {i}/{len(lotes)} lotes traducidos...")
+        cache.persistir()
+    return {t: cache.obtener(source, target, t) or t for t in textos}
+
+def traducir_columnas(df, columnas, cache, endpoint=LIBRETRANSLATE_URL):
+    """Traduce de una vez los valores únicos de todas las `columnas` y los aplica."""
+    columnas = [col for col in columnas if col in df.columns]
+    valores = set()
+    for col in columnas:
+        valores.update(df[col].dropna().unique())
+    traducciones = traducir_valores(valores, cache, endpoint)
+    for col in columnas:
+        print(f"Traduciendo columna '{col}'...")
+        df[col] = df[col].map(lambda v: traducciones.get(v, v))
     return df
 
 def main():
-    print("Leyendo archivo CSV original...")
-    df = pd.read_csv('hotel_bookings_reduced.csv')
+    parser = argparse.ArgumentParser(description='Renombra, traduce y completa hotel_bookings_reduced.parquet')
+    parser.add_argument('--entrada', default=ruta_por_defecto('hotel_bookings_reduced.parquet'))
+    parser.add_argument('--salida', default=ruta_por_defecto('hotel_bookings_es.parquet'),
+                        help='Archivo de salida; la extensión elige el formato (.parquet, .feather o .csv)')
+    parser.add_argument('--endpoint', default=LIBRETRANSLATE_URL,
+                        help='URL del endpoint /translate de LibreTranslate')
+    parser.add_argument('--cache-traducciones', default=TRANSLATION_CACHE_FILE,
+                        help='Archivo JSON con la caché de traducciones')
+    parser.add_argument('--reintentar-traducciones', action='store_true',
+                        help='Volver a consultar los valores que fallaron en ejecuciones anteriores')
+    parser.add_argument('--semilla', type=int, default=None,
+                        help='Semilla para generar datos ficticios reproducibles')
+    parser.add_argument('--fecha-referencia', type=date.fromisoformat, default=None,
+                        help='Fecha (AAAA-MM-DD) respecto de la que se calculan las edades; '
+                             'por defecto, hoy, o una fecha fija si se indica --semilla')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='Procesos para generar los datos de Faker (por defecto, todos los CPU)')
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    print(f"Leyendo {args.entrada}...")
+    with METRICAS.etapa('lectura'):
+        df = leer_tabla(args.entrada)
 
     print("Renombrando columnas...")
-    columns_renamed = []
-    for k, v in COLUMN_MAP.items():
-        if k in df.columns:
-            df.rename(columns={k: v}, inplace=True)
-            columns_renamed.append(f"{k} → {v}")
+    df, columns_renamed = renombrar_columnas(df)
     if columns_renamed:
         print("Columnas renombradas:")
         for c in columns_renamed:
@@ -135,48 +254,28 @@ def main():
     else:
         print("No se renombró ninguna columna.")
 
-    # Aplicar mapeos manuales SOLO para mes_llegada y estado_reserva
-    if 'mes_llegada' in df.columns:
-        df['mes_llegada'] = df['mes_llegada'].map(MESES_MAP).fillna(df['mes_llegada'])
-    if 'estado_reserva' in df.columns:
-        df['estado_reserva'] = df['estado_reserva'].map(ESTADO_RESERVA_MAP).fillna(df['estado_reserva'])
+    df = aplicar_mapeos_manuales(df)
 
     print("\n--- Traducción de columnas categóricas ---")
-    for col in CATEGORICAL_COLS:
-        if col in df.columns:
-            df = traducir_columna_libretranslate(df, col)
+    cache = CacheTraducciones(args.cache_traducciones)
+    if args.reintentar_traducciones:
+        cache.olvidar_fallos()
+    with METRICAS.etapa('traducir'):
+        df = traducir_columnas(df, CATEGORICAL_COLS, cache, args.endpoint)
     print("Traducción completada.\n")
 
     print("Generando datos ficticios para clientes...")
-    nombres, emails, telefonos, fechas_nac = [], [], [], []
-    tipos_doc, numeros_doc = [], []
-    total = len(df)
-    for idx in range(total):
-        nombre, email, telefono, fecha_nac = obtener_datos_ficticios()
-        # 20% de los clientes sin email
-        if random.random() < 0.2:
-            email = ''
-        tipo_doc = random.choice(TIPOS_DOC)
-        numero_doc = generar_numero_documento(tipo_doc)
-        nombres.append(nombre)
-        emails.append(email)
-        telefonos.append(telefono)
-        fechas_nac.append(fecha_nac)
-        tipos_doc.append(tipo_doc)
-        numeros_doc.append(numero_doc)
-        if (idx+1) % 500 == 0 or (idx+1) == total:
-            print(f"  - {idx+1}/{total} filas procesadas...")
-
-    df['nombre_completo'] = nombres
-    df['email'] = emails
-    df['telefono'] = telefonos
-    df['tipo_documento_identidad'] = tipos_doc
-    df['numero_documento_identidad'] = numeros_doc
-    df['fecha_nacimiento'] = fechas_nac
-
-    print("\nGuardando nuevo archivo CSV: hotel_bookings_es.csv ...")
-    df.to_csv('hotel_bookings_es.csv', index=False)
-    print('¡Archivo hotel_bookings_es.csv generado correctamente!')
+    with METRICAS.etapa('sintetizar'):
+        clientes = generar_clientes_ficticios(len(df), args.semilla, args.procesos, args.fecha_referencia)
+    for col in clientes.columns:
+        df[col] = clientes[col].to_numpy()
+    print(f"  - {len(df)}/{len(df)} filas procesadas...")
+
+    print(f"\nGuardando nuevo archivo: {args.salida} ...")
+    with METRICAS.etapa('escritura'):
+        escribir_tabla(df, args.salida, COLUMNS_TYPES)
+    print(f'¡Archivo {args.salida} generado correctamente!')
+    finalizar(args)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
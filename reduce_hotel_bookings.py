@@ -2,86 +2,255 @@
 """
 Script to reduce the number of records in hotel_bookings.csv to 15,000
 and save it as a new file.
+
+The input is read in chunks, so only the sample (plus one chunk) is kept in
+memory. Three sampling modes are available:
+
+- head: the first N records (stops reading once it has them)
+- reservoir: a uniform random sample in a single pass
+- stratified: a random sample with the same hotel/year/month proportions
+  as the input
 """
 
-import pandas as pd
+import argparse
+import io
 import os
-from pathlib import Path
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from formato_intermedio import escribir_tabla, leer_por_bloques, ruta_por_defecto
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+
+TARGET_RECORDS = 15638
+CHUNK_SIZE = 50000
+MODES = ['head', 'reservoir', 'stratified']
+STRATA_COLUMNS = ['hotel', 'arrival_date_year', 'arrival_date_month']
+
+
+# --- Sampling over an iterator of chunks ---
+def sample_head(chunks, target_records):
+    """Yield the first `target_records` rows and stop reading the input."""
+    remaining = target_records
+    for chunk in chunks:
+        chunk = chunk.iloc[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+        if remaining <= 0:
+            return
+
+
+class Reservoir:
+    """
+    Reservoir sampling (Algorithm R) applied one chunk at a time. Rows keep
+    their index (the position in the input), so the sample can be returned in
+    input order.
+    """
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.sample = None
+
+    def offer(self, chunk):
+        n = len(chunk)
+        if n == 0:
+            return
+        positions = np.arange(self.seen, self.seen + n)
+        self.seen += n
+        if self.size == 0:
+            return
+        # Row i takes slot i while the reservoir fills up, then slot j ~ U[0, i]
+        slots = np.where(positions < self.size, positions, self.rng.integers(0, positions + 1))
+        kept = np.flatnonzero(slots < self.size)
+        slots = slots[kept]
+        # If a slot is hit twice within the chunk, the later row wins
+        _, last = np.unique(slots[::-1], return_index=True)
+        rows, slots = kept[::-1][last], slots[::-1][last]
+        new = chunk.iloc[rows].assign(_slot=slots)
+        if self.sample is None:
+            self.sample = new
+        else:
+            self.sample = pd.concat([self.sample[~self.sample['_slot'].isin(slots)], new])
+
+    def result(self):
+        if self.sample is None:
+            return None
+        return self.sample.drop(columns='_slot')
+
+
+def sample_reservoir(chunks, target_records, seed=None):
+    """Return a uniform sample of `target_records` rows in input order."""
+    reservoir = Reservoir(target_records, np.random.default_rng(seed))
+    columns = None
+    for chunk in chunks:
+        columns = chunk.columns
+        reservoir.offer(chunk)
+    sample = reservoir.result()
+    if sample is None:
+        return pd.DataFrame(columns=columns)
+    return sample.sort_index()
 
-def reduce_hotel_bookings(input_file='hotel_bookings.csv', 
-                         output_file='hotel_bookings_reduced.csv', 
-                         target_records=15638):
+
+def _stratum_seed(seed, stratum):
+    # Each stratum gets its own generator, so the result does not depend on the chunk size
+    return [seed if seed is not None else np.random.SeedSequence().entropy,
+            zlib.crc32(repr(stratum).encode('utf-8'))]
+
+
+def allocate(counts, target_records):
+    """
+    Split `target_records` among strata in proportion to their size
+    ({stratum: rows}), using the largest remainder so the total matches.
+    """
+    total = sum(counts.values())
+    target_records = min(target_records, total)
+    if total == 0:
+        return {}
+    exact = {s: c * target_records / total for s, c in counts.items()}
+    allocation = {s: int(v) for s, v in exact.items()}
+    missing = target_records - sum(allocation.values())
+    for s in sorted(exact, key=lambda s: (allocation[s] - exact[s], repr(s)))[:missing]:
+        allocation[s] += 1
+    return allocation
+
+
+def _strata_keys(chunk, columns):
+    # Keys as text ('' for missing values), whatever the column types of the chunk
+    return [chunk[c].astype(object).where(chunk[c].notna(), '').astype(str) for c in columns]
+
+
+def count_strata(input_file, chunk_size=CHUNK_SIZE, columns=STRATA_COLUMNS):
+    """First pass: count rows per stratum reading only the strata columns."""
+    counts = {}
+    for chunk in leer_por_bloques(input_file, chunk_size, columns, dtype_csv=str):
+        for stratum, size in chunk.groupby(_strata_keys(chunk, columns)).size().items():
+            counts[stratum] = counts.get(stratum, 0) + int(size)
+    return counts
+
+
+def sample_stratified(chunks, allocation, seed=None, columns=STRATA_COLUMNS):
+    """Second pass: one reservoir per stratum, sized by `allocation`."""
+    reservoirs = {
+        stratum: Reservoir(size, np.random.default_rng(_stratum_seed(seed, stratum)))
+        for stratum, size in allocation.items()
+    }
+    columns_out = None
+    for chunk in chunks:
+        columns_out = chunk.columns
+        for stratum, rows in chunk.groupby(_strata_keys(chunk, columns)).indices.items():
+            reservoirs[stratum].offer(chunk.iloc[rows])
+    samples = [s for s in (r.result() for r in reservoirs.values()) if s is not None]
+    if not samples:
+        return pd.DataFrame(columns=columns_out)
+    return pd.concat(samples).sort_index()
+
+
+def _infer_types(df):
+    # Chunks are read as text; infer the column types on the sample alone,
+    # exactly as if the reduced CSV had been read back
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    buffer.seek(0)
+    return pd.read_csv(buffer)
+
+
+def reduce_hotel_bookings(input_file='hotel_bookings.csv',
+                         output_file='hotel_bookings_reduced.parquet',
+                         target_records=TARGET_RECORDS,
+                         mode='head',
+                         seed=None,
+                         chunk_size=CHUNK_SIZE):
     """
     Reduce the number of records in the hotel bookings CSV file.
-    
+
     Args:
-        input_file (str): Path to the input CSV file
-        output_file (str): Path to the output CSV file
+        input_file (str): Path to the input file (.csv, .parquet or .feather)
+        output_file (str): Path to the output file (.parquet, .feather or .csv)
         target_records (int): Number of records to keep
+        mode (str): 'head', 'reservoir' or 'stratified' (by hotel/year/month)
+        seed (int): Seed for the random modes; the same seed gives the same output
+        chunk_size (int): Rows read from the input at a time
     """
-    
-    print(f"Reading {input_file}...")
-    
+
+    print(f"Reading {input_file} in chunks of {chunk_size:,} rows ({mode} mode)...")
+
     # Check if input file exists
     if not os.path.exists(input_file):
         print(f"Error: {input_file} not found!")
         return False
-    
+
     try:
-        # Read the CSV file
-        df = pd.read_csv(input_file)
-        
-        original_count = len(df)
-        print(f"Original file has {original_count:,} records")
-        
-        # Check if we need to reduce the data
-        if original_count <= target_records:
-            print(f"File already has {original_count:,} records or fewer. No reduction needed.")
-            print(f"Copying file to {output_file}...")
-            df.to_csv(output_file, index=False)
-            print(f"File saved as {output_file}")
-            return True
-        
-        # Reduce to target number of records
-        print(f"Reducing to {target_records:,} records...")
-        df_reduced = df.head(target_records)
-        
+        # Reading is timed apart from sampling (nested stages are exclusive)
+        chunks = METRICAS.cronometrar(leer_por_bloques(input_file, chunk_size, dtype_csv=str), 'lectura')
+        with METRICAS.etapa('muestreo'):
+            if mode == 'head':
+                df_reduced = pd.concat(list(sample_head(chunks, target_records)))
+            elif mode == 'reservoir':
+                df_reduced = sample_reservoir(chunks, target_records, seed)
+            elif mode == 'stratified':
+                with METRICAS.etapa('conteo_estratos'):
+                    counts = count_strata(input_file, chunk_size)
+                print(f"Found {len(counts)} strata ({', '.join(STRATA_COLUMNS)})")
+                df_reduced = sample_stratified(chunks, allocate(counts, target_records), seed)
+            else:
+                raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+        with METRICAS.etapa('inferir_tipos'):
+            df_reduced = _infer_types(df_reduced)
+        METRICAS.contar('filas_muestra', len(df_reduced))
+
         # Save the reduced dataset
         print(f"Saving reduced dataset to {output_file}...")
-        df_reduced.to_csv(output_file, index=False)
-        
-        print(f"Success! Reduced from {original_count:,} to {len(df_reduced):,} records")
+        with METRICAS.etapa('escritura'):
+            escribir_tabla(df_reduced, output_file)
+
+        print(f"Success! Kept {len(df_reduced):,} records")
         print(f"New file saved as: {output_file}")
-        
+
         # Show file size comparison
         original_size = os.path.getsize(input_file) / (1024 * 1024)  # MB
         new_size = os.path.getsize(output_file) / (1024 * 1024)  # MB
-        
+
         print(f"Original file size: {original_size:.2f} MB")
         print(f"New file size: {new_size:.2f} MB")
         print(f"Size reduction: {((original_size - new_size) / original_size * 100):.1f}%")
-        
+
         return True
-        
+
     except Exception as e:
         print(f"Error processing file: {str(e)}")
         return False
 
 def main():
     """Main function to execute the reduction process."""
+    parser = argparse.ArgumentParser(description='Reduce hotel_bookings.csv to a smaller sample')
+    parser.add_argument('--input', default='hotel_bookings.csv')
+    parser.add_argument('--output', default=ruta_por_defecto('hotel_bookings_reduced.parquet'))
+    parser.add_argument('--records', type=int, default=TARGET_RECORDS)
+    parser.add_argument('--mode', choices=MODES, default='head')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
     print("=" * 60)
     print("Hotel Bookings CSV Reduction Script")
     print("=" * 60)
-    
+
     # Execute the reduction
-    success = reduce_hotel_bookings()
-    
+    success = reduce_hotel_bookings(args.input, args.output, args.records,
+                                    args.mode, args.seed, args.chunk_size)
+
     if success:
         print("\n✅ Process completed successfully!")
     else:
         print("\n❌ Process failed!")
-    
+
     print("=" * 60)
+    finalizar(args)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import glob
+import gzip
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
+import bson
+from bson import json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import IndexModel, MongoClient
+from pymongo.errors import BulkWriteError
+
+from backup_db import BACKUP_DIR, COLECCIONES_INCREMENTALES, leer_manifiesto
+from esquema_bd import OPCIONES_VALIDACION, VALIDADORES
+from indices import asegurar_indices
+from metricas import METRICAS, agregar_argumentos, finalizar, iniciar
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'CostaDelInkaDB'
+
+# Documentos por insert_many
+TAMANO_LOTE = 5000
+# Los documentos se leen como RawBSONDocument: el driver envía los bytes tal
+# como están en el .bson, sin decodificarlos a dict ni volver a codificarlos
+CODEC_LECTURA = CodecOptions(document_class=RawBSONDocument)
+
+# <colección>.bson, <colección>.bson.gz, <colección>.metadata.json[.gz] de un mongodump
+_ARCHIVO_VOLCADO = re.compile(r'(?:^|/)([^/]+)/([^/]+)\.(bson|metadata\.json)(\.gz)?$')
+
+
+# --- Archivos de un volcado: directorio o zip ---
+class Volcado:
+    """
+    Un backup de mongodump: un directorio (el del backup o su subdirectorio
+    CostaDelInkaDB) o un .zip que lo contiene, leído sin extraerlo. Los
+    archivos .gz (mongodump --gzip) se descomprimen al vuelo.
+    """
+
+    def __init__(self, ruta, db_name=DB_NAME):
+        self.ruta = ruta
+        self.es_zip = zipfile.is_zipfile(ruta)
+        if self.es_zip:
+            with zipfile.ZipFile(ruta) as z:
+                nombres = z.namelist()
+        else:
+            raiz = os.path.join(ruta, db_name) if os.path.isdir(os.path.join(ruta, db_name)) else ruta
+            nombres = [os.path.relpath(p, os.path.dirname(raiz)).replace(os.sep, '/')
+                       for p in glob.glob(os.path.join(raiz, '*'))]
+            self._base = os.path.dirname(raiz)
+
+        # {colección: {'bson' | 'metadata.json': nombre del archivo}}
+        self.archivos = {}
+        for nombre in sorted(nombres):
+            encontrado = _ARCHIVO_VOLCADO.search(nombre)
+            if encontrado and encontrado.group(1) == db_name:
+                self.archivos.setdefault(encontrado.group(2), {})[encontrado.group(3)] = nombre
+
+    @property
+    def colecciones(self):
+        return sorted(c for c, archivos in self.archivos.items() if 'bson' in archivos)
+
+    @contextmanager
+    def abrir(self, nombre):
+        # Cada llamada abre su propio ZipFile: los hilos leen el zip a la vez
+        if self.es_zip:
+            with zipfile.ZipFile(self.ruta) as z, z.open(nombre) as f:
+                yield gzip.GzipFile(fileobj=f) if nombre.endswith('.gz') else f
+        else:
+            ruta = os.path.join(self._base, nombre)
+            with (gzip.open(ruta, 'rb') if nombre.endswith('.gz') else open(ruta, 'rb')) as f:
+                yield f
+
+    def documentos(self, coleccion):
+        """Itera los documentos de `coleccion` sin cargar el archivo entero en memoria."""
+        with self.abrir(self.archivos[coleccion]['bson']) as f:
+            yield from bson.decode_file_iter(f, codec_options=CODEC_LECTURA)
+
+    def metadata(self, coleccion):
+        """Opciones e índices que mongodump guardó de `coleccion`, o None."""
+        nombre = self.archivos.get(coleccion, {}).get('metadata.json')
+        if nombre is None:
+            return None
+        with self.abrir(nombre) as f:
+            return json_util.loads(f.read())
+
+
+def ultimo_backup(directorio=BACKUP_DIR):
+    """El backup más reciente de `directorio` (costadelinka_backup_*) o, si no hay, el zip más reciente."""
+    candidatos = sorted(p for p in glob.glob(os.path.join(directorio, 'costadelinka_backup_*')) if os.path.isdir(p))
+    if not candidatos:
+        candidatos = sorted(glob.glob(os.path.join(directorio, '*.zip')), key=os.path.getmtime)
+    return candidatos[-1] if candidatos else None
+
+
+def cadena_de(ruta):
+    """
+    Volcados a aplicar para restaurar `ruta`. Si es un backup incremental
+    del manifiesto de backup_db.py, su backup completo base y los
+    incrementales hasta él; si no, solo `ruta`.
+    """
+    directorio, nombre = os.path.split(os.path.normpath(ruta))
+    backups = leer_manifiesto(directorio)['backups']
+    entrada = next((b for b in backups if b['nombre'] == nombre), None)
+    if entrada is None or entrada['tipo'] == 'completo':
+        return [Volcado(ruta)]
+    hasta = backups.index(entrada)
+    return [Volcado(os.path.join(directorio, b['nombre']))
+            for b in backups[:hasta + 1] if b['base'] == entrada['base']]
+
+
+def plan_restauracion(volcados):
+    """
+    {colección: [volcados a insertar, en orden]}. Las colecciones
+    incrementales acumulan todos los volcados de la cadena; las demás se
+    copian completas en cada backup, así que basta el último.
+    """
+    plan = {}
+    for volcado in volcados:
+        for coleccion in volcado.colecciones:
+            if coleccion in COLECCIONES_INCREMENTALES:
+                plan.setdefault(coleccion, []).append(volcado)
+            else:
+                plan[coleccion] = [volcado]
+    return plan
+
+
+# --- Restauración de una colección ---
+def crear_coleccion(db, coleccion, metadata):
+    """Recrea `coleccion` vacía con las opciones del volcado (o el validador de esquema_bd)."""
+    db.drop_collection(coleccion)
+    if metadata and metadata.get('options'):
+        db.create_collection(coleccion, **metadata['options'])
+    elif coleccion in VALIDADORES:
+        db.create_collection(coleccion, validator=VALIDADORES[coleccion], **OPCIONES_VALIDACION)
+    else:
+        db.create_collection(coleccion)
+
+
+def crear_indices(db, coleccion, metadata):
+    """Construye, con los datos ya insertados, los índices del volcado (o los de esquema_bd)."""
+    if metadata is None:
+        asegurar_indices(db, [coleccion])
+        return
+    indices = [
+        IndexModel(list(indice['key'].items()), name=indice['name'],
+                   **{k: v for k, v in indice.items() if k not in ('v', 'key', 'name', 'ns')})
+        for indice in metadata.get('indexes', [])
+        if indice['name'] != '_id_'
+    ]
+    if indices:
+        with METRICAS.etapa('indices'):
+            db[coleccion].create_indexes(indices)
+
+
+def insertar(coleccion, documentos, tamano_lote=TAMANO_LOTE):
+    """
+    insert_many desordenado por lotes. Sin orden, el servidor no se detiene
+    en el primer error; los _id repetidos (un documento ya restaurado) se
+    cuentan como duplicados. Los documentos vienen de un volcado de la misma
+    base, así que no se validan de nuevo contra el $jsonSchema.
+    """
+    insertados = duplicados = 0
+    iterador = iter(documentos)
+    while True:
+        with METRICAS.etapa('lectura'):
+            lote = list(islice(iterador, tamano_lote))
+        if not lote:
+            return insertados, duplicados
+        with METRICAS.etapa('escritura'):
+            try:
+                insertados += len(coleccion.insert_many(lote, ordered=False, bypass_document_validation=True).inserted_ids)
+            except BulkWriteError as e:
+                errores = e.details.get('writeErrors', [])
+                if any(error.get('code') != 11000 for error in errores):
+                    raise
+                insertados += e.details.get('nInserted', 0)
+                duplicados += len(errores)
+
+
+def restaurar_coleccion(db, coleccion, volcados, tamano_lote=TAMANO_LOTE):
+    """Recrea `coleccion`, inserta los documentos de `volcados` y construye sus índices al final."""
+    inicio = time.perf_counter()
+    metadata = volcados[0].metadata(coleccion)
+    crear_coleccion(db, coleccion, metadata)
+
+    insertados = duplicados = 0
+    for volcado in volcados:
+        i, d = insertar(db[coleccion], volcado.documentos(coleccion), tamano_lote)
+        insertados += i
+        duplicados += d
+    METRICAS.contar('documentos_restaurados', insertados)
+    METRICAS.contar('documentos_duplicados', duplicados)
+
+    crear_indices(db, coleccion, metadata)
+    return insertados, duplicados, time.perf_counter() - inicio
+
+
+def restaurar(db, volcados, colecciones=None, hilos=None, tamano_lote=TAMANO_LOTE):
+    """
+    Restaura en paralelo, un hilo por colección. Retorna {colección:
+    (insertados, duplicados, segundos) o excepción}.
+    """
+    plan = plan_restauracion(volcados)
+    if colecciones:
+        plan = {c: v for c, v in plan.items() if c in colecciones}
+
+    def procesar(item):
+        coleccion, lista = item
+        try:
+            return coleccion, restaurar_coleccion(db, coleccion, lista, tamano_lote)
+        except Exception as e:
+            return coleccion, e
+
+    with ThreadPoolExecutor(max_workers=max(1, hilos or len(plan) or 1)) as pool:
+        return dict(pool.map(procesar, plan.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Restaura CostaDelInkaDB desde un backup de mongodump, sin pasar por el ETL')
+    parser.add_argument('origen', nargs='?', default=None,
+                        help='Directorio del backup, su subdirectorio CostaDelInkaDB o un .zip '
+                             '(por defecto, el backup más reciente de mongodb_backups)')
+    parser.add_argument('--colecciones', nargs='+', help='Restaurar solo estas colecciones')
+    parser.add_argument('--hilos', type=int, default=None, help='Colecciones restauradas a la vez (por defecto, todas)')
+    parser.add_argument('--tamano-lote', type=int, default=TAMANO_LOTE, help='Documentos por insert_many')
+    parser.add_argument('--mongo-uri', default=MONGO_URI)
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    iniciar(args)
+
+    origen = args.origen or ultimo_backup()
+    if origen is None or not os.path.exists(origen):
+        print(f"No se encontró el backup: {origen}")
+        return
+    volcados = cadena_de(origen)
+    print(f"Restaurando desde: {', '.join(v.ruta for v in volcados)}")
+
+    client = MongoClient(args.mongo_uri)
+    db = client[DB_NAME]
+    try:
+        inicio = time.perf_counter()
+        for coleccion, resultado in restaurar(db, volcados, args.colecciones, args.hilos, args.tamano_lote).items():
+            if isinstance(resultado, Exception):
+                print(f"Error al restaurar la colección {coleccion}: {resultado}")
+                continue
+            insertados, duplicados, segundos = resultado
+            mensaje = f"Colección {coleccion}: {insertados:,} documentos en {segundos:.2f} s"
+            print(mensaje + (f" ({duplicados:,} duplicados omitidos)." if duplicados else "."))
+        print(f"\nRestauración completada en {time.perf_counter() - inicio:.2f} s.")
+    finally:
+        client.close()
+    finalizar(args)
+
+
+if __name__ == '__main__':
+    main()